@@ -0,0 +1,345 @@
+"""
+Admission control, load shedding and request deadlines
+Bounds in-flight and queued predict work so overload fails fast
+
+- At most `max_in_flight` requests run at once; up to `max_queued` more
+  wait in FIFO order. Beyond that requests are shed immediately with
+  503 + Retry-After instead of piling up until clients time out.
+- Optional per-client queue limit answers 429 to a single noisy client
+  (identified by X-API-Key, falling back to the client IP).
+- Clients can set a deadline with the X-Request-Deadline-Ms header
+  (milliseconds from arrival). Requests whose deadline passes while
+  queued get 504, and handlers call check_request_active() right before
+  inference to drop work nobody will read, and again before building the
+  response, so a result that arrives too late is not serialised either.
+- Each admitted request gets a RequestBudget (deadline + disconnect
+  flag) that worker threads can read, so inference still queued in the
+  scheduler is dropped once its deadline passes or its client leaves.
+"""
+
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException, Request
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+DEADLINE_HEADER = "x-request-deadline-ms"
+API_KEY_HEADER = "x-api-key"
+
+
+def client_id_from_scope(scope: Scope) -> str:
+    """Identify the caller by API key, falling back to the client IP"""
+    for name, value in scope.get("headers", []):
+        if name == API_KEY_HEADER.encode():
+            return "key:" + value.decode("latin-1")
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+class RequestBudget:
+    """
+    Deadline and disconnect state of one admitted request
+
+    Readable from any thread: the scheduler calls expired() before a
+    queued job reaches the model.
+    """
+
+    def __init__(self, deadline: Optional[float] = None):
+        self.deadline = deadline
+        self.disconnected = threading.Event()
+        self._watcher: Optional[asyncio.Task] = None
+
+    @property
+    def watching(self) -> bool:
+        return self._watcher is not None
+
+    def past_deadline(self) -> bool:
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    def expired(self) -> bool:
+        """Deadline passed or client gone: nobody will read the result"""
+        return self.disconnected.is_set() or self.past_deadline()
+
+    def watch_disconnect(self, receive: Receive) -> None:
+        """
+        Flag a client disconnect from now on (idempotent)
+
+        Only call once the request body has been read: the watcher
+        consumes the remaining ASGI messages.
+        """
+        if self._watcher is None:
+            self._watcher = asyncio.ensure_future(self._watch(receive))
+
+    async def _watch(self, receive: Receive) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                self.disconnected.set()
+                return
+
+    def close(self) -> None:
+        """Stop watching (the request has finished)"""
+        if self._watcher is not None:
+            self._watcher.cancel()
+
+
+# Budget of the admitted request being handled (None outside admission control)
+_current_budget: contextvars.ContextVar[Optional[RequestBudget]] = contextvars.ContextVar(
+    "request_budget", default=None
+)
+
+
+def current_expiry() -> Optional[Callable[[], bool]]:
+    """
+    Expiry check of the current request, for InferenceScheduler.submit
+
+    Returns:
+        The request budget's expired(), or None outside admitted requests
+    """
+    budget = _current_budget.get()
+    return budget.expired if budget is not None else None
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[int] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounded in-flight + FIFO queue for predict work
+
+    Args:
+        max_in_flight: Requests processed concurrently
+        max_queued: Requests allowed to wait for a slot
+        max_queued_per_client: Per-client share of the queue (0 = off)
+    """
+
+    def __init__(self, max_in_flight: int, max_queued: int, max_queued_per_client: int = 0):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.max_queued_per_client = max_queued_per_client
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        self._queued_by_client: Dict[str, int] = defaultdict(int)
+        # Exponential moving average of service time, for Retry-After
+        self._avg_service = 0.1
+        self.counters = {
+            "admitted": 0,
+            "rejected_overloaded": 0,
+            "rejected_client_limit": 0,
+            "expired_in_queue": 0,
+            "dropped_before_inference": 0,
+            "dropped_after_inference": 0,
+        }
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue is likely to have drained"""
+        backlog = len(self._waiters) + self.in_flight
+        return max(1, math.ceil(backlog * self._avg_service / max(self.max_in_flight, 1)))
+
+    async def acquire(self, client: str, deadline: Optional[float] = None) -> None:
+        """
+        Wait for an in-flight slot
+
+        Raises:
+            AdmissionRejected: Queue full (503), client over its share
+                (429) or deadline passed while queued (504)
+        """
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self.counters["admitted"] += 1
+            return
+
+        if len(self._waiters) >= self.max_queued:
+            self.counters["rejected_overloaded"] += 1
+            raise AdmissionRejected(503, "Server overloaded, try again later", self.retry_after())
+        if self.max_queued_per_client and self._queued_by_client[client] >= self.max_queued_per_client:
+            self.counters["rejected_client_limit"] += 1
+            raise AdmissionRejected(429, "Too many queued requests for this client", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._queued_by_client[client] += 1
+        try:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), timeout)
+            except asyncio.TimeoutError:
+                if not waiter.done():
+                    self._abandon(waiter)
+                    self.counters["expired_in_queue"] += 1
+                    raise AdmissionRejected(504, "Request deadline exceeded while queued")
+                # The slot was handed over just as the deadline passed: use it
+        except asyncio.CancelledError:
+            if waiter.done():
+                self._hand_off()  # We own a slot we will never use
+            else:
+                self._abandon(waiter)
+            raise
+        finally:
+            self._queued_by_client[client] -= 1
+            if not self._queued_by_client[client]:
+                del self._queued_by_client[client]
+        self.counters["admitted"] += 1
+
+    def _abandon(self, waiter: asyncio.Future) -> None:
+        """Remove a waiter that gave up before getting a slot"""
+        waiter.cancel()
+        self._waiters.remove(waiter)
+
+    def _hand_off(self) -> None:
+        """Give a freed slot to the next waiter, or return it to the pool"""
+        if self._waiters:
+            # Slot is transferred: in_flight stays the same
+            self._waiters.popleft().set_result(None)
+        else:
+            self.in_flight -= 1
+
+    def release(self, service_time: float) -> None:
+        """Free a slot after a request finished"""
+        self._avg_service = 0.8 * self._avg_service + 0.2 * service_time
+        self._hand_off()
+
+    def stats(self) -> Dict[str, Any]:
+        """Current load and lifetime counters for /metrics"""
+        return {
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "max_in_flight": self.max_in_flight,
+            "max_queued": self.max_queued,
+            "avg_service_ms": round(self._avg_service * 1000, 2),
+            **self.counters,
+        }
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying AdmissionControllers to matching paths
+
+    Each path prefix gets its own controller (longest prefix wins), so
+    e.g. batch traffic has separate limits and cannot use up the slots of
+    interactive requests. Runs before the request body is parsed, so shed
+    requests never pay for multipart parsing. The absolute deadline
+    (time.monotonic()) is stored in request.state.deadline and the
+    wall-clock arrival time (before any queueing) in request.state.arrival
+    for handlers, and a RequestBudget in request.state.budget (and a
+    context variable, see current_expiry()) for work the request hands to
+    other threads.
+    """
+
+    def __init__(self, app: ASGIApp, routes: Dict[str, AdmissionController],
+                 default_deadline_ms: int = 0):
+        self.app = app
+        # Longest prefix first
+        self.routes = sorted(routes.items(), key=lambda item: len(item[0]), reverse=True)
+        self.default_deadline_ms = default_deadline_ms
+
+    def _controller(self, path: str) -> Optional[AdmissionController]:
+        for prefix, controller in self.routes:
+            if path.startswith(prefix):
+                return controller
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        controller = self._controller(scope["path"]) if scope["type"] == "http" else None
+        if controller is None:
+            await self.app(scope, receive, send)
+            return
+
+        deadline = self._deadline(scope)
+        budget = RequestBudget(deadline)
+        state = scope.setdefault("state", {})
+        state["deadline"] = deadline
+        state["budget"] = budget
+        state["arrival"] = time.time()
+
+        try:
+            await controller.acquire(client_id_from_scope(scope), deadline)
+        except AdmissionRejected as e:
+            headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+            response = JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=headers)
+            await response(scope, receive, send)
+            return
+
+        start = time.monotonic()
+        token = _current_budget.set(budget)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_budget.reset(token)
+            budget.close()
+            controller.release(time.monotonic() - start)
+
+    def _deadline(self, scope: Scope) -> Optional[float]:
+        """Absolute monotonic deadline from the header or the server default"""
+        budget_ms = self.default_deadline_ms
+        for name, value in scope.get("headers", []):
+            if name == DEADLINE_HEADER.encode():
+                try:
+                    budget_ms = int(value)
+                except ValueError:
+                    pass
+                break
+        return time.monotonic() + budget_ms / 1000 if budget_ms > 0 else None
+
+
+async def check_request_active(
+    request: Request,
+    controller: AdmissionController,
+    after_inference: bool = False
+) -> None:
+    """
+    Drop work that nobody will read
+
+    Called right before inference starts, and with after_inference=True
+    once the model has answered, before the response is built. The first
+    call also starts watching for a disconnect, so the scheduler can drop
+    the request's queued inference if the client leaves while it waits.
+
+    Raises:
+        HTTPException: 504 if the deadline has passed, 499 if the client
+            has already disconnected
+    """
+    when = "after" if after_inference else "before"
+    deadline = getattr(request.state, "deadline", None)
+    if deadline is not None and time.monotonic() > deadline:
+        controller.counters[f"dropped_{when}_inference"] += 1
+        raise HTTPException(
+            status_code=504,
+            detail="Request deadline exceeded " + ("during" if after_inference else "before") + " inference"
+        )
+    budget: Optional[RequestBudget] = getattr(request.state, "budget", None)
+    if budget is not None and budget.watching:
+        disconnected = budget.disconnected.is_set()
+    else:
+        disconnected = await request.is_disconnected()
+    if disconnected:
+        controller.counters[f"dropped_{when}_inference"] += 1
+        raise HTTPException(status_code=499, detail="Client closed request")
+    if budget is not None:
+        budget.watch_disconnect(request.receive)
+
+
+def dropped_request_error(request: Request) -> HTTPException:
+    """
+    Error for a request whose queued inference was dropped as expired
+
+    Returns:
+        HTTPException with 499 if the client disconnected, otherwise 504
+    """
+    budget: Optional[RequestBudget] = getattr(request.state, "budget", None)
+    if budget is not None and budget.disconnected.is_set():
+        return HTTPException(status_code=499, detail="Client closed request")
+    return HTTPException(status_code=504, detail="Request deadline exceeded while waiting for inference")
@@ -3,20 +3,75 @@ FastAPI Backend for Cat vs Dog Image Classification
 Provides RESTful API endpoints for the trained CNN model
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import Depends, FastAPI, File, Header, UploadFile, HTTPException, Query, Request, WebSocket
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from starlette.requests import HTTPConnection
+from pydantic import BaseModel
 from tensorflow import keras
 import numpy as np
 from PIL import Image
+import asyncio
 import io
+from contextlib import contextmanager
 import gdown
+import hmac
+import json
 import os
-from typing import Dict, Any
+import tempfile
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Any, Iterator, Optional
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+from admission import (
+    AdmissionController,
+    AdmissionMiddleware,
+    check_request_active,
+    client_id_from_scope,
+    current_expiry,
+    dropped_request_error,
+)
+from cascade import STAGE_FULL, ModelCascade
+from cpu_config import configure_cpu_threads, thread_settings
+from embedding_index import STAGE_NEAR_DUPLICATE, NearDuplicateIndex, split_model
+from frame_stream import FrameStreamHub
+from graceful_shutdown import DrainMiddleware, GracefulShutdown
+from inference_pipeline import InferencePipeline, PipelineResult
+from memory_accounting import MemoryAccountingMiddleware, MemoryTracker
+from model_artifact_cache import ModelArtifactCache
+from multiframe import (
+    AGGREGATIONS,
+    SAMPLING_STRATEGIES,
+    TooManyFrames,
+    aggregate_scores,
+    decode_frames,
+    frame_budget,
+    plan_frames,
+)
+from model_registry import LoadedModel, ModelRegistry
+from result_cache import STAGE_CACHE, TwoTierCache, connect
+from scheduler import PRIORITIES, InferenceScheduler, JobExpired, parse_weights
+from single_flight import SingleFlight, content_hash
+from structured_logging import RequestLogMiddleware, annotate, configure_logging, stop_logging, timed_stage
+from stub_model import ensure_stub_model
+from tensor_store import TensorStore, TensorStoreWriter
+from traffic_capture import TrafficRecorder
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the stdlib encoder
+    orjson = None
+
+# Logging - records are queued and written by a background thread
+# (configured on server startup); successful request summaries are
+# sampled, errors and requests slower than LOG_SLOW_MS are always logged
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_SUCCESS_SAMPLE_RATE = float(os.getenv("LOG_SUCCESS_SAMPLE_RATE", "0.01"))
+LOG_SLOW_MS = float(os.getenv("LOG_SLOW_MS", "1000"))
+
 logger = logging.getLogger(__name__)
 
 # Initialize FastAPI app
@@ -28,6 +83,46 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# Admission control - bound concurrent/queued predict work and shed the rest
+# (registered before CORS so rejections still carry CORS headers)
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "4"))
+MAX_QUEUED = int(os.getenv("MAX_QUEUED", "32"))
+MAX_QUEUED_PER_CLIENT = int(os.getenv("MAX_QUEUED_PER_CLIENT", "0"))
+DEFAULT_DEADLINE_MS = int(os.getenv("DEFAULT_DEADLINE_MS", "0"))
+# Batch requests get their own lane so they cannot take interactive slots
+MAX_BATCH_IN_FLIGHT = int(os.getenv("MAX_BATCH_IN_FLIGHT", "2"))
+MAX_BATCH_QUEUED = int(os.getenv("MAX_BATCH_QUEUED", "16"))
+
+admission = AdmissionController(MAX_IN_FLIGHT, MAX_QUEUED, MAX_QUEUED_PER_CLIENT)
+batch_admission = AdmissionController(MAX_BATCH_IN_FLIGHT, MAX_BATCH_QUEUED, MAX_QUEUED_PER_CLIENT)
+app.add_middleware(
+    AdmissionMiddleware,
+    routes={
+        "/predict": admission,
+        "/predict/batch": batch_admission,
+        "/predict/frames": batch_admission,
+        "/embed": batch_admission
+    },
+    default_deadline_ms=DEFAULT_DEADLINE_MS
+)
+
+# Graceful shutdown - on SIGTERM /ready flips to 503, new predict work is
+# refused and accepted work gets up to SHUTDOWN_GRACE_SECONDS to finish
+# (outside admission control, so queued requests count as accepted)
+SHUTDOWN_GRACE_SECONDS = float(os.getenv("SHUTDOWN_GRACE_SECONDS", "20"))
+
+shutdown = GracefulShutdown(SHUTDOWN_GRACE_SECONDS)
+app.add_middleware(DrainMiddleware, shutdown=shutdown, prefixes=["/predict", "/embed"])
+
+# Memory accounting - RSS history always; per-stage tracemalloc peaks and
+# snapshot diffs (/debug/memory) only with MEMORY_TRACKING=1
+MEMORY_TRACKING = os.getenv("MEMORY_TRACKING", "0") == "1"
+MEMORY_TRACKING_FRAMES = int(os.getenv("MEMORY_TRACKING_FRAMES", "1"))
+RSS_SAMPLE_SECONDS = float(os.getenv("RSS_SAMPLE_SECONDS", "10"))
+
+memory = MemoryTracker(MEMORY_TRACKING, MEMORY_TRACKING_FRAMES, RSS_SAMPLE_SECONDS)
+app.add_middleware(MemoryAccountingMiddleware, tracker=memory, prefixes=["/predict", "/embed"])
+
 # CORS middleware - Allow all origins (configure based on your needs)
 app.add_middleware(
     CORSMiddleware,
@@ -37,23 +132,192 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost: request IDs (X-Request-ID) and sampled request summaries
+app.add_middleware(
+    RequestLogMiddleware,
+    success_sample_rate=LOG_SUCCESS_SAMPLE_RATE,
+    slow_ms=LOG_SLOW_MS
+)
+
 # Model configuration
-MODEL_PATH = "dogs_vs_cats_production_model.keras"
+MODEL_PATH = os.getenv("MODEL_PATH", "dogs_vs_cats_production_model.keras")
 GDRIVE_FILE_ID = "1NUmowM-IX9yRhsNad1G42042YAEzYVig"
+
+# Where the startup model comes from: "gdrive" (download MODEL_PATH if
+# missing), "local" (MODEL_PATH must exist) or "stub" (tiny generated
+# model with the same interface, for offline tests and benchmarks)
+MODEL_SOURCE = os.getenv("MODEL_SOURCE", "gdrive")
+STUB_MODEL_SEED = int(os.getenv("STUB_MODEL_SEED", "0"))
+STUB_MODEL_PATH = os.getenv("STUB_MODEL_PATH") or os.path.join(
+    tempfile.gettempdir(), f"catdog_stub_model_seed{STUB_MODEL_SEED}.keras"
+)
+
+# Converted serving artifacts (architecture JSON + memory-mapped weights)
+# keyed on the .keras file's SHA-256; later starts skip the archive load.
+# Empty disables the cache.
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "model_cache")
+
+# Artificial delay added to every model call (fixed + per image), to
+# exercise batching and scheduling under realistic inference times
+INJECT_LATENCY_MS = float(os.getenv("INJECT_LATENCY_MS", "0"))
+INJECT_LATENCY_PER_IMAGE_MS = float(os.getenv("INJECT_LATENCY_PER_IMAGE_MS", "0"))
 IMG_SIZE = (128, 128)
 ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png"}
 
-# Global model variable
-model = None
+# Multi-frame mode (/predict/frames): animated/multi-page formats, frames
+# classified per image and decoded-pixel budget across those frames
+MULTIFRAME_EXTENSIONS = ALLOWED_EXTENSIONS | {"gif", "tif", "tiff"}
+MULTIFRAME_MAX_FRAMES = int(os.getenv("MULTIFRAME_MAX_FRAMES", "16"))
+MULTIFRAME_MAX_PIXELS = int(os.getenv("MULTIFRAME_MAX_PIXELS", "50000000"))
+MULTIFRAME_MAX_SCAN_FRAMES = int(os.getenv("MULTIFRAME_MAX_SCAN_FRAMES", "1000"))
+
+# Clients can request the minimal {"label", "score"} schema with
+# ?compact=true or by sending this media type in the Accept header
+COMPACT_MEDIA_TYPE = "application/vnd.catdog.compact+json"
+
+# Batch pipeline: decoding threads overlap with model compute
+MAX_BATCH_FILES = 10
+INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", "32"))
+DECODE_WORKERS = int(os.getenv("DECODE_WORKERS", "4"))
+
+# Scheduler: share of inference capacity per priority class, and the
+# number of threads calling the model
+PRIORITY_WEIGHTS = parse_weights(
+    os.getenv("PRIORITY_WEIGHTS", "interactive=8,batch=2,background=1")
+)
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "1"))
+PRIORITY_HEADER = "x-priority"
+
+# Version label of the model loaded at startup
+MODEL_VERSION = os.getenv("MODEL_VERSION", "1")
+
+# Optional cascade: a small fast model decides confident images and only
+# scores within CASCADE_BAND of the 0.5 threshold go to the full model
+CASCADE_MODEL_PATH = os.getenv("CASCADE_MODEL_PATH", "")
+CASCADE_BAND = float(os.getenv("CASCADE_BAND", "0.15"))
+
+# Near-duplicate index: uploads whose penultimate-layer embedding is
+# within NEAR_DUP_THRESHOLD cosine similarity of a recent one reuse its
+# score and skip the classification head (0 entries disables it)
+NEAR_DUP_INDEX_SIZE = int(os.getenv("NEAR_DUP_INDEX_SIZE", "0"))
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.97"))
+NEAR_DUP_EVICTION = os.getenv("NEAR_DUP_EVICTION", "lru")
+
+# WebSocket frame streams: concurrent connections and frames in flight
+# per stream (clients may ask for fewer with ?max_outstanding=)
+STREAM_MAX_CONNECTIONS = int(os.getenv("STREAM_MAX_CONNECTIONS", "64"))
+STREAM_MAX_OUTSTANDING = int(os.getenv("STREAM_MAX_OUTSTANDING", "4"))
+MAX_FRAME_BYTES = 10 * 1024 * 1024
 
+# Opt-in traffic capture of the predict endpoints for replay_traffic.py:
+# share of requests sampled (0 = off), whether payloads are stored or only
+# hashes + size/format metadata, and rotation/size limits
+CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", "0"))
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", "captures")
+CAPTURE_PAYLOADS = os.getenv("CAPTURE_PAYLOADS", "0") == "1"
+CAPTURE_MAX_FILE_MB = int(os.getenv("CAPTURE_MAX_FILE_MB", "64"))
+CAPTURE_MAX_FILES = int(os.getenv("CAPTURE_MAX_FILES", "10"))
+CAPTURE_MAX_BLOB_MB = int(os.getenv("CAPTURE_MAX_BLOB_MB", "1024"))
+CAPTURE_MAX_QUEUE_MB = int(os.getenv("CAPTURE_MAX_QUEUE_MB", "64"))
 
-def download_model() -> None:
+# Prediction result cache: local LRU entries (0 = no local tier) in front
+# of an optional Redis-compatible store shared by all replicas
+# (redis://[:password@]host:port/db, empty = local only). Store lookups
+# slower than RESULT_CACHE_TIMEOUT_MS are treated as misses.
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "0"))
+RESULT_CACHE_URL = os.getenv("RESULT_CACHE_URL", "")
+RESULT_CACHE_TIMEOUT_MS = float(os.getenv("RESULT_CACHE_TIMEOUT_MS", "50"))
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", "86400"))
+
+# Tensor store: keep the resized uint8 pixels of every uploaded image so
+# rescore_archive.py can re-score them without decoding (empty = off)
+TENSOR_STORE_DIR = os.getenv("TENSOR_STORE_DIR", "")
+# Records waiting for the background writer before new ones are dropped
+TENSOR_STORE_QUEUE_SIZE = int(os.getenv("TENSOR_STORE_QUEUE_SIZE", "256"))
+
+# Admin endpoints (model hot-swap) are disabled unless a token is set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Loaded model versions; requests pick one through select_model()
+model_registry = ModelRegistry()
+_model_load_lock = threading.Lock()
+_embedder_lock = threading.Lock()
+
+# Cold-start artifact cache (None when MODEL_CACHE_DIR is empty)
+model_artifacts: Optional[ModelArtifactCache] = ModelArtifactCache(MODEL_CACHE_DIR) if MODEL_CACHE_DIR else None
+
+# Set by load_cascade() when CASCADE_MODEL_PATH is configured
+cascade: Optional[ModelCascade] = None
+# Fast model + band identity, part of model_key() while a cascade is on
+cascade_key = ""
+
+# Identical uploads in flight at the same time share one decode + inference
+single_flight = SingleFlight()
+# Repeats of an image within one /predict/batch request (computed once)
+batch_duplicate_hits = 0
+
+# Per-image results keyed on model version + content hash
+result_cache: Optional[TwoTierCache] = (
+    TwoTierCache(
+        RESULT_CACHE_SIZE,
+        connect(RESULT_CACHE_URL) if RESULT_CACHE_URL else None,
+        timeout=RESULT_CACHE_TIMEOUT_MS / 1000,
+        ttl=RESULT_CACHE_TTL_SECONDS
+    )
+    if RESULT_CACHE_SIZE > 0 or RESULT_CACHE_URL else None
+)
+
+# Resized uploads for later re-scoring (None unless TENSOR_STORE_DIR is set)
+tensor_store: Optional[TensorStore] = TensorStore(TENSOR_STORE_DIR, (*IMG_SIZE, 3)) if TENSOR_STORE_DIR else None
+# Appends happen on its thread, never on the request path
+tensor_writer: Optional[TensorStoreWriter] = (
+    TensorStoreWriter(tensor_store, TENSOR_STORE_QUEUE_SIZE) if tensor_store is not None else None
+)
+
+# Recent embeddings -> scores for near-duplicate uploads
+near_duplicates: Optional[NearDuplicateIndex] = (
+    NearDuplicateIndex(NEAR_DUP_INDEX_SIZE, NEAR_DUP_THRESHOLD, NEAR_DUP_EVICTION)
+    if NEAR_DUP_INDEX_SIZE > 0 else None
+)
+if near_duplicates is not None:
+    # Scores cached for the previous weights must not answer for new ones
+    model_registry.on_activate(lambda entry: near_duplicates.clear())
+
+# Sampled request recording (no-op unless CAPTURE_SAMPLE_RATE > 0)
+traffic_capture = TrafficRecorder(
+    CAPTURE_DIR,
+    CAPTURE_SAMPLE_RATE,
+    store_payloads=CAPTURE_PAYLOADS,
+    max_file_bytes=CAPTURE_MAX_FILE_MB * 1024 * 1024,
+    max_files=CAPTURE_MAX_FILES,
+    max_blob_bytes=CAPTURE_MAX_BLOB_MB * 1024 * 1024,
+    max_queue_bytes=CAPTURE_MAX_QUEUE_MB * 1024 * 1024
+)
+
+# Persistent /ws/predict connections
+frame_streams = FrameStreamHub(STREAM_MAX_CONNECTIONS, STREAM_MAX_OUTSTANDING, MAX_FRAME_BYTES)
+
+# Every model call goes through the scheduler (priority lanes + batching)
+scheduler = InferenceScheduler(
+    lambda batch, entry, kind: run_scheduled_batch(batch, entry, kind),
+    PRIORITY_WEIGHTS,
+    max_batch_size=INFERENCE_BATCH_SIZE,
+    workers=SCHEDULER_WORKERS
+)
+
+# Work the SIGTERM drain waits for besides accepted HTTP requests
+shutdown.add_pending_check(lambda: scheduler.queued_jobs)
+shutdown.add_pending_check(lambda: frame_streams.active_streams)
+shutdown.on_drain(frame_streams.close_all)
+
+
+def download_model(path: str = MODEL_PATH, file_id: str = GDRIVE_FILE_ID) -> None:
     """Download the trained model from Google Drive if not present"""
-    if not os.path.exists(MODEL_PATH):
+    if not os.path.exists(path):
         logger.info("Model not found. Downloading from Google Drive...")
         try:
-            url = f"https://drive.google.com/uc?id={GDRIVE_FILE_ID}"
-            gdown.download(url, MODEL_PATH, quiet=False)
+            url = f"https://drive.google.com/uc?id={file_id}"
+            gdown.download(url, path, quiet=False)
             logger.info("Model downloaded successfully!")
         except Exception as e:
             logger.error(f"Failed to download model: {e}")
@@ -63,31 +327,153 @@ def download_model() -> None:
             )
 
 
+def warm_up_model(loaded: keras.Model) -> None:
+    """Run one dummy prediction so the first real request doesn't pay graph tracing"""
+    loaded.predict(np.zeros((1, *IMG_SIZE, 3), dtype=np.float32), verbose=0)
+
+
+def load_keras_model(path: str) -> tuple[keras.Model, Dict[str, Any]]:
+    """
+    Load a .keras file, through the artifact cache when enabled
+    
+    Returns:
+        Tuple of (model, load timings reported in /model/info)
+    """
+    if model_artifacts is not None:
+        return model_artifacts.load(path)
+    start = time.perf_counter()
+    loaded = keras.models.load_model(path)
+    return loaded, {"source": "keras", "load_seconds": round(time.perf_counter() - start, 3)}
+
+
+def load_model_version(
+    version: str,
+    path: str = MODEL_PATH,
+    file_id: Optional[str] = GDRIVE_FILE_ID
+) -> LoadedModel:
+    """
+    Download (if needed), load and warm up one model version
+    
+    Args:
+        version: Version label reported in responses
+        path: Local path of the .keras file
+        file_id: Google Drive file ID to download from if path is missing
+        
+    Returns:
+        LoadedModel ready to be registered
+    """
+    if file_id:
+        download_model(path, file_id)
+    configure_cpu_threads()
+    loaded, load_info = load_keras_model(path)
+    start = time.perf_counter()
+    warm_up_model(loaded)
+    entry = LoadedModel(version, loaded, path)
+    if near_duplicates is not None:
+        ensure_embedder(entry)
+    load_info["warmup_seconds"] = round(time.perf_counter() - start, 3)
+    entry.load_info = load_info
+    return entry
+
+
+def ensure_embedder(entry: LoadedModel) -> Any:
+    """
+    Split off and warm up the embedding backbone on first use
+    
+    Only the near-duplicate index and /embed need it, so versions served
+    without either never pay for the split and its warm-up.
+    
+    Returns:
+        The version's embedder model
+    """
+    if entry.embedder is None:
+        with _embedder_lock:
+            if entry.embedder is None:
+                embedder, entry.head = split_model(entry.model)
+                warm_up_model(embedder)
+                entry.embedder = embedder  # Last: readers check it without the lock
+    return entry.embedder
+
+
+def startup_model_location() -> tuple[str, Optional[str]]:
+    """
+    Resolve MODEL_SOURCE to the startup model's path and download ID
+    
+    Returns:
+        Tuple of (local .keras path, Google Drive file ID or None)
+    """
+    if MODEL_SOURCE == "stub":
+        # Thread pools must be sized before building the stub starts TF
+        configure_cpu_threads()
+        return ensure_stub_model(STUB_MODEL_PATH, STUB_MODEL_SEED), None
+    if MODEL_SOURCE == "local":
+        if not os.path.exists(MODEL_PATH):
+            raise FileNotFoundError(f"MODEL_SOURCE=local but {MODEL_PATH} does not exist")
+        return MODEL_PATH, None
+    if MODEL_SOURCE == "gdrive":
+        return MODEL_PATH, GDRIVE_FILE_ID
+    raise ValueError(f"Unknown MODEL_SOURCE: {MODEL_SOURCE} (use gdrive, local or stub)")
+
+
 def load_model() -> keras.Model:
-    """Load the trained Keras model"""
-    global model
-    if model is None:
-        try:
-            download_model()
-            model = keras.models.load_model(MODEL_PATH)
-            logger.info("Model loaded successfully!")
-        except Exception as e:
-            logger.error(f"Failed to load model: {e}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to load model: {str(e)}"
-            )
-    return model
+    """Load the trained Keras model (the active version)"""
+    if model_registry.active is None:
+        with _model_load_lock:
+            if model_registry.active is None:
+                try:
+                    path, file_id = startup_model_location()
+                    model_registry.register(load_model_version(MODEL_VERSION, path, file_id), activate=True)
+                    load_cascade()
+                    logger.info(f"Model loaded successfully! (source: {MODEL_SOURCE})")
+                except Exception as e:
+                    logger.error(f"Failed to load model: {e}")
+                    raise HTTPException(
+                        status_code=500,
+                        detail=f"Failed to load model: {str(e)}"
+                    )
+    return model_registry.active.model
+
+
+def load_cascade() -> None:
+    """Load the fast first-stage model if a cascade is configured"""
+    global cascade, cascade_key
+    if not CASCADE_MODEL_PATH or cascade is not None:
+        return
+    fast_model, fast_info = load_keras_model(CASCADE_MODEL_PATH)
+    warm_up_model(fast_model)
+    fast_id = fast_info.get("sha256", "")[:12] or os.path.basename(CASCADE_MODEL_PATH)
+    cascade_key = f"cascade-{fast_id}-{CASCADE_BAND}"
+    cascade = ModelCascade(fast_model, CASCADE_BAND)
+    logger.info(f"Cascade enabled: {CASCADE_MODEL_PATH} (band ±{CASCADE_BAND})")
+
+
+def model_key(entry: LoadedModel) -> str:
+    """
+    Identity of the model behind a version, for keying cached results
+    
+    The version label plus the weights hash when known, and the cascade's
+    fast model and band when a cascade is on, so results from other
+    weights or another configuration never match.
+    """
+    sha256 = entry.load_info.get("sha256")
+    key = f"{entry.version}-{sha256[:12]}" if sha256 else entry.version
+    return f"{key}-{cascade_key}" if cascade_key else key
+
+
+def select_model() -> LoadedModel:
+    """Pick the model version for a request (honours any traffic split)"""
+    load_model()
+    return model_registry.select()
 
 
-def validate_image(file: UploadFile) -> None:
+def validate_image(file: UploadFile, allowed: set = ALLOWED_EXTENSIONS) -> None:
     """Validate uploaded image file"""
     # Check file extension
     file_ext = file.filename.split(".")[-1].lower() if file.filename else ""
-    if file_ext not in ALLOWED_EXTENSIONS:
+    if file_ext not in allowed:
         raise HTTPException(
             status_code=400,
-            detail=f"Invalid file type. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
+            detail=f"Invalid file type. Allowed types: {', '.join(allowed)}"
         )
     
     # Check file size (max 10MB)
@@ -103,15 +489,18 @@ def validate_image(file: UploadFile) -> None:
         )
 
 
-def preprocess_image(image: Image.Image) -> np.ndarray:
+def resize_image(image: Image.Image) -> np.ndarray:
     """
-    Preprocess image for model prediction
+    Convert and resize an image to the model's input size, as uint8 pixels
+    
+    This is the expensive part of preprocessing; its output is what the
+    tensor store keeps for re-scoring.
     
     Args:
         image: PIL Image object
         
     Returns:
-        Preprocessed numpy array ready for model input
+        uint8 array of shape (1, 128, 128, 3)
     """
     # Convert to RGB (handle RGBA, grayscale, etc.)
     if image.mode != "RGB":
@@ -120,13 +509,26 @@ def preprocess_image(image: Image.Image) -> np.ndarray:
     # Resize to model's expected input size
     image = image.resize(IMG_SIZE)
     
-    # Convert to numpy array and normalize to [0, 1]
-    img_array = np.array(image) / 255.0
-    
     # Add batch dimension: (1, 128, 128, 3)
-    img_array = np.expand_dims(img_array, axis=0)
+    return np.expand_dims(np.asarray(image, dtype=np.uint8), axis=0)
+
+
+def normalize_pixels(pixels: np.ndarray) -> np.ndarray:
+    """Scale uint8 pixels (any leading shape) to the model's [0, 1] input range"""
+    return pixels / 255.0
+
+
+def preprocess_image(image: Image.Image) -> np.ndarray:
+    """
+    Preprocess image for model prediction
     
-    return img_array
+    Args:
+        image: PIL Image object
+        
+    Returns:
+        Preprocessed numpy array ready for model input
+    """
+    return normalize_pixels(resize_image(image))
 
 
 def get_prediction_details(prediction_score: float) -> Dict[str, Any]:
@@ -139,33 +541,538 @@ def get_prediction_details(prediction_score: float) -> Dict[str, Any]:
     Returns:
         Dictionary with prediction details
     """
+    score = float(prediction_score)
+    
     # Binary classification: > 0.5 = Dog, <= 0.5 = Cat
-    is_dog = prediction_score > 0.5
+    is_dog = score > 0.5
     
-    # Calculate confidence as distance from decision boundary
-    confidence = prediction_score if is_dog else (1 - prediction_score)
+    # Probabilities as percentages; confidence is the winning class
+    dog_pct = round(score * 100, 2)
+    cat_pct = round((1 - score) * 100, 2)
     
     return {
         "prediction": "Dog" if is_dog else "Cat",
-        "confidence": round(float(confidence * 100), 2),  # Percentage
-        "raw_score": round(float(prediction_score), 4),
+        "confidence": dog_pct if is_dog else cat_pct,  # Percentage
+        "raw_score": round(score, 4),
         "probabilities": {
-            "cat": round(float(1 - prediction_score) * 100, 2),
-            "dog": round(float(prediction_score) * 100, 2)
+            "cat": cat_pct,
+            "dog": dog_pct
+        }
+    }
+
+
+def get_compact_prediction(prediction_score: float) -> Dict[str, Any]:
+    """
+    Minimal result for compact responses: label and raw dog score only
+    
+    Args:
+        prediction_score: Model output (0.0 to 1.0)
+        
+    Returns:
+        Dictionary with "label" and "score"
+    """
+    score = float(prediction_score)
+    return {"label": "Dog" if score > 0.5 else "Cat", "score": round(score, 4)}
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson when available
+    
+    Endpoints return these directly, which also skips FastAPI's
+    jsonable_encoder pass over the payload.
+    """
+    
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+        return json.dumps(content, separators=(",", ":")).encode("utf-8")
+
+
+def request_priority(request: HTTPConnection, default: str) -> str:
+    """
+    Scheduler priority for a request
+    
+    Clients may lower (never raise) their priority with the X-Priority
+    header, e.g. to run bulk jobs as "background".
+    """
+    requested = request.headers.get(PRIORITY_HEADER, default).lower()
+    if requested in PRIORITIES and PRIORITIES.index(requested) >= PRIORITIES.index(default):
+        return requested
+    return default
+
+
+@contextmanager
+def request_stage(name: str) -> Iterator[None]:
+    """
+    Time a request stage for the request log and account its memory
+    
+    Only for short in-thread stages (see MemoryTracker.stage); stages that
+    wait on the scheduler or run on the event loop use timed_stage alone.
+    """
+    with timed_stage(name), memory.stage(name):
+        yield
+
+
+def capture_request(request: Request, files: list[tuple[str, bytes]]) -> None:
+    """Hand a request's uploads to the traffic recorder (sampled, non-blocking)"""
+    if traffic_capture.enabled:
+        traffic_capture.record(
+            request.url.path,
+            files,
+            getattr(request.state, "arrival", None) or time.time(),
+            request.url.query,
+            request.headers.get(PRIORITY_HEADER)
+        )
+
+
+def wants_compact(request: Request, compact: bool) -> bool:
+    """Check the compact query flag and the Accept header"""
+    return compact or COMPACT_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def inject_latency(images: int) -> None:
+    """Sleep for the configured artificial model latency (if any)"""
+    delay_ms = INJECT_LATENCY_MS + INJECT_LATENCY_PER_IMAGE_MS * images
+    if delay_ms > 0:
+        time.sleep(delay_ms / 1000)
+
+
+def call_model(batch: np.ndarray, entry: LoadedModel) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Run one model version on a batch and record its latency
+    
+    With the near-duplicate index enabled the batch is embedded first;
+    images close to a recent one reuse its score and only the rest go
+    through the classification head.
+    
+    Args:
+        batch: Array of shape (N, 128, 128, 3)
+        entry: Model version to use
+        
+    Returns:
+        Tuple of (N raw dog scores, N stage names that decided each score)
+    """
+    start = time.perf_counter()
+    inject_latency(len(batch))
+    if near_duplicates is None:
+        scores = entry.model.predict(batch, batch_size=len(batch), verbose=0)[:, 0]
+        stages = np.full(len(batch), STAGE_FULL, dtype=object)
+    else:
+        embeddings = ensure_embedder(entry).predict(batch, batch_size=len(batch), verbose=0)
+        key = model_key(entry)
+        scores, hits = near_duplicates.lookup(key, embeddings)
+        misses = ~hits
+        if misses.any():
+            scores[misses] = entry.head(embeddings[misses])
+            near_duplicates.add(key, embeddings[misses], scores[misses])
+        stages = np.where(hits, STAGE_NEAR_DUPLICATE, STAGE_FULL).astype(object)
+    entry.record(time.perf_counter() - start, len(batch))
+    return scores, stages
+
+
+def run_model_batch(batch: np.ndarray, entry: LoadedModel) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Score a batch (runs on the scheduler's worker threads)
+    
+    Goes through the cascade when one is configured, otherwise straight
+    to the full model.
+    
+    Args:
+        batch: Array of shape (N, 128, 128, 3)
+        entry: Model version used as the full model
+        
+    Returns:
+        Tuple of (N raw dog scores, N stage names that decided each score)
+    """
+    if cascade is not None:
+        return cascade.run(batch, lambda subset: call_model(subset, entry)[0])
+    return call_model(batch, entry)
+
+
+def embed_batch(batch: np.ndarray, entry: LoadedModel) -> np.ndarray:
+    """
+    Compute penultimate-layer embeddings (runs on the scheduler's workers)
+    
+    Args:
+        batch: Array of shape (N, 128, 128, 3)
+        entry: Model version to use
+        
+    Returns:
+        Array of N flattened embeddings
+    """
+    inject_latency(len(batch))
+    embeddings = ensure_embedder(entry).predict(batch, batch_size=len(batch), verbose=0)
+    return embeddings.reshape(len(batch), -1)
+
+
+def run_scheduled_batch(batch: np.ndarray, entry: LoadedModel, kind: str) -> Any:
+    """Scheduler entry point: dispatch a merged batch by job kind"""
+    if kind == "embed":
+        return embed_batch(batch, entry)
+    return run_model_batch(batch, entry)
+
+
+def archive_pixels(digest: Optional[str], pixels: np.ndarray) -> None:
+    """Queue resized upload pixels for the tensor store (dropped when the writer falls behind)"""
+    if tensor_writer is None or digest is None:
+        return
+    tensor_writer.submit(digest, pixels)
+
+
+def predict_scores(
+    batch: np.ndarray,
+    entry: Optional[LoadedModel] = None,
+    priority: str = "interactive",
+    client: str = "default",
+    expired: Optional[Callable[[], bool]] = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Run the model on a batch of preprocessed images via the scheduler
+    
+    Args:
+        batch: Array of shape (N, 128, 128, 3)
+        entry: Model version to use (default: select one)
+        priority: Scheduler priority class
+        client: Caller identity for per-client fairness
+        expired: Drops the job if true once it leaves the queue
+            (default: the current request's deadline/disconnect check)
+        
+    Returns:
+        Tuple of (N raw dog scores, N stage names that decided each score)
+        
+    Raises:
+        JobExpired: The request expired while its job was queued
+    """
+    entry = entry or select_model()
+    return scheduler.predict(batch, entry, priority, client, expired or current_expiry())
+
+
+def predict_score(
+    image: Image.Image,
+    entry: Optional[LoadedModel] = None,
+    priority: str = "interactive",
+    client: str = "default",
+    digest: Optional[str] = None
+) -> tuple[float, str]:
+    """
+    Preprocess an image and return the model's raw dog score
+    
+    Args:
+        image: PIL Image object
+        entry: Model version to use (default: select one)
+        priority: Scheduler priority class
+        client: Caller identity for per-client fairness
+        digest: Content hash of the upload, to keep its pixels in the tensor store
+        
+    Returns:
+        Tuple of (model output 0.0 to 1.0, stage that decided it)
+    """
+    with request_stage("preprocess"):
+        pixels = resize_image(image)
+        archive_pixels(digest, pixels)
+        batch = normalize_pixels(pixels)
+    with timed_stage("inference"):
+        scores, stages = predict_scores(batch, entry, priority, client)
+    return float(scores[0]), stages[0]
+
+
+def predict_image_bytes(
+    contents: bytes,
+    entry: Optional[LoadedModel] = None,
+    priority: str = "interactive",
+    client: str = "default",
+    digest: Optional[str] = None
+) -> tuple[float, str, tuple, str]:
+    """
+    Decode, preprocess and score one encoded image
+    
+    Args:
+        contents: Encoded image bytes
+        entry: Model version to use (default: select one)
+        priority: Scheduler priority class
+        client: Caller identity for per-client fairness
+        digest: Content hash of contents if the caller has it (saves rehashing)
+        
+    Returns:
+        Tuple of (raw dog score, deciding stage, image size, image mode)
+    """
+    with request_stage("decode"):
+        image = Image.open(io.BytesIO(contents))
+        image.load()
+    if tensor_writer is not None and digest is None:
+        digest = content_hash(contents)
+    score, stage = predict_score(image, entry, priority, client, digest)
+    return score, stage, image.size, image.mode
+
+
+def result_cache_key(entry: LoadedModel, digest: str) -> str:
+    """Result cache key: model key (see model_key) and content hash"""
+    return f"{model_key(entry)}:{digest}"
+
+
+def cached_result(score: float, stage: str, image_size: tuple, image_mode: str) -> Dict[str, Any]:
+    """What the result cache stores per image"""
+    return {"score": float(score), "stage": stage, "size": list(image_size), "mode": image_mode}
+
+
+async def predict_upload(
+    request: Request,
+    contents: bytes,
+    entry: LoadedModel,
+    priority: str = "interactive",
+    client: str = "default"
+) -> tuple[float, str, tuple, str]:
+    """
+    Score one upload via the result cache, then single-flight decode + inference
+    
+    Returns:
+        Tuple of (raw dog score, deciding stage, image size, image mode);
+        the stage is "cache" for cached results
+    """
+    digest = content_hash(contents)
+    key = result_cache_key(entry, digest)
+    if result_cache is not None:
+        cached = await result_cache.get(key)
+        if cached is not None:
+            return cached["score"], STAGE_CACHE, tuple(cached["size"]), cached["mode"]
+
+    async def compute() -> tuple[float, str, tuple, str]:
+        result = await run_in_threadpool(predict_image_bytes, contents, entry, priority, client, digest)
+        if result_cache is not None:
+            result_cache.put_many({key: cached_result(*result)})
+        return result
+
+    # Identical uploads already in flight share the computation
+    return await predict_shared(request, (entry.version, digest), compute)
+
+
+def predict_frames_bytes(
+    contents: bytes,
+    max_frames: int = MULTIFRAME_MAX_FRAMES,
+    sampling: str = "uniform",
+    stride: int = 1,
+    entry: Optional[LoadedModel] = None,
+    priority: str = "batch",
+    client: str = "default"
+) -> Dict[str, Any]:
+    """
+    Sample, decode and score the frames of a multi-frame image in one batch
+    
+    Args:
+        contents: Encoded image bytes (GIF, multi-page TIFF, or a still image)
+        max_frames: Frames to classify (capped by MULTIFRAME_MAX_FRAMES and
+            the MULTIFRAME_MAX_PIXELS decoded-pixel budget)
+        sampling: Frame sampling strategy (see multiframe.SAMPLING_STRATEGIES)
+        stride: Step for the "stride" strategy
+        entry: Model version to use (default: select one)
+        priority: Scheduler priority class
+        client: Caller identity for per-client fairness
+        
+    Returns:
+        Dictionary with total frames (None when sampling did not need to
+        scan them all), sampled frame indices, per-frame scores and stages,
+        and the decoded image size and mode
+        
+    Raises:
+        TooManyFrames: The image has more than MULTIFRAME_MAX_SCAN_FRAMES
+            frames and the sampling would have to walk them
+    """
+    image = Image.open(io.BytesIO(contents))
+    image_size, image_mode = image.size, image.mode
+    budget = frame_budget(image, min(max_frames, MULTIFRAME_MAX_FRAMES), MULTIFRAME_MAX_PIXELS)
+    total, indices = plan_frames(image, budget, sampling, stride, MULTIFRAME_MAX_SCAN_FRAMES)
+    batch = decode_frames(image, indices, preprocess_image)
+    scores, stages = predict_scores(batch, entry, priority, client)
+    return {
+        "total_frames": total,
+        "indices": indices,
+        "scores": scores,
+        "stages": stages,
+        "image_size": image_size,
+        "image_mode": image_mode
+    }
+
+
+def decode_image_bytes(contents: bytes, digest: Optional[str] = None) -> tuple[np.ndarray, Image.Image]:
+    """
+    Decode and preprocess raw image bytes (pipeline decode stage)
+    
+    Args:
+        contents: Encoded image bytes
+        digest: Content hash of contents if the caller has it (saves rehashing)
+        
+    Returns:
+        Tuple of (preprocessed array, decoded PIL image)
+    """
+    with request_stage("decode"):
+        image = Image.open(io.BytesIO(contents))
+        image.load()
+    with request_stage("preprocess"):
+        pixels = resize_image(image)
+        if tensor_writer is not None:
+            archive_pixels(digest or content_hash(contents), pixels)
+        return normalize_pixels(pixels), image
+
+
+def create_batch_pipeline(
+    batch_size: int = INFERENCE_BATCH_SIZE,
+    decode_workers: int = DECODE_WORKERS,
+    entry: Optional[LoadedModel] = None,
+    priority: str = "batch",
+    client: str = "default"
+) -> InferencePipeline:
+    """
+    Build the decode/inference pipeline used for batch workloads
+    
+    Items fed to the pipeline are (encoded image bytes, content hash or
+    None) pairs; each result's context is the decoded PIL image. Passing entry pins every batch to
+    one model version; priority and client are passed to the scheduler.
+    The stage threads run in a copy of the caller's context, so the
+    request's expiry check and memory record still apply.
+    """
+    return InferencePipeline(
+        decode_fn=lambda item: decode_image_bytes(*item),
+        predict_fn=lambda batch: predict_scores(batch, entry, priority, client),
+        batch_size=batch_size,
+        decode_workers=decode_workers
+    )
+
+
+def embed_image_bytes(
+    payloads: list[bytes],
+    entry: Optional[LoadedModel] = None,
+    priority: str = "batch",
+    client: str = "default"
+) -> list[Any]:
+    """
+    Decode images and compute their embeddings in one scheduled batch
+    
+    Args:
+        payloads: Encoded image bytes
+        entry: Model version to use (default: select one)
+        priority: Scheduler priority class
+        client: Caller identity for per-client fairness
+        
+    Returns:
+        One embedding array or Exception per payload, in order
+        
+    Raises:
+        JobExpired: The request expired while its job was queued
+    """
+    entry = entry or select_model()
+    results: list[Any] = [None] * len(payloads)
+    arrays = []
+    decoded = []
+    for index, contents in enumerate(payloads):
+        try:
+            arrays.append(decode_image_bytes(contents)[0])
+            decoded.append(index)
+        except Exception as e:
+            results[index] = e
+    if arrays:
+        embeddings = scheduler.predict(
+            np.concatenate(arrays), entry, priority, client, current_expiry(), kind="embed"
+        )
+        for index, embedding in zip(decoded, embeddings):
+            results[index] = embedding
+    return results
+
+
+def build_prediction_response(
+    prediction_score: float,
+    image_size: tuple,
+    image_mode: str,
+    filename: str = None,
+    model_version: str = None,
+    decided_by: str = STAGE_FULL
+) -> Dict[str, Any]:
+    """
+    Build the full /predict response body for a score
+    
+    Args:
+        prediction_score: Model output (0.0 to 1.0)
+        image_size: Original (width, height) of the decoded image
+        image_mode: PIL mode of the decoded image
+        filename: Original filename, echoed back in the response
+        model_version: Version of the model that produced the score
+        decided_by: Cascade stage that produced the score ("fast"/"full")
+        
+    Returns:
+        Dictionary in the /predict response format
+    """
+    result = get_prediction_details(prediction_score)
+    
+    annotate(prediction=result["prediction"], confidence=result["confidence"])
+    
+    return {
+        "success": True,
+        "filename": filename,
+        "prediction": result["prediction"],
+        "confidence_percentage": result["confidence"],
+        "raw_score": result["raw_score"],
+        "probabilities": result["probabilities"],
+        "model_version": model_version,
+        "decided_by": decided_by,
+        "metadata": {
+            "image_size": image_size,
+            "image_mode": image_mode,
+            "model_input_size": IMG_SIZE
         }
     }
 
 
+def predict_pil_image(image: Image.Image, filename: str = None) -> Dict[str, Any]:
+    """
+    Run the full preprocess/predict pipeline on an already decoded image
+    
+    Shared by the /predict endpoint and in-process callers (e.g. the
+    Streamlit app in single-host deployments) so both return the same
+    response shape.
+    
+    Args:
+        image: PIL Image object
+        filename: Original filename, echoed back in the response
+        
+    Returns:
+        Dictionary in the /predict response format
+    """
+    entry = select_model()
+    score, stage = predict_score(image, entry)
+    return build_prediction_response(
+        score, image.size, image.mode, filename, entry.version, stage
+    )
+
+
 # API Endpoints
 
 @app.on_event("startup")
 async def startup_event():
     """Load model on application startup"""
+    configure_logging(LOG_LEVEL, json_format=LOG_FORMAT == "json")
     logger.info("Starting Cat vs Dog Classifier API...")
+    memory.start()
+    traffic_capture.start()
+    if tensor_writer is not None:
+        tensor_writer.start()
     load_model()
+    # After uvicorn installed its handlers, so the drain can wrap them
+    shutdown.install()
     logger.info("API ready to accept requests!")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the inference workers, flush captured traffic, archived tensors, cache writes and pending log records"""
+    await run_in_threadpool(scheduler.stop)
+    traffic_capture.stop()
+    if tensor_writer is not None:
+        await run_in_threadpool(tensor_writer.stop)
+    if result_cache is not None:
+        await result_cache.close()
+    stop_logging()
+
+
 @app.get("/")
 async def root():
     """Root endpoint - API information"""
@@ -176,23 +1083,36 @@ async def root():
         "endpoints": {
             "predict": "/predict (POST)",
             "health": "/health (GET)",
+            "ready": "/ready (GET, 503 while starting or shutting down)",
             "model_info": "/model/info (GET)",
+            "predict_frames": "/predict/frames (POST, animated GIF / multi-page)",
+            "embed": "/embed (POST)",
+            "stream": "/ws/predict (WebSocket, binary frames)",
+            "metrics": "/metrics (GET)",
+            "admin": "/admin/models, /admin/traffic, /debug/memory (requires X-Admin-Token)",
             "docs": "/docs (Interactive API documentation)"
         }
     }
 
 
+def get_health_status() -> Dict[str, Any]:
+    """Report whether the model is loaded and available on disk"""
+    active = model_registry.active
+    model_path = active.path if active is not None else MODEL_PATH
+    return {
+        "status": "healthy" if active is not None else "unhealthy",
+        "model_loaded": active is not None,
+        "model_source": MODEL_SOURCE,
+        "model_path": model_path,
+        "model_exists": os.path.exists(model_path)
+    }
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     try:
-        model_loaded = model is not None
-        return {
-            "status": "healthy" if model_loaded else "unhealthy",
-            "model_loaded": model_loaded,
-            "model_path": MODEL_PATH,
-            "model_exists": os.path.exists(MODEL_PATH)
-        }
+        return get_health_status()
     except Exception as e:
         return JSONResponse(
             status_code=503,
@@ -200,32 +1120,103 @@ async def health_check():
         )
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: the model is loaded and the instance is not shutting down"""
+    ready = model_registry.active is not None and not shutdown.draining
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "draining": shutdown.draining}
+    )
+
+
+def get_model_info_data() -> Dict[str, Any]:
+    """
+    Collect metadata about the loaded model
+    
+    Returns:
+        Dictionary with model details and capabilities
+    """
+    load_model()
+    active = model_registry.active
+    registry_info = model_registry.info()
+    return {
+        "model_name": "Dogs vs Cats CNN Classifier",
+        "model_type": "Convolutional Neural Network",
+        "model_version": active.version,
+        "model_source": MODEL_SOURCE,
+        "loaded_versions": registry_info["versions"],
+        "traffic": registry_info["traffic"],
+        "input_shape": (128, 128, 3),
+        "output_classes": ["Cat", "Dog"],
+        "model_size_mb": round(os.path.getsize(active.path) / (1024 * 1024), 2),
+        "framework": "TensorFlow/Keras",
+        "training_accuracy": "~92%",
+        "supported_formats": list(ALLOWED_EXTENSIONS),
+        "cpu_threads": thread_settings
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Serving metrics: admission control load, scheduler, dedup and cascade counters"""
+    return {
+        "admission": {
+            "interactive": admission.stats(),
+            "batch": batch_admission.stats()
+        },
+        "scheduler": scheduler.stats(),
+        "dedup": {**single_flight.stats(), "batch_duplicate_hits": batch_duplicate_hits},
+        "cascade": cascade.stats() if cascade is not None else None,
+        "near_duplicates": near_duplicates.stats() if near_duplicates is not None else None,
+        "streams": frame_streams.stats(),
+        "capture": traffic_capture.stats() if traffic_capture.enabled else None,
+        "result_cache": result_cache.stats() if result_cache is not None else None,
+        "tensor_store": (
+            {**tensor_store.stats(), "writer": tensor_writer.stats()} if tensor_store is not None else None
+        ),
+        "shutdown": shutdown.stats()
+    }
+
+
 @app.get("/model/info")
 async def model_info():
     """Get information about the loaded model"""
     try:
-        current_model = load_model()
-        return {
-            "model_name": "Dogs vs Cats CNN Classifier",
-            "model_type": "Convolutional Neural Network",
-            "input_shape": (128, 128, 3),
-            "output_classes": ["Cat", "Dog"],
-            "model_size_mb": round(os.path.getsize(MODEL_PATH) / (1024 * 1024), 2),
-            "framework": "TensorFlow/Keras",
-            "training_accuracy": "~92%",
-            "supported_formats": list(ALLOWED_EXTENSIONS)
-        }
+        return get_model_info_data()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def predict_shared(request: Request, key: Any, fn: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Run fn() through single-flight, retrying if the shared job expired
+
+    A follower must not fail just because the leader's deadline passed or
+    its client left while the job was queued: if this request is still
+    active it runs the work again (becoming the new leader).
+    """
+    while True:
+        try:
+            return await single_flight.do(key, fn)
+        except JobExpired:
+            budget = getattr(request.state, "budget", None)
+            if budget is None or budget.expired():
+                raise
+
+
 @app.post("/predict")
-async def predict_image(file: UploadFile = File(...)):
+async def predict_image(
+    request: Request,
+    file: UploadFile = File(...),
+    compact: bool = Query(False, description="Return only label and score")
+):
     """
     Predict whether the uploaded image contains a cat or dog
     
     Args:
         file: Image file (JPG, JPEG, PNG)
+        compact: Return the minimal {"label", "score"} schema
         
     Returns:
         JSON with prediction, confidence, and probabilities
@@ -234,39 +1225,34 @@ async def predict_image(file: UploadFile = File(...)):
         # Validate file
         validate_image(file)
         
-        # Read and process image
         contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
+        capture_request(request, [(file.filename, contents)])
         
-        # Preprocess for model
-        processed_image = preprocess_image(image)
-        
-        # Get model and make prediction
-        current_model = load_model()
-        prediction = current_model.predict(processed_image, verbose=0)
-        prediction_score = prediction[0][0]
-        
-        # Get detailed results
-        result = get_prediction_details(prediction_score)
-        
-        logger.info(f"Prediction: {result['prediction']} ({result['confidence']}%)")
-        
-        return {
-            "success": True,
-            "filename": file.filename,
-            "prediction": result["prediction"],
-            "confidence_percentage": result["confidence"],
-            "raw_score": result["raw_score"],
-            "probabilities": result["probabilities"],
-            "metadata": {
-                "image_size": image.size,
-                "image_mode": image.mode,
-                "model_input_size": IMG_SIZE
-            }
-        }
+        # Skip inference if the client is gone or out of time
+        await check_request_active(request, admission)
+        
+        # Cached result, or decode + inference shared with identical uploads in flight
+        entry = select_model()
+        score, stage, image_size, image_mode = await predict_upload(
+            request, contents, entry, request_priority(request, "interactive"), client_id_from_scope(request.scope)
+        )
+        await check_request_active(request, admission, after_inference=True)
+        headers = {"X-Model-Version": entry.version}
+        
+        with timed_stage("response"):
+            if wants_compact(request, compact):
+                return FastJSONResponse(get_compact_prediction(score), headers=headers)
+            return FastJSONResponse(
+                build_prediction_response(
+                    score, image_size, image_mode, file.filename, entry.version, stage
+                ),
+                headers=headers
+            )
         
     except HTTPException:
         raise
+    except JobExpired:
+        raise dropped_request_error(request)
     except Exception as e:
         logger.error(f"Prediction error: {e}")
         raise HTTPException(
@@ -276,59 +1262,455 @@ async def predict_image(file: UploadFile = File(...)):
 
 
 @app.post("/predict/batch")
-async def predict_batch(files: list[UploadFile] = File(...)):
+async def predict_batch(
+    request: Request,
+    files: list[UploadFile] = File(...),
+    compact: bool = Query(False, description="Return only label and score")
+):
     """
     Predict multiple images in a single request
     
     Args:
         files: List of image files
+        compact: Return the minimal {"label", "score"} schema per image
         
     Returns:
         JSON with predictions for each image
     """
-    if len(files) > 10:
+    global batch_duplicate_hits
+    if len(files) > MAX_BATCH_FILES:
         raise HTTPException(
             status_code=400,
-            detail="Maximum 10 images allowed per batch request"
+            detail=f"Maximum {MAX_BATCH_FILES} images allowed per batch request"
         )
     
-    results = []
+    compact = wants_compact(request, compact)
+    results = [None] * len(files)
     
-    for file in files:
+    # Validate and read uploads; decoding and inference happen in the pipeline.
+    # Duplicate images within the request are computed once.
+    payloads = []
+    uploads = []
+    duplicates = {}
+    first_by_hash = {}
+    for index, file in enumerate(files):
         try:
             validate_image(file)
             contents = await file.read()
-            image = Image.open(io.BytesIO(contents))
-            processed_image = preprocess_image(image)
-            
-            current_model = load_model()
-            prediction = current_model.predict(processed_image, verbose=0)
-            prediction_score = prediction[0][0]
-            
-            result = get_prediction_details(prediction_score)
-            
-            results.append({
+        except Exception as e:
+            results[index] = e
+            continue
+        uploads.append((file.filename, contents))
+        digest = content_hash(contents)
+        if digest in first_by_hash:
+            duplicates[index] = first_by_hash[digest]
+            batch_duplicate_hits += 1
+            continue
+        first_by_hash[digest] = index
+        payloads.append((index, contents, digest))
+    capture_request(request, uploads)
+    
+    await check_request_active(request, batch_admission)
+    
+    # One version serves the whole request so results are comparable
+    entry = select_model()
+    
+    # Results computed earlier (here or on another replica): one store round trip
+    cache_keys = {}
+    if result_cache is not None and payloads:
+        cache_keys = {index: result_cache_key(entry, digest) for index, _, digest in payloads}
+        cached = await result_cache.get_many(list(cache_keys.values()))
+        misses = []
+        for payload, hit in zip(payloads, cached):
+            index = payload[0]
+            if hit is None:
+                misses.append(payload)
+            else:
+                results[index] = PipelineResult(index, None, hit["score"], None, STAGE_CACHE)
+        payloads = misses
+    
+    pipeline = create_batch_pipeline(
+        decode_workers=min(DECODE_WORKERS, max(len(payloads), 1)),
+        entry=entry,
+        priority=request_priority(request, "batch"),
+        client=client_id_from_scope(request.scope)
+    )
+    outcomes = await run_in_threadpool(
+        lambda: list(pipeline.run((contents, digest) for _, contents, digest in payloads))
+    )
+    for outcome in outcomes:
+        index = payloads[outcome.index][0]
+        results[index] = outcome.error if outcome.error is not None else outcome
+    if cache_keys:
+        result_cache.put_many({
+            cache_keys[payloads[outcome.index][0]]: cached_result(
+                outcome.score, outcome.stage, outcome.context.size, outcome.context.mode
+            )
+            for outcome in outcomes if outcome.error is None
+        })
+    for index, original in duplicates.items():
+        results[index] = results[original]
+    await check_request_active(request, batch_admission, after_inference=True)
+    
+    for index, (file, outcome) in enumerate(zip(files, results)):
+        if isinstance(outcome, Exception):
+            if compact:
+                results[index] = {"error": str(outcome)}
+            else:
+                results[index] = {
+                    "filename": file.filename,
+                    "success": False,
+                    "error": str(outcome)
+                }
+        elif compact:
+            results[index] = get_compact_prediction(outcome.score)
+        else:
+            result = get_prediction_details(outcome.score)
+            results[index] = {
                 "filename": file.filename,
                 "success": True,
                 "prediction": result["prediction"],
                 "confidence_percentage": result["confidence"],
-                "probabilities": result["probabilities"]
-            })
-            
-        except Exception as e:
-            results.append({
-                "filename": file.filename,
-                "success": False,
-                "error": str(e)
-            })
+                "probabilities": result["probabilities"],
+                "decided_by": outcome.stage
+            }
     
-    return {
+    headers = {"X-Model-Version": entry.version}
+    if compact:
+        return FastJSONResponse({"results": results}, headers=headers)
+    
+    return FastJSONResponse({
         "success": True,
         "total_images": len(files),
+        "model_version": entry.version,
+        "results": results
+    }, headers=headers)
+
+
+@app.post("/predict/frames")
+async def predict_frames(
+    request: Request,
+    file: UploadFile = File(...),
+    max_frames: int = Query(MULTIFRAME_MAX_FRAMES, ge=1, description="Frames to classify"),
+    sampling: str = Query("uniform", description="Frame sampling: uniform, first or stride"),
+    stride: int = Query(1, ge=1, description="Step for stride sampling"),
+    aggregate: str = Query("mean", description="Aggregate score: mean, median, max or min"),
+    compact: bool = Query(False, description="Return only labels and scores")
+):
+    """
+    Classify the frames of an animated GIF or multi-page image
+    
+    Sampled frames run as one batched forward pass; the response has a
+    score per sampled frame plus an aggregate prediction.
+    
+    Args:
+        file: Image file (GIF, TIFF, JPG, JPEG, PNG)
+        max_frames: Frames to classify (capped by the server limits)
+        sampling: How frames are chosen
+        stride: Step for stride sampling
+        aggregate: How frame scores are combined
+        compact: Return the minimal {"label", "score"} schema
+        
+    Returns:
+        JSON with the aggregate prediction and per-frame scores
+    """
+    if sampling not in SAMPLING_STRATEGIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid sampling. Allowed: {', '.join(SAMPLING_STRATEGIES)}"
+        )
+    if aggregate not in AGGREGATIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid aggregate. Allowed: {', '.join(AGGREGATIONS)}"
+        )
+    
+    try:
+        validate_image(file, MULTIFRAME_EXTENSIONS)
+        contents = await file.read()
+        capture_request(request, [(file.filename, contents)])
+        
+        await check_request_active(request, batch_admission)
+        
+        entry = select_model()
+        frames = await run_in_threadpool(
+            predict_frames_bytes,
+            contents,
+            max_frames,
+            sampling,
+            stride,
+            entry,
+            request_priority(request, "batch"),
+            client_id_from_scope(request.scope)
+        )
+        await check_request_active(request, batch_admission, after_inference=True)
+        score = aggregate_scores(frames["scores"], aggregate)
+        per_frame = [
+            {"frame": index, **get_compact_prediction(frame_score), "decided_by": stage}
+            for index, frame_score, stage in zip(frames["indices"], frames["scores"], frames["stages"])
+        ]
+        headers = {"X-Model-Version": entry.version}
+        
+        if wants_compact(request, compact):
+            return FastJSONResponse(
+                {**get_compact_prediction(score), "frames": per_frame},
+                headers=headers
+            )
+        response = build_prediction_response(
+            score, frames["image_size"], frames["image_mode"], file.filename, entry.version
+        )
+        response.pop("decided_by")
+        response["aggregate"] = aggregate
+        response["total_frames"] = frames["total_frames"]
+        response["sampled_frames"] = len(per_frame)
+        response["sampling"] = sampling
+        response["frames"] = per_frame
+        return FastJSONResponse(response, headers=headers)
+    
+    except HTTPException:
+        raise
+    except TooManyFrames as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except JobExpired:
+        raise dropped_request_error(request)
+    except Exception as e:
+        logger.error(f"Multi-frame prediction error: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Prediction failed: {str(e)}"
+        )
+
+
+@app.post("/embed")
+async def embed_images(request: Request, files: list[UploadFile] = File(...)):
+    """
+    Return the CNN's penultimate-layer embedding for each image
+    
+    Args:
+        files: List of image files (same limits as /predict/batch)
+        
+    Returns:
+        JSON with one embedding vector (or error) per image
+    """
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Maximum {MAX_BATCH_FILES} images allowed per embedding request"
+        )
+    
+    results: list[Any] = [None] * len(files)
+    payloads = []
+    for index, file in enumerate(files):
+        try:
+            validate_image(file)
+            payloads.append((index, await file.read()))
+        except Exception as e:
+            results[index] = e
+    
+    await check_request_active(request, batch_admission)
+    
+    entry = select_model()
+    try:
+        embeddings = await run_in_threadpool(
+            embed_image_bytes,
+            [contents for _, contents in payloads],
+            entry,
+            request_priority(request, "batch"),
+            client_id_from_scope(request.scope)
+        )
+    except JobExpired:
+        raise dropped_request_error(request)
+    for (index, _), embedding in zip(payloads, embeddings):
+        results[index] = embedding
+    await check_request_active(request, batch_admission, after_inference=True)
+    
+    embedding_dim = None
+    for index, (file, outcome) in enumerate(zip(files, results)):
+        if isinstance(outcome, Exception):
+            results[index] = {"filename": file.filename, "success": False, "error": str(outcome)}
+        else:
+            embedding_dim = len(outcome)
+            results[index] = {"filename": file.filename, "success": True, "embedding": outcome.tolist()}
+    
+    return FastJSONResponse({
+        "success": True,
+        "model_version": entry.version,
+        "embedding_dim": embedding_dim,
         "results": results
+    }, headers={"X-Model-Version": entry.version})
+
+
+async def classify_frame(contents: bytes, priority: str, client: str) -> Dict[str, Any]:
+    """
+    Classify one streamed frame without blocking the event loop
+    
+    The frame is submitted to the scheduler directly, so frames from
+    concurrent streams are merged into shared model calls.
+    
+    Args:
+        contents: Encoded frame bytes
+        priority: Scheduler priority class
+        client: Caller identity for per-client fairness
+        
+    Returns:
+        Compact prediction plus deciding stage and model version
+    """
+    array, _ = await run_in_threadpool(decode_image_bytes, contents)
+    entry = select_model()
+    scores, stages = await asyncio.wrap_future(scheduler.submit(array, entry, priority, client))
+    return {
+        **get_compact_prediction(scores[0]),
+        "decided_by": stages[0],
+        "model_version": entry.version
     }
 
 
+@app.websocket("/ws/predict")
+async def predict_stream(
+    websocket: WebSocket,
+    sample_every: int = Query(1, description="Classify every Nth frame"),
+    max_outstanding: int = Query(0, description="Frames in flight before dropping (0 = server limit)")
+):
+    """
+    Classify a continuous stream of binary frames on one connection
+    
+    Each binary message is one encoded frame; results are pushed back as
+    JSON text messages tagged with the frame number.
+    """
+    priority = request_priority(websocket, "interactive")
+    client = client_id_from_scope(websocket.scope)
+    await frame_streams.serve(
+        websocket,
+        lambda contents: classify_frame(contents, priority, client),
+        sample_every,
+        max_outstanding
+    )
+
+
+# Admin Endpoints - model hot-swap and traffic splitting
+
+class ModelLoadRequest(BaseModel):
+    """Body for loading a new model version"""
+    version: str
+    path: Optional[str] = None
+    gdrive_file_id: Optional[str] = None
+    activate: bool = True
+
+
+class TrafficSplitRequest(BaseModel):
+    """Body for splitting traffic between loaded versions"""
+    weights: Dict[str, float] = {}
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Reject admin calls unless ADMIN_TOKEN is configured and matches"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=403,
+            detail="Admin endpoints are disabled (set ADMIN_TOKEN to enable)"
+        )
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@app.get("/admin/models", dependencies=[Depends(require_admin)])
+async def list_model_versions():
+    """List loaded model versions, traffic split and background load jobs"""
+    return model_registry.info()
+
+
+@app.post("/admin/models", status_code=202, dependencies=[Depends(require_admin)])
+async def load_model_version_endpoint(body: ModelLoadRequest):
+    """
+    Load a model version in the background, warm it up and (optionally)
+    swap it in atomically once ready. Current traffic keeps being served
+    by the existing version meanwhile; poll GET /admin/models for status.
+    """
+    path = body.path or f"dogs_vs_cats_{body.version}.keras"
+    if not body.gdrive_file_id and not os.path.exists(path):
+        raise HTTPException(status_code=400, detail=f"Model file not found: {path}")
+    try:
+        model_registry.load_in_background(
+            body.version,
+            lambda: load_model_version(body.version, path, body.gdrive_file_id),
+            activate=body.activate
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "loading", "version": body.version, "path": path}
+
+
+@app.post("/admin/models/{version}/activate", dependencies=[Depends(require_admin)])
+async def activate_model_version(version: str):
+    """Route all traffic to an already loaded version"""
+    try:
+        model_registry.activate(version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return model_registry.info()
+
+
+@app.delete("/admin/models/{version}", dependencies=[Depends(require_admin)])
+async def unload_model_version(version: str):
+    """Unload a version that no longer serves traffic"""
+    entry = model_registry.get(version)
+    try:
+        model_registry.unload(version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if near_duplicates is not None and entry is not None:
+        near_duplicates.remove_model(model_key(entry))
+    return model_registry.info()
+
+
+@app.put("/admin/traffic", dependencies=[Depends(require_admin)])
+async def set_traffic_split(body: TrafficSplitRequest):
+    """Split traffic between loaded versions by weight ({} = active only)"""
+    try:
+        model_registry.set_traffic(body.weights)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return model_registry.info()
+
+
+# Debug Endpoints - memory accounting (admin token required)
+
+@app.get("/debug/memory", dependencies=[Depends(require_admin)])
+async def memory_status():
+    """RSS history, traced memory and per-stage allocation peaks"""
+    return memory.stats()
+
+
+@app.post("/debug/memory/snapshots", dependencies=[Depends(require_admin)])
+async def take_memory_snapshot(label: str = Query(..., description="Name to diff against later")):
+    """Store a tracemalloc snapshot (requires MEMORY_TRACKING=1)"""
+    try:
+        return await run_in_threadpool(memory.take_snapshot, label)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get("/debug/memory/diff", dependencies=[Depends(require_admin)])
+async def diff_memory_snapshots(
+    base: str = Query(..., description="Earlier snapshot label"),
+    target: Optional[str] = Query(None, description="Later snapshot label (default: now)"),
+    limit: int = Query(20, ge=1, le=200),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$")
+):
+    """Largest allocation changes between two snapshots"""
+    try:
+        diff = await run_in_threadpool(memory.diff, base, target, limit, group_by)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"base": base, "target": target, "top": diff}
+
+
 if __name__ == "__main__":
     import uvicorn
     
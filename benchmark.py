@@ -0,0 +1,166 @@
+"""
+Inference benchmark for the Cat vs Dog Classifier
+Measures model throughput under different CPU thread settings
+
+TensorFlow thread pools can only be sized before the runtime starts, so
+every configuration is measured in a fresh subprocess.
+
+Usage:
+    python benchmark.py --intra 1,2,4 --inter 1,2 --batch-sizes 1,32
+    python benchmark.py --stub    # offline, with the generated stand-in model
+    python benchmark.py --logging # cost of logging on the request thread
+"""
+
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+
+def _int_list(value: str) -> List[int]:
+    """Parse a comma separated list of integers"""
+    return [int(v) for v in value.split(",") if v]
+
+
+def measure_throughput(batch_size: int, iterations: int, warmup: int) -> Dict[str, Any]:
+    """
+    Load the model through api.py and time batched predictions
+
+    Runs inside the worker subprocess, after thread settings are applied
+    from the environment by api.load_model().
+    """
+    import numpy as np
+    import api
+
+    api.load_model()
+    batch = np.random.default_rng(0).random((batch_size, *api.IMG_SIZE, 3), dtype=np.float32)
+
+    for _ in range(warmup):
+        api.predict_scores(batch)
+
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        api.predict_scores(batch)
+        latencies.append(time.perf_counter() - start)
+
+    total = sum(latencies)
+    latencies.sort()
+    return {
+        "batch_size": batch_size,
+        "images_per_second": round(batch_size * iterations / total, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+        "threads": api.thread_settings,
+    }
+
+
+def measure_logging_overhead(records: int) -> List[Dict[str, Any]]:
+    """
+    Time what one per-request log line costs the thread that emits it
+
+    Compares the previous setup (synchronous StreamHandler, f-string per
+    prediction) with RequestLogMiddleware's queued summary record,
+    unsampled and with 1% success sampling. Output goes to os.devnull so
+    only the logging machinery is measured, not terminal speed.
+    """
+    import logging
+
+    from structured_logging import RequestLogMiddleware, configure_logging, stop_logging
+
+    devnull = open(os.devnull, "w")
+    scope = {"type": "http", "method": "POST", "path": "/predict"}
+    fields = {"stages_ms": {"decode": 1.2, "preprocess": 0.8, "inference": 9.9},
+              "prediction": "Dog", "confidence": 52.83}
+
+    def run(name: str, emit) -> Dict[str, Any]:
+        start = time.perf_counter()
+        for i in range(records):
+            emit(i)
+        elapsed = time.perf_counter() - start
+        return {"setup": name, "us_per_request": round(elapsed / records * 1e6, 2)}
+
+    results = []
+
+    sync_logger = logging.getLogger("benchmark.sync")
+    sync_logger.propagate = False
+    sync_logger.addHandler(logging.StreamHandler(devnull))
+    sync_logger.setLevel(logging.INFO)
+    results.append(run("sync f-string", lambda i: sync_logger.info(f"Prediction: Dog ({i % 100}.5%)")))
+
+    if not configure_logging("INFO", json_format=True, queue_size=records + 1, stream=devnull):
+        print("Root logger already has handlers; measuring the fallback (unqueued) path")
+    for name, rate in (("queued summary", 1.0), ("queued summary, 1% sampled", 0.01)):
+        middleware = RequestLogMiddleware(None, success_sample_rate=rate)
+        results.append(run(name, lambda i: middleware._log(scope, 200, 12.3, fields, None)))
+    stop_logging()
+    devnull.close()
+    return results
+
+
+def run_config(intra: int, inter: int, batch_size: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """Measure one configuration in a fresh interpreter"""
+    env = dict(
+        os.environ,
+        TF_INTRA_OP_THREADS=str(intra),
+        TF_INTER_OP_THREADS=str(inter),
+        BLAS_THREADS=str(intra),
+        TF_CPP_MIN_LOG_LEVEL="2",
+    )
+    cmd = [
+        sys.executable, __file__, "--worker",
+        "--batch-sizes", str(batch_size),
+        "--iterations", str(args.iterations),
+        "--warmup", str(args.warmup),
+    ]
+    output = subprocess.run(cmd, env=env, capture_output=True, text=True, check=True)
+    # The result is the last line; everything before it is log output
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark model throughput")
+    parser.add_argument("--intra", type=_int_list, default=[1, 2, 4],
+                        help="Intra-op thread counts to try (default: 1,2,4)")
+    parser.add_argument("--inter", type=_int_list, default=[1, 2],
+                        help="Inter-op thread counts to try (default: 1,2)")
+    parser.add_argument("--batch-sizes", type=_int_list, default=[1, 32],
+                        help="Batch sizes to try (default: 1,32)")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--stub", action="store_true",
+                        help="Use the generated stand-in model (MODEL_SOURCE=stub)")
+    parser.add_argument("--logging", action="store_true",
+                        help="Measure per-request logging overhead instead of model throughput")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.logging:
+        print(f"{'setup':<26} {'us/request':>10}")
+        for result in measure_logging_overhead(args.iterations * 5000):
+            print(f"{result['setup']:<26} {result['us_per_request']:>10}")
+        return
+
+    if args.stub:
+        os.environ["MODEL_SOURCE"] = "stub"
+
+    if args.worker:
+        result = measure_throughput(args.batch_sizes[0], args.iterations, args.warmup)
+        print(json.dumps(result))
+        return
+
+    print(f"{'intra':>5} {'inter':>5} {'batch':>5} {'img/s':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for intra, inter, batch_size in itertools.product(args.intra, args.inter, args.batch_sizes):
+        result = run_config(intra, inter, batch_size, args)
+        print(
+            f"{intra:>5} {inter:>5} {batch_size:>5} "
+            f"{result['images_per_second']:>9} {result['p50_ms']:>9} {result['p95_ms']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Offline bulk classification CLI
+Classifies images on disk without going through HTTP
+
+Reuses model loading and preprocessing from api.py, feeds the model
+through a tf.data pipeline (parallel decode + prefetch, large batches)
+and writes results incrementally so an interrupted run can be resumed
+by re-running the same command.
+
+Output formats:
+- CSV (``--output results.csv``): appended and flushed after every batch;
+  a row cut short by an interruption is dropped on resume and redone
+- Parquet (``--output results/`` or ``--output results.parquet``): a
+  directory of part files; each part is written as ``.tmp`` and renamed
+  when complete, so only finished parts count on resume (needs pyarrow)
+
+Usage:
+    python bulk_classify.py /data/images --output results.csv --batch-size 256
+"""
+
+import argparse
+import csv
+import glob
+import os
+import sys
+import time
+from typing import Iterator, List, Set
+
+import numpy as np
+import tensorflow as tf
+from PIL import Image
+
+import api
+
+COLUMNS = ["path", "prediction", "raw_score", "confidence", "error"]
+
+
+def iter_images(roots: List[str], done: Set[str]) -> Iterator[str]:
+    """Walk input directories in a stable order, skipping finished paths"""
+    extensions = tuple(f".{ext}" for ext in api.ALLOWED_EXTENSIONS)
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                if name.lower().endswith(extensions) and path not in done:
+                    yield path
+
+
+def load_image(path: bytes):
+    """Decode + preprocess one file (runs inside tf.numpy_function)"""
+    try:
+        with Image.open(path.decode()) as image:
+            array = api.preprocess_image(image)[0].astype(np.float32)
+        return array, b""
+    except Exception as e:
+        return np.zeros((*api.IMG_SIZE, 3), dtype=np.float32), str(e).encode()
+
+
+def build_dataset(paths: Iterator[str], batch_size: int, parallel_calls: int) -> tf.data.Dataset:
+    """Parallel decode, batch and prefetch with tf.data"""
+
+    def decode(path):
+        image, error = tf.numpy_function(load_image, [path], [tf.float32, tf.string])
+        image.set_shape((*api.IMG_SIZE, 3))
+        error.set_shape(())
+        return path, image, error
+
+    dataset = tf.data.Dataset.from_generator(
+        lambda: paths, output_signature=tf.TensorSpec((), tf.string)
+    )
+    dataset = dataset.map(decode, num_parallel_calls=parallel_calls, deterministic=False)
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+
+class CsvSink:
+    """Append-only CSV output, flushed after every batch"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def done_paths(self) -> Set[str]:
+        if not os.path.exists(self.path):
+            return set()
+        self._truncate_partial_row()
+        with open(self.path, newline="") as f:
+            return {row["path"] for row in csv.DictReader(f)}
+
+    def _truncate_partial_row(self, chunk_size: int = 65536) -> None:
+        """
+        Cut the file back to its last complete line
+
+        A run killed mid-write can leave half a row at the end; appending
+        after it would glue the next row onto it. Rows never contain
+        newlines (see result_rows), so the last newline ends the last
+        complete row.
+        """
+        with open(self.path, "r+b") as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(position - chunk_size, 0)
+                f.seek(start)
+                newline = f.read(position - start).rfind(b"\n")
+                if newline != -1:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position < end:
+                print(f"Dropping incomplete last row of {self.path}", file=sys.stderr)
+                f.truncate(position)
+
+    def open(self) -> None:
+        is_new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, "a", newline="")
+        self._writer = csv.writer(self._file)
+        if is_new:
+            self._writer.writerow(COLUMNS)
+
+    def write(self, rows: List[list]) -> None:
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetSink:
+    """Directory of Parquet part files; incomplete parts are discarded"""
+
+    def __init__(self, path: str, rows_per_part: int):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet output requires pyarrow: pip install pyarrow")
+        self.pa, self.pq = pa, pq
+        self.path = path
+        self.rows_per_part = rows_per_part
+        self.schema = pa.schema([
+            ("path", pa.string()),
+            ("prediction", pa.string()),
+            ("raw_score", pa.float32()),
+            ("confidence", pa.float32()),
+            ("error", pa.string()),
+        ])
+        self._writer = None
+
+    def done_paths(self) -> Set[str]:
+        done = set()
+        for part in glob.glob(os.path.join(self.path, "part-*.parquet")):
+            done.update(self.pq.read_table(part, columns=["path"]).column("path").to_pylist())
+        return done
+
+    def open(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        # Leftovers from an interrupted run: their rows are redone
+        for tmp in glob.glob(os.path.join(self.path, "*.tmp")):
+            os.remove(tmp)
+        self._part = len(glob.glob(os.path.join(self.path, "part-*.parquet")))
+        self._rows_in_part = 0
+
+    def write(self, rows: List[list]) -> None:
+        if self._writer is None:
+            self._tmp_path = os.path.join(self.path, f"part-{self._part:05d}.parquet.tmp")
+            self._writer = self.pq.ParquetWriter(self._tmp_path, self.schema)
+        columns = list(zip(*rows))
+        table = self.pa.Table.from_arrays(
+            [self.pa.array(col, type=field.type) for col, field in zip(columns, self.schema)],
+            schema=self.schema
+        )
+        self._writer.write_table(table)
+        self._rows_in_part += len(rows)
+        if self._rows_in_part >= self.rows_per_part:
+            self._finish_part()
+
+    def _finish_part(self) -> None:
+        self._writer.close()
+        os.rename(self._tmp_path, self._tmp_path[:-len(".tmp")])
+        self._writer = None
+        self._part += 1
+        self._rows_in_part = 0
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._finish_part()
+
+
+def result_rows(paths: np.ndarray, scores: np.ndarray, errors: np.ndarray) -> List[list]:
+    """Turn one batch of model output into output rows"""
+    rows = []
+    for path, score, error in zip(paths, scores, errors):
+        path = path.decode()
+        if error:
+            # Keep one row per line so a torn last row can be detected on resume
+            message = " ".join(error.decode(errors="replace").split())
+            rows.append([path, None, None, None, message])
+            continue
+        details = api.get_prediction_details(score)
+        rows.append([path, details["prediction"], details["raw_score"], details["confidence"], None])
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Classify a directory tree of images offline")
+    parser.add_argument("inputs", nargs="+", help="Directories to scan for images")
+    parser.add_argument("--output", required=True,
+                        help="Results file (.csv) or Parquet directory (.parquet or existing dir)")
+    parser.add_argument("--model", help="Model file (default: api.py model, downloaded if missing)")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--parallel-calls", type=int, default=tf.data.AUTOTUNE,
+                        help="Parallel decode calls (default: autotune)")
+    parser.add_argument("--rows-per-part", type=int, default=100_000,
+                        help="Rows per Parquet part file")
+    parser.add_argument("--report-every", type=float, default=10.0,
+                        help="Seconds between progress reports")
+    args = parser.parse_args()
+
+    if args.output.endswith(".csv"):
+        sink = CsvSink(args.output)
+    else:
+        sink = ParquetSink(args.output, args.rows_per_part)
+
+    done = sink.done_paths()
+    if done:
+        print(f"Resuming: {len(done)} images already classified")
+
+    if args.model and not os.path.exists(args.model):
+        raise SystemExit(f"Model file not found: {args.model}")
+    if args.model:
+        model = api.load_model_version("bulk", args.model, file_id=None).model
+    else:
+        model = api.load_model()
+
+    dataset = build_dataset(iter_images(args.inputs, done), args.batch_size, args.parallel_calls)
+
+    sink.open()
+    processed = 0
+    start = last_report = time.perf_counter()
+    last_processed = 0
+    try:
+        for paths, images, errors in dataset.as_numpy_iterator():
+            scores = model.predict_on_batch(images)[:, 0]
+            sink.write(result_rows(paths, scores, errors))
+            processed += len(paths)
+
+            now = time.perf_counter()
+            if now - last_report >= args.report_every:
+                recent = (processed - last_processed) / (now - last_report)
+                overall = processed / (now - start)
+                print(f"{processed} images | {recent:.1f} img/s (recent) | {overall:.1f} img/s (overall)")
+                last_report, last_processed = now, processed
+    except KeyboardInterrupt:
+        print("\nInterrupted; re-run the same command to resume", file=sys.stderr)
+    finally:
+        sink.close()
+
+    elapsed = time.perf_counter() - start
+    rate = processed / elapsed if elapsed else 0.0
+    print(f"Done: {processed} images in {elapsed:.1f}s ({rate:.1f} img/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Confidence-gated model cascade
+A small, fast model decides easy images; the full CNN handles the rest
+
+Every image is first scored by the fast model. Only images whose fast
+raw_score falls inside the uncertainty band around the 0.5 decision
+threshold (|score - 0.5| < band) are escalated to the full model, and
+for those the full model's score is the result.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+import numpy as np
+
+DECISION_THRESHOLD = 0.5
+
+STAGE_FAST = "fast"
+STAGE_FULL = "full"
+
+
+def uncertain_mask(scores: np.ndarray, band: float) -> np.ndarray:
+    """Boolean mask of scores too close to the threshold to trust"""
+    return np.abs(scores - DECISION_THRESHOLD) < band
+
+
+class ModelCascade:
+    """
+    Two-stage cascade around a fast Keras model
+
+    Args:
+        fast_model: Small model with the same input/output as the full one
+        band: Half-width of the uncertainty band around 0.5
+
+    Example:
+        >>> cascade = ModelCascade(fast_model, band=0.15)
+        >>> scores, stages = cascade.run(batch, full_predict)
+    """
+
+    def __init__(self, fast_model: Any, band: float):
+        self.fast_model = fast_model
+        self.band = band
+        self._lock = threading.Lock()
+        self.images = 0
+        self.escalated = 0
+
+    def run(
+        self,
+        batch: np.ndarray,
+        full_predict: Callable[[np.ndarray], np.ndarray]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score a batch through the cascade
+
+        Args:
+            batch: Preprocessed (N, H, W, C) batch
+            full_predict: Runs the full model on a sub-batch, returning scores
+
+        Returns:
+            Tuple of (N scores, N stage names saying which model decided)
+        """
+        scores = self.fast_model.predict(batch, batch_size=len(batch), verbose=0)[:, 0]
+        stages = np.full(len(batch), STAGE_FAST, dtype=object)
+
+        escalate = uncertain_mask(scores, self.band)
+        if escalate.any():
+            scores = scores.copy()
+            scores[escalate] = full_predict(batch[escalate])
+            stages[escalate] = STAGE_FULL
+
+        with self._lock:
+            self.images += len(batch)
+            self.escalated += int(escalate.sum())
+        return scores, stages
+
+    def stats(self) -> Dict[str, Any]:
+        """Share of images the fast model decided on its own"""
+        with self._lock:
+            images, escalated = self.images, self.escalated
+        return {
+            "band": self.band,
+            "images": images,
+            "decided_by_fast": images - escalated,
+            "escalated_to_full": escalated,
+            "full_model_calls_avoided": round((images - escalated) / images, 4) if images else None,
+        }
@@ -0,0 +1,159 @@
+"""
+CPU thread configuration aware of container limits
+Sizes TensorFlow and BLAS thread pools from the cgroup CPU quota
+
+TensorFlow defaults to one intra-op thread per *host* core, which on a
+quota-limited container (e.g. Railway) oversubscribes the CPUs we are
+actually allowed to use. This module reads the real limit and divides
+it between the uvicorn workers running on the box.
+
+Override knobs (environment variables):
+- TF_INTRA_OP_THREADS: threads used inside a single op (conv, matmul)
+- TF_INTER_OP_THREADS: independent ops run in parallel
+- BLAS_THREADS: OpenMP/MKL/OpenBLAS pool size
+- WEB_CONCURRENCY: number of worker processes sharing the CPU limit
+"""
+
+import logging
+import math
+import os
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Environment variables honoured by the common BLAS/OpenMP runtimes
+BLAS_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+)
+
+# Chosen settings, filled in by configure_cpu_threads()
+thread_settings: Dict[str, Any] = {}
+
+
+def _read_file(path: str) -> Optional[str]:
+    """Read a small sysfs file, returning None if it is unavailable"""
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def read_cgroup_cpu_limit() -> Optional[float]:
+    """
+    Read the CPU quota of the current cgroup
+
+    Returns:
+        Number of CPUs allowed (may be fractional), or None if unlimited
+        or not running under a cgroup CPU controller
+    """
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    cpu_max = _read_file("/sys/fs/cgroup/cpu.max")
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+
+    # cgroup v1: quota of -1 means unlimited
+    quota = _read_file("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+    period = _read_file("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def available_cpus() -> float:
+    """
+    Number of CPUs this process may use
+
+    The smaller of the cgroup quota and the scheduler affinity mask.
+    """
+    try:
+        cpus = float(len(os.sched_getaffinity(0)))
+    except AttributeError:  # Not available on macOS/Windows
+        cpus = float(os.cpu_count() or 1)
+
+    quota = read_cgroup_cpu_limit()
+    if quota is not None:
+        cpus = min(cpus, quota)
+    return cpus
+
+
+def _env_int(name: str) -> Optional[int]:
+    """Read a positive integer override from the environment"""
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+def compute_thread_settings() -> Dict[str, Any]:
+    """
+    Decide thread pool sizes without applying them
+
+    Returns:
+        Dictionary with the detected limits and chosen pool sizes
+    """
+    cpus = available_cpus()
+    workers = max(_env_int("WEB_CONCURRENCY") or 1, 1)
+
+    # Round a fractional quota up: 1.5 CPUs still benefits from 2 threads
+    per_worker = max(1, math.ceil(cpus / workers))
+
+    intra = _env_int("TF_INTRA_OP_THREADS") or per_worker
+    inter = _env_int("TF_INTER_OP_THREADS") or (1 if per_worker <= 2 else 2)
+    blas = _env_int("BLAS_THREADS") or intra
+
+    return {
+        "available_cpus": round(cpus, 2),
+        "cgroup_limit": read_cgroup_cpu_limit(),
+        "workers": workers,
+        "intra_op_threads": intra,
+        "inter_op_threads": inter,
+        "blas_threads": blas,
+    }
+
+
+def configure_cpu_threads() -> Dict[str, Any]:
+    """
+    Apply thread settings to TensorFlow and BLAS (idempotent)
+
+    Must run before TensorFlow executes its first op; afterwards the TF
+    pools are fixed and only a warning is logged.
+
+    Returns:
+        The settings that were chosen
+    """
+    if thread_settings:
+        return thread_settings
+
+    settings = compute_thread_settings()
+
+    # BLAS runtimes read these when they initialise
+    for var in BLAS_ENV_VARS:
+        os.environ.setdefault(var, str(settings["blas_threads"]))
+
+    # Libraries already loaded (numpy's BLAS) need a runtime limit
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(settings["blas_threads"])
+    except ImportError:
+        pass
+
+    import tensorflow as tf
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(settings["intra_op_threads"])
+        tf.config.threading.set_inter_op_parallelism_threads(settings["inter_op_threads"])
+    except RuntimeError as e:
+        logger.warning(f"TensorFlow already initialised, thread settings not applied: {e}")
+
+    logger.info(
+        f"CPU threads: available={settings['available_cpus']} "
+        f"(cgroup limit={settings['cgroup_limit']}), workers={settings['workers']}, "
+        f"intra_op={settings['intra_op_threads']}, inter_op={settings['inter_op_threads']}, "
+        f"blas={settings['blas_threads']}"
+    )
+
+    thread_settings.update(settings)
+    return thread_settings
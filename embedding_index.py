@@ -0,0 +1,207 @@
+"""
+Embedding extraction and near-duplicate index
+Serves cached predictions for re-compressed / resized / cropped uploads
+
+The CNN is split into a backbone (everything up to the input of the final
+layer, i.e. the penultimate-layer embedding) and the classification head.
+Recent embeddings and their scores are kept in a bounded in-memory
+approximate nearest-neighbour index (random-hyperplane LSH + exact cosine
+re-ranking of the candidates). When a new image's embedding is close
+enough to one already seen with the same model, its cached score
+is returned and the head is skipped. Callers pass a model key that
+identifies the weights (not just the version label), and the index is
+cleared whenever a version is activated.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+STAGE_NEAR_DUPLICATE = "near_duplicate"
+
+EVICTION_POLICIES = ("lru", "fifo")
+
+
+def split_model(model: Any) -> Tuple[Any, Callable[[np.ndarray], np.ndarray]]:
+    """
+    Split a Keras classifier into embedding backbone and head
+
+    Args:
+        model: Loaded Keras model whose last layer is the classification head
+
+    Returns:
+        Tuple of (Keras model producing embeddings, function mapping
+        embeddings to (N,) raw scores)
+    """
+    from tensorflow import keras
+
+    head_layer = model.layers[-1]
+    embedder = keras.Model(inputs=model.inputs, outputs=head_layer.input)
+
+    def head(embeddings: np.ndarray) -> np.ndarray:
+        return keras.ops.convert_to_numpy(head_layer(embeddings))[:, 0]
+
+    return embedder, head
+
+
+class NearDuplicateIndex:
+    """
+    Bounded LSH index of recent embeddings -> scores
+
+    Args:
+        max_size: Maximum number of embeddings kept
+        threshold: Minimum cosine similarity to count as a near-duplicate
+        eviction: "lru" (hits refresh an entry) or "fifo" (oldest first)
+        tables: Number of LSH hash tables (more = better recall, slower)
+        bits: Hyperplanes per table (more = smaller buckets, lower recall)
+        seed: Seed for the random hyperplanes
+
+    Example:
+        >>> index = NearDuplicateIndex(max_size=10000, threshold=0.97)
+        >>> scores, hits = index.lookup("v1", embeddings)
+        >>> index.add("v1", embeddings[~hits], new_scores)
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        threshold: float = 0.97,
+        eviction: str = "lru",
+        tables: int = 8,
+        bits: int = 12,
+        seed: int = 0
+    ):
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {eviction}")
+        self.max_size = max_size
+        self.threshold = threshold
+        self.eviction = eviction
+        self.tables = tables
+        self.bits = bits
+        self._rng = np.random.default_rng(seed)
+        self._planes: Dict[int, np.ndarray] = {}
+        # id -> (model key, unit embedding, score, bucket keys)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._buckets: Dict[tuple, set] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=1000)
+        self.lookups = 0
+        self.hits = 0
+        self.evictions = 0
+
+    def _bucket_keys(self, model_key: str, unit: np.ndarray) -> List[List[tuple]]:
+        """LSH bucket keys (one per table) for each row of unit embeddings"""
+        dim = unit.shape[1]
+        planes = self._planes.get(dim)
+        if planes is None:
+            planes = self._rng.standard_normal((dim, self.tables * self.bits)).astype(np.float32)
+            self._planes[dim] = planes
+        signs = (unit @ planes > 0).reshape(len(unit), self.tables, self.bits)
+        codes = np.packbits(signs, axis=2)
+        return [
+            [(model_key, table, codes[row, table].tobytes()) for table in range(self.tables)]
+            for row in range(len(unit))
+        ]
+
+    @staticmethod
+    def _normalize(embeddings: np.ndarray) -> np.ndarray:
+        flat = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        norms = np.linalg.norm(flat, axis=1, keepdims=True)
+        return flat / np.maximum(norms, 1e-12)
+
+    def lookup(self, model_key: str, embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find cached scores for near-duplicate embeddings
+
+        Args:
+            model_key: Identity of the model that produced the embeddings
+            embeddings: (N, D) embeddings
+
+        Returns:
+            Tuple of (N scores, valid where hit; N boolean hit mask)
+        """
+        start = time.perf_counter()
+        unit = self._normalize(embeddings)
+        scores = np.zeros(len(unit), dtype=np.float32)
+        hits = np.zeros(len(unit), dtype=bool)
+        with self._lock:
+            keys = self._bucket_keys(model_key, unit)
+            for row, row_keys in enumerate(keys):
+                candidates = set()
+                for key in row_keys:
+                    candidates.update(self._buckets.get(key, ()))
+                if not candidates:
+                    continue
+                ids = list(candidates)
+                similarities = np.stack([self._entries[i][1] for i in ids]) @ unit[row]
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    scores[row] = self._entries[ids[best]][2]
+                    hits[row] = True
+                    if self.eviction == "lru":
+                        self._entries.move_to_end(ids[best])
+            self.lookups += len(unit)
+            self.hits += int(hits.sum())
+            self._latencies.append((time.perf_counter() - start) / max(len(unit), 1))
+        return scores, hits
+
+    def add(self, model_key: str, embeddings: np.ndarray, scores: np.ndarray) -> None:
+        """Insert embeddings with their scores, evicting beyond max_size"""
+        if not len(embeddings) or self.max_size <= 0:
+            return
+        unit = self._normalize(embeddings)
+        with self._lock:
+            keys = self._bucket_keys(model_key, unit)
+            for row, row_keys in enumerate(keys):
+                entry_id = self._next_id
+                self._next_id += 1
+                self._entries[entry_id] = (model_key, unit[row], float(scores[row]), row_keys)
+                for key in row_keys:
+                    self._buckets.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_size:
+                self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        entry_id, (_, _, _, row_keys) = self._entries.popitem(last=False)
+        for key in row_keys:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+        self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every cached embedding (e.g. after a model swap)"""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def remove_model(self, model_key: str) -> None:
+        """Drop every embedding produced by an unloaded model"""
+        with self._lock:
+            for entry_id in [i for i, entry in self._entries.items() if entry[0] == model_key]:
+                self._entries.move_to_end(entry_id, last=False)
+                self._evict_oldest()
+                self.evictions -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Size, hit rate and per-image lookup latency for /metrics"""
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "threshold": self.threshold,
+                "eviction": self.eviction,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else None,
+                "evictions": self.evictions,
+                "lookup_ms_p50": round(float(np.percentile(latencies, 50)), 4) if len(latencies) else None,
+                "lookup_ms_p95": round(float(np.percentile(latencies, 95)), 4) if len(latencies) else None,
+            }
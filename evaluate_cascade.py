@@ -0,0 +1,128 @@
+"""
+Cascade evaluation tool
+Measures compute saved and agreement with the full model on a labeled sample
+
+The sample directory is either split into class folders
+(``sample/cat/*.jpg``, ``sample/dog/*.jpg``) or uses Kaggle-style names
+(``cat.123.jpg``, ``dog.456.jpg``). Files that cannot be decoded are
+skipped and listed at the end of the report.
+
+Usage:
+    python evaluate_cascade.py sample/ --fast-model fast.keras --bands 0.05,0.1,0.15,0.2
+"""
+
+import argparse
+import os
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+from tensorflow import keras
+
+import api
+from cascade import DECISION_THRESHOLD, uncertain_mask
+
+LABELS = {"cat": 0, "dog": 1}
+
+
+def label_for(path: str) -> Optional[int]:
+    """Infer the label from the parent folder or the filename prefix"""
+    parent = os.path.basename(os.path.dirname(path)).lower()
+    if parent in LABELS:
+        return LABELS[parent]
+    prefix = os.path.basename(path).split(".")[0].lower()
+    return LABELS.get(prefix)
+
+
+def collect_sample(root: str, limit: int) -> List[Tuple[str, int]]:
+    """Find labeled images under root"""
+    extensions = tuple(f".{ext}" for ext in api.ALLOWED_EXTENSIONS)
+    sample = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            label = label_for(path)
+            if name.lower().endswith(extensions) and label is not None:
+                sample.append((path, label))
+    return sample[:limit] if limit else sample
+
+
+def load_sample(sample: List[Tuple[str, int]]) -> Tuple[np.ndarray, np.ndarray, List[Tuple[str, str]]]:
+    """
+    Preprocess every readable image
+
+    Returns:
+        Tuple of (images, labels, (path, error) of skipped files)
+    """
+    images, labels, skipped = [], [], []
+    for path, label in sample:
+        try:
+            with Image.open(path) as image:
+                images.append(api.preprocess_image(image))
+            labels.append(label)
+        except Exception as e:
+            skipped.append((path, str(e)))
+    if not images:
+        return np.empty((0, *api.IMG_SIZE, 3)), np.array(labels), skipped
+    return np.concatenate(images), np.array(labels), skipped
+
+
+def score_all(model: keras.Model, images: np.ndarray, batch_size: int) -> Tuple[np.ndarray, float]:
+    """Score every image and return (scores, seconds per image)"""
+    model.predict(images[:1], verbose=0)  # Warm-up
+    start = time.perf_counter()
+    scores = model.predict(images, batch_size=batch_size, verbose=0)[:, 0]
+    return scores, (time.perf_counter() - start) / len(images)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Evaluate the confidence-gated cascade")
+    parser.add_argument("sample_dir", help="Directory of labeled cat/dog images")
+    parser.add_argument("--fast-model", required=True, help="Path to the fast first-stage model")
+    parser.add_argument("--full-model", default=api.MODEL_PATH, help="Path to the full model")
+    parser.add_argument("--bands", default="0.05,0.1,0.15,0.2,0.3",
+                        help="Uncertainty bands to evaluate (default: 0.05,0.1,0.15,0.2,0.3)")
+    parser.add_argument("--limit", type=int, default=0, help="Use at most N images")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    sample = collect_sample(args.sample_dir, args.limit)
+    if not sample:
+        raise SystemExit(f"No labeled images found in {args.sample_dir}")
+
+    images, labels, skipped = load_sample(sample)
+    if not len(images):
+        raise SystemExit(f"None of the {len(sample)} labeled images could be decoded")
+    print(f"Evaluating on {len(images)} labeled images ({len(skipped)} unreadable, skipped)")
+
+    api.configure_cpu_threads()
+    full_scores, full_cost = score_all(keras.models.load_model(args.full_model), images, args.batch_size)
+    fast_scores, fast_cost = score_all(keras.models.load_model(args.fast_model), images, args.batch_size)
+
+    full_pred = full_scores > DECISION_THRESHOLD
+    fast_pred = fast_scores > DECISION_THRESHOLD
+    print(f"Full model: {full_cost * 1000:.2f} ms/image, accuracy {np.mean(full_pred == labels):.2%}")
+    print(f"Fast model: {fast_cost * 1000:.2f} ms/image, accuracy {np.mean(fast_pred == labels):.2%}")
+    print()
+    print(f"{'band':>6} {'escalated':>10} {'agreement':>10} {'accuracy':>9} {'compute saved':>14}")
+
+    for band in (float(b) for b in args.bands.split(",")):
+        escalate = uncertain_mask(fast_scores, band)
+        cascade_pred = np.where(escalate, full_pred, fast_pred)
+        escalated = escalate.mean()
+        # Every image pays for the fast model; escalated ones also pay for the full one
+        saved = 1 - (fast_cost + escalated * full_cost) / full_cost
+        print(
+            f"{band:>6.2f} {escalated:>10.1%} {np.mean(cascade_pred == full_pred):>10.2%} "
+            f"{np.mean(cascade_pred == labels):>9.2%} {saved:>14.1%}"
+        )
+
+    if skipped:
+        print(f"\nSkipped {len(skipped)} unreadable file(s):")
+        for path, error in skipped:
+            print(f"  {path}: {error}")
+
+
+if __name__ == "__main__":
+    main()
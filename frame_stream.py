@@ -0,0 +1,183 @@
+"""
+WebSocket frame streaming
+Continuous classification of camera frames over one persistent connection
+
+Protocol (per connection):
+- The client sends each frame as one binary message (encoded JPEG/PNG).
+- Frames are numbered from 0 in arrival order. With sample_every=N only
+  every Nth frame is classified; the others are skipped silently.
+- Each classified frame produces one JSON text message
+  ({"frame": i, ...result} or {"frame": i, "error": ...}). Results can
+  arrive out of order, so clients match them by frame number.
+- Flow control: at most max_outstanding frames per stream are in flight.
+  A frame arriving while the stream is at its limit is dropped and the
+  client gets {"frame": i, "dropped": true, "reason": ...}, so a slow
+  consumer sheds frames instead of building an unbounded backlog.
+
+Frames from all connections are classified through the shared inference
+path, so concurrent streams are batched together by the scheduler.
+
+On shutdown close_all() stops classifying new frames, lets frames in
+flight finish and closes every stream with 1012 (service restart).
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Set
+
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+
+class FrameStreamHub:
+    """
+    Connection limit, per-stream flow control and counters for frame streams
+
+    Args:
+        max_streams: Concurrent connections accepted (others closed with 1013)
+        max_outstanding: Upper bound on frames in flight per stream
+        max_frame_bytes: Largest accepted frame
+
+    Example:
+        >>> hub = FrameStreamHub(max_streams=64, max_outstanding=4)
+        >>> await hub.serve(websocket, classify_frame, sample_every=2)
+    """
+
+    def __init__(self, max_streams: int, max_outstanding: int, max_frame_bytes: int):
+        self.max_streams = max_streams
+        self.max_outstanding = max_outstanding
+        self.max_frame_bytes = max_frame_bytes
+        self.active_streams = 0
+        self.rejected_streams = 0
+        self.frames_received = 0
+        self.frames_skipped = 0
+        self.frames_dropped = 0
+        self.frames_classified = 0
+        self.frames_failed = 0
+        self.closing = False
+        # Open streams -> their frames in flight (for close_all)
+        self._streams: Dict[WebSocket, Set[asyncio.Task]] = {}
+
+    async def serve(
+        self,
+        websocket: WebSocket,
+        classify: Callable[[bytes], Awaitable[Dict[str, Any]]],
+        sample_every: int = 1,
+        max_outstanding: int = 0
+    ) -> None:
+        """
+        Run one stream until the client disconnects
+
+        Args:
+            websocket: Connection that has not been accepted yet
+            classify: Coroutine turning frame bytes into a result dict
+            sample_every: Classify every Nth frame
+            max_outstanding: Frames in flight for this stream (capped by the hub)
+        """
+        if self.closing:
+            await websocket.close(code=1012)  # Service restart
+            return
+        if self.active_streams >= self.max_streams:
+            self.rejected_streams += 1
+            await websocket.close(code=1013)  # Try again later
+            return
+
+        sample_every = max(sample_every, 1)
+        limit = min(max_outstanding, self.max_outstanding) if max_outstanding > 0 else self.max_outstanding
+        outstanding: Set[asyncio.Task] = set()
+        send_lock = asyncio.Lock()
+
+        async def send(message: Dict[str, Any]) -> None:
+            async with send_lock:
+                await websocket.send_json(message)
+
+        self.active_streams += 1
+        try:
+            await websocket.accept()
+            self._streams[websocket] = outstanding
+            frame = 0
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                data = message.get("bytes")
+                if data is None:
+                    await send({"error": "Frames must be sent as binary messages"})
+                    continue
+
+                index = frame
+                frame += 1
+                self.frames_received += 1
+                if index % sample_every:
+                    self.frames_skipped += 1
+                    continue
+                if self.closing:
+                    self.frames_dropped += 1
+                    await send({"frame": index, "dropped": True, "reason": "server shutting down"})
+                    continue
+                if len(outstanding) >= limit:
+                    self.frames_dropped += 1
+                    await send({"frame": index, "dropped": True, "reason": "too many frames in flight"})
+                    continue
+                if len(data) > self.max_frame_bytes:
+                    self.frames_failed += 1
+                    await send({"frame": index, "error": f"Frame larger than {self.max_frame_bytes} bytes"})
+                    continue
+
+                task = asyncio.ensure_future(self._process(index, data, classify, send))
+                outstanding.add(task)
+                task.add_done_callback(outstanding.discard)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            self.active_streams -= 1
+            self._streams.pop(websocket, None)
+            # Nobody is left to read these results
+            for task in outstanding:
+                task.cancel()
+
+    async def _process(
+        self,
+        index: int,
+        data: bytes,
+        classify: Callable[[bytes], Awaitable[Dict[str, Any]]],
+        send: Callable[[Dict[str, Any]], Awaitable[None]]
+    ) -> None:
+        """Classify one frame and push the result to the client"""
+        try:
+            result = {"frame": index, **await classify(data)}
+            self.frames_classified += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.frames_failed += 1
+            result = {"frame": index, "error": str(e)}
+        try:
+            await send(result)
+        except Exception:
+            pass  # Client went away; the receive loop handles cleanup
+
+    async def close_all(self, grace_seconds: float) -> None:
+        """
+        Refuse new streams and frames, then close open streams once their
+        frames in flight are done (or grace_seconds have passed)
+        """
+        self.closing = True
+        tasks = [task for outstanding in self._streams.values() for task in outstanding]
+        if tasks:
+            await asyncio.wait(tasks, timeout=grace_seconds)
+        for websocket in list(self._streams):
+            try:
+                await websocket.close(code=1012)
+            except Exception:
+                pass  # Already disconnected
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for /metrics"""
+        return {
+            "active_streams": self.active_streams,
+            "rejected_streams": self.rejected_streams,
+            "frames_received": self.frames_received,
+            "frames_skipped": self.frames_skipped,
+            "frames_dropped": self.frames_dropped,
+            "frames_classified": self.frames_classified,
+            "frames_failed": self.frames_failed,
+        }
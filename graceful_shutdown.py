@@ -0,0 +1,170 @@
+"""
+Graceful shutdown on SIGTERM
+Stop taking predict work, drain what is already accepted, then let uvicorn exit
+
+On SIGTERM (Railway redeploys and restarts) the process normally stops
+right away and in-flight requests see connection resets, which clients
+retry against the next cold instance. Instead:
+
+1. Readiness flips to false (/ready answers 503).
+2. New requests to the predict paths get 503 + Retry-After and
+   Connection: close, so clients retry elsewhere instead of mid-request.
+3. Requests already accepted (running or queued for admission) and jobs
+   queued in the scheduler finish, for up to grace_seconds.
+4. Drain statistics are logged and uvicorn's own SIGTERM handling runs.
+
+A second SIGTERM, or SIGINT, skips the drain.
+"""
+
+import asyncio
+import logging
+import signal
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+
+class GracefulShutdown:
+    """
+    SIGTERM drain coordinator
+
+    Args:
+        grace_seconds: Longest wait for accepted work before exiting anyway
+
+    Example:
+        >>> shutdown = GracefulShutdown(grace_seconds=20)
+        >>> shutdown.add_pending_check(lambda: scheduler.queued_jobs)
+        >>> shutdown.install()  # From the startup event, after uvicorn's handlers
+    """
+
+    def __init__(self, grace_seconds: float):
+        self.grace_seconds = grace_seconds
+        self.draining = False
+        self.in_flight = 0
+        self.rejected = 0
+        self.completed_during_drain = 0
+        self.drain_started: Optional[float] = None
+        self.last_drain: Optional[Dict[str, Any]] = None
+        self._pending_checks: List[Callable[[], int]] = []
+        self._on_drain: List[Callable[[float], Awaitable[None]]] = []
+        self._previous_handler: Any = None
+
+    def add_pending_check(self, check: Callable[[], int]) -> None:
+        """Register a source of outstanding work the drain waits for"""
+        self._pending_checks.append(check)
+
+    def on_drain(self, callback: Callable[[float], Awaitable[None]]) -> None:
+        """Register a coroutine run when draining starts (gets the grace period)"""
+        self._on_drain.append(callback)
+
+    def pending(self) -> int:
+        """Accepted requests plus outstanding work from the pending checks"""
+        return self.in_flight + sum(check() for check in self._pending_checks)
+
+    def install(self) -> None:
+        """
+        Wrap the current SIGTERM handler (uvicorn's, when run under uvicorn)
+
+        Must be called from the event loop thread; signal handlers can only
+        be installed from the main thread, so elsewhere this is a no-op.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            self._previous_handler = signal.getsignal(signal.SIGTERM)
+            signal.signal(signal.SIGTERM, lambda sig, frame: loop.call_soon_threadsafe(self._on_signal, sig, frame))
+        except ValueError:
+            logger.warning("Not on the main thread; SIGTERM drain disabled")
+
+    def _on_signal(self, sig: int, frame: Any) -> None:
+        if self.draining:
+            logger.warning("Second SIGTERM: exiting without waiting for the drain")
+            self._exit(sig, frame)
+            return
+        self.draining = True
+        self.drain_started = time.monotonic()
+        logger.info(f"SIGTERM received: draining {self.pending()} pending requests/jobs "
+                    f"(grace {self.grace_seconds}s)")
+        asyncio.ensure_future(self._drain(sig, frame))
+
+    async def _drain(self, sig: int, frame: Any) -> None:
+        callbacks = [asyncio.ensure_future(callback(self.grace_seconds)) for callback in self._on_drain]
+        deadline = self.drain_started + self.grace_seconds
+        while self.pending() > 0 and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for task in callbacks:
+            task.cancel()
+        self.last_drain = {
+            "duration_s": round(time.monotonic() - self.drain_started, 3),
+            "completed": self.completed_during_drain,
+            "rejected": self.rejected,
+            "abandoned": self.pending(),
+            "timed_out": self.pending() > 0,
+        }
+        log = logger.warning if self.last_drain["timed_out"] else logger.info
+        log(f"Drain finished: {self.last_drain}")
+        self._exit(sig, frame)
+
+    def _exit(self, sig: int, frame: Any) -> None:
+        """Hand the signal to whoever handled it before us"""
+        previous = self._previous_handler
+        if callable(previous):
+            previous(sig, frame)
+        else:
+            signal.signal(sig, previous if previous is not None else signal.SIG_DFL)
+            signal.raise_signal(sig)
+
+    def stats(self) -> Dict[str, Any]:
+        """Drain state for /metrics"""
+        return {
+            "draining": self.draining,
+            "in_flight": self.in_flight,
+            "pending": self.pending(),
+            "grace_seconds": self.grace_seconds,
+            "last_drain": self.last_drain,
+        }
+
+
+class DrainMiddleware:
+    """
+    ASGI middleware counting accepted predict requests and refusing new ones while draining
+
+    Place it outside AdmissionMiddleware so requests waiting for an
+    admission slot count as accepted work.
+
+    Args:
+        app: Wrapped ASGI app
+        shutdown: Coordinator holding the drain state
+        prefixes: Paths whose requests are tracked and refused
+    """
+
+    def __init__(self, app: ASGIApp, shutdown: GracefulShutdown, prefixes: List[str]):
+        self.app = app
+        self.shutdown = shutdown
+        self.prefixes = tuple(prefixes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        if self.shutdown.draining:
+            self.shutdown.rejected += 1
+            response = JSONResponse(
+                {"detail": "Server shutting down, retry on another instance"},
+                status_code=503,
+                headers={"Retry-After": "1", "Connection": "close"}
+            )
+            await response(scope, receive, send)
+            return
+
+        self.shutdown.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.shutdown.in_flight -= 1
+            if self.shutdown.draining:
+                self.shutdown.completed_during_drain += 1
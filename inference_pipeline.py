@@ -0,0 +1,238 @@
+"""
+Staged decode/inference pipeline for batch workloads
+Overlaps CPU image decoding with model compute using bounded queues
+
+Stages:
+- Decode workers: turn raw items into preprocessed arrays
+- Inference: groups whatever is decoded into batches and runs the model
+- Consumer: the caller iterating over InferencePipeline.run()
+
+While the model processes one batch the decode workers fill the next,
+and the bounded queues between stages provide backpressure so a slow
+stage never lets the others buffer unbounded work.
+"""
+
+import contextvars
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+
+# Marks the end of a stream between stages
+_DONE = object()
+
+# How long a blocked put/get waits before re-checking for cancellation
+_POLL_SECONDS = 0.1
+
+
+class PipelineResult(NamedTuple):
+    """Outcome for one input item"""
+    index: int
+    context: Any
+    score: Optional[float]
+    error: Optional[Exception]
+    stage: Optional[str] = None
+
+
+class InferencePipeline:
+    """
+    Reusable decode -> batch -> predict pipeline
+
+    Args:
+        decode_fn: Turns one input item into (array, context). The array
+            is a preprocessed model input of shape (1, H, W, C) or
+            (H, W, C); context is passed through to the result untouched.
+        predict_fn: Runs the model on a stacked (N, H, W, C) batch and
+            returns N scores, or a (scores, stages) tuple when the caller
+            wants to know which model stage decided each result.
+        batch_size: Maximum number of items per model call
+        decode_workers: Number of decoding threads
+        queue_size: Bound on decoded items waiting for inference
+            (defaults to two batches)
+
+    Example:
+        >>> pipeline = InferencePipeline(decode, predict, batch_size=32)
+        >>> for result in pipeline.run(paths):
+        ...     print(result.index, result.score)
+    """
+
+    def __init__(
+        self,
+        decode_fn: Callable[[Any], Tuple[np.ndarray, Any]],
+        predict_fn: Callable[[np.ndarray], np.ndarray],
+        batch_size: int = 32,
+        decode_workers: int = 4,
+        queue_size: Optional[int] = None
+    ):
+        if batch_size < 1 or decode_workers < 1:
+            raise ValueError("batch_size and decode_workers must be at least 1")
+        self.decode_fn = decode_fn
+        self.predict_fn = predict_fn
+        self.batch_size = batch_size
+        self.decode_workers = decode_workers
+        self.queue_size = queue_size or 2 * batch_size
+
+    def run(self, items: Iterable[Any]) -> Iterator[PipelineResult]:
+        """
+        Process items, yielding results as their batch completes
+
+        Results arrive in completion order; use PipelineResult.index to
+        restore input order. Closing the iterator early stops all stages.
+        """
+        stop = threading.Event()
+        feed_errors: list = []
+        work_q: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        decoded_q: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        results_q: queue.Queue = queue.Queue(maxsize=self.queue_size)
+
+        threads = [_context_thread(self._feed, items, work_q, stop, feed_errors)]
+        threads += [
+            _context_thread(self._decode, work_q, decoded_q, stop)
+            for _ in range(self.decode_workers)
+        ]
+        threads.append(_context_thread(self._infer, decoded_q, results_q, stop))
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                result = results_q.get()
+                if result is _DONE:
+                    break
+                if isinstance(result, BaseException):
+                    raise result
+                yield result
+            if feed_errors:
+                # The input iterable itself failed part way through
+                raise feed_errors[0]
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    # ------------------------------------------------------------------
+    # Stages
+    # ------------------------------------------------------------------
+
+    def _feed(
+        self,
+        items: Iterable[Any],
+        work_q: queue.Queue,
+        stop: threading.Event,
+        errors: list
+    ) -> None:
+        """Push input items to the decode workers, then one end marker each"""
+        try:
+            for index, item in enumerate(items):
+                if not _put(work_q, (index, item), stop):
+                    return
+        except Exception as e:
+            errors.append(e)
+        finally:
+            for _ in range(self.decode_workers):
+                if not _put(work_q, _DONE, stop):
+                    return
+
+    def _decode(self, work_q: queue.Queue, decoded_q: queue.Queue, stop: threading.Event) -> None:
+        """Decode items until the feeder signals the end"""
+        while not stop.is_set():
+            work = _get(work_q, stop)
+            if work is None or work is _DONE:
+                _put(decoded_q, _DONE, stop)
+                return
+            index, item = work
+            try:
+                array, context = self.decode_fn(item)
+                entry = PipelineResult(index, context, None, None), array
+            except Exception as e:
+                entry = PipelineResult(index, None, None, e), None
+            if not _put(decoded_q, entry, stop):
+                return
+
+    def _infer(self, decoded_q: queue.Queue, results_q: queue.Queue, stop: threading.Event) -> None:
+        """Batch whatever is decoded and run the model on it"""
+        try:
+            remaining_workers = self.decode_workers
+            while remaining_workers and not stop.is_set():
+                # Block for the first item, then take what is already
+                # decoded so the model never waits for a full batch
+                pending = []
+                while remaining_workers and len(pending) < self.batch_size:
+                    if pending:
+                        try:
+                            entry = decoded_q.get_nowait()
+                        except queue.Empty:
+                            break
+                    else:
+                        entry = _get(decoded_q, stop)
+                        if entry is None:
+                            return
+                    if entry is _DONE:
+                        remaining_workers -= 1
+                        continue
+                    result, array = entry
+                    if result.error is not None:
+                        if not _put(results_q, result, stop):
+                            return
+                        continue
+                    pending.append((result, array))
+
+                if pending and not self._run_batch(pending, results_q, stop):
+                    return
+        except BaseException as e:
+            _put(results_q, e, stop)
+        finally:
+            _put(results_q, _DONE, stop)
+
+    def _run_batch(self, pending: list, results_q: queue.Queue, stop: threading.Event) -> bool:
+        """Predict one batch and publish its results"""
+        try:
+            batch = np.concatenate(
+                [array if array.ndim == 4 else array[np.newaxis] for _, array in pending]
+            )
+            output = self.predict_fn(batch)
+            scores, stages = output if isinstance(output, tuple) else (output, [None] * len(pending))
+            outcomes = [
+                result._replace(score=float(score), stage=stage)
+                for (result, _), score, stage in zip(pending, scores, stages)
+            ]
+        except Exception as e:
+            outcomes = [result._replace(error=e) for result, _ in pending]
+        for outcome in outcomes:
+            if not _put(results_q, outcome, stop):
+                return False
+        return True
+
+
+def _context_thread(target: Callable[..., None], *args: Any) -> threading.Thread:
+    """
+    Daemon thread running in a copy of the caller's context
+
+    Keeps request-scoped contextvars (request budget, memory accounting)
+    visible to the stage threads, as run_in_threadpool does.
+    """
+    context = contextvars.copy_context()
+    return threading.Thread(target=context.run, args=(target, *args), daemon=True)
+
+
+def _put(q: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    """Blocking put that gives up once the pipeline is stopped"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event) -> Any:
+    """Blocking get that returns None once the pipeline is stopped"""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            continue
+    return None
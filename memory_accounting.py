@@ -0,0 +1,264 @@
+"""
+Memory accounting and leak detection
+Per-stage allocation peaks, process RSS history and tracemalloc diffs
+
+- The decode and preprocess stages are wrapped in tracker.stage(name).
+  With tracing enabled each stage records the peak Python allocation it
+  caused and the bytes still held when it ended (retained), both per
+  request and aggregated per stage. A stage whose average retained bytes
+  stays above zero is the first place to look for a leak.
+- tracemalloc only sees Python-level allocations (PIL buffers, numpy
+  arrays); TensorFlow's native allocator is invisible to it, which is
+  what the RSS history is for: RSS growth that tracemalloc does not
+  explain points at native memory.
+- tracemalloc's counters and peak are process-wide, so measured stages
+  run one at a time behind a lock while tracing is on; otherwise one
+  stage's reset_peak() would clobber another's. Only short, synchronous
+  stages are measured: inference waits on the shared scheduler (and
+  allocates on its worker threads) and responses are built on the event
+  loop, so holding the lock around either would serialise requests.
+
+Tracing costs CPU and is off unless enabled; the RSS sampler is cheap
+and always runs.
+"""
+
+import contextvars
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Stage peaks of the request being handled (None outside tracked requests)
+_current_request: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "memory_request", default=None
+)
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # No procfs: fall back to the peak RSS (bytes on macOS, KiB elsewhere)
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == "darwin" else usage * 1024
+
+
+class _StageStats:
+    """Aggregated allocation numbers for one stage"""
+
+    __slots__ = ("count", "total_peak", "max_peak", "total_retained")
+
+    def __init__(self):
+        self.count = 0
+        self.total_peak = 0
+        self.max_peak = 0
+        self.total_retained = 0
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg_peak_kb": round(self.total_peak / self.count / 1024, 1) if self.count else None,
+            "max_peak_kb": round(self.max_peak / 1024, 1),
+            "avg_retained_kb": round(self.total_retained / self.count / 1024, 2) if self.count else None,
+        }
+
+
+class MemoryTracker:
+    """
+    Stage allocation tracking, RSS sampling and tracemalloc snapshots
+
+    Args:
+        enabled: Trace Python allocations with tracemalloc
+        frames: Traceback depth stored per allocation (more = slower)
+        rss_interval: Seconds between RSS samples (0 = no sampler)
+        history: RSS samples and recent requests kept
+        max_snapshots: Named tracemalloc snapshots kept for diffing
+
+    Example:
+        >>> memory = MemoryTracker(enabled=True)
+        >>> with memory.stage("decode"):
+        ...     image = Image.open(buffer)
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        frames: int = 1,
+        rss_interval: float = 10.0,
+        history: int = 360,
+        max_snapshots: int = 4
+    ):
+        self.enabled = enabled
+        self.frames = frames
+        self.rss_interval = rss_interval
+        self.max_snapshots = max_snapshots
+        self._lock = threading.Lock()
+        self._stage_lock = threading.RLock()
+        self._stages: Dict[str, _StageStats] = {}
+        self._recent: deque = deque(maxlen=history)
+        self._rss: deque = deque(maxlen=history)
+        self._snapshots: "OrderedDict[str, tracemalloc.Snapshot]" = OrderedDict()
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """Start tracing (if enabled) and the RSS sampler (idempotent)"""
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            logger.info(f"tracemalloc enabled ({self.frames} frame(s) per allocation)")
+        if self.rss_interval > 0 and self._sampler is None:
+            self._sampler = threading.Thread(target=self._sample_rss, name="rss-sampler", daemon=True)
+            self._sampler.start()
+
+    def stop(self) -> None:
+        """Stop the RSS sampler"""
+        self._stop.set()
+
+    def _sample_rss(self) -> None:
+        while True:
+            self._rss.append((time.time(), current_rss_bytes()))
+            if self._stop.wait(self.rss_interval):
+                return
+
+    @contextmanager
+    def request(self, path: str) -> Iterator[None]:
+        """Collect the stage numbers of one request"""
+        if not self.enabled:
+            yield
+            return
+        record = {"path": path, "started_at": time.time(), "stages": {}}
+        token = _current_request.set(record)
+        try:
+            yield
+        finally:
+            _current_request.reset(token)
+            self._recent.append(record)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Measure peak and retained Python allocations of one stage
+
+        Stages are measured one at a time, so only wrap short synchronous
+        work that runs on the calling thread (never a scheduler wait or
+        anything on the event loop).
+        """
+        if not self.enabled or not tracemalloc.is_tracing():
+            yield
+            return
+        with self._stage_lock:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            try:
+                yield
+            finally:
+                current, peak = tracemalloc.get_traced_memory()
+                self._record(name, max(peak - before, 0), current - before)
+
+    def _record(self, name: str, peak: int, retained: int) -> None:
+        with self._lock:
+            stats = self._stages.setdefault(name, _StageStats())
+            stats.count += 1
+            stats.total_peak += peak
+            stats.max_peak = max(stats.max_peak, peak)
+            stats.total_retained += retained
+        record = _current_request.get()
+        if record is not None:
+            stages = record["stages"]
+            stages[name] = max(stages.get(name, 0), round(peak / 1024, 1))
+
+    def take_snapshot(self, label: str) -> Dict[str, Any]:
+        """Store a named tracemalloc snapshot for later diffing"""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not enabled (set MEMORY_TRACKING=1)")
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        with self._lock:
+            self._snapshots[label] = snapshot
+            self._snapshots.move_to_end(label)
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return {"label": label, "traced_kb": round(sum(s.size for s in snapshot.statistics("filename")) / 1024, 1)}
+
+    def diff(
+        self,
+        base: str,
+        target: Optional[str] = None,
+        limit: int = 20,
+        group_by: str = "lineno"
+    ) -> List[Dict[str, Any]]:
+        """
+        Largest allocation changes between two snapshots
+
+        Args:
+            base: Label of the earlier snapshot
+            target: Label of the later snapshot (default: take one now)
+            limit: Number of entries returned
+            group_by: "lineno", "filename" or "traceback"
+
+        Returns:
+            Entries sorted by absolute size change
+        """
+        if target is None:
+            target = f"now-{time.time():.0f}"
+            self.take_snapshot(target)
+        with self._lock:
+            if base not in self._snapshots or target not in self._snapshots:
+                raise KeyError(f"Unknown snapshot(s); available: {list(self._snapshots)}")
+            before, after = self._snapshots[base], self._snapshots[target]
+        return [
+            {
+                "location": str(stat.traceback),
+                "size_diff_kb": round(stat.size_diff / 1024, 1),
+                "size_kb": round(stat.size / 1024, 1),
+                "count_diff": stat.count_diff,
+            }
+            for stat in after.compare_to(before, group_by)[:limit]
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        """Current/peak traced memory, RSS history and per-stage numbers"""
+        traced = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else None
+        with self._lock:
+            stages = {name: stats.info() for name, stats in self._stages.items()}
+            snapshots = list(self._snapshots)
+        rss = list(self._rss)
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "rss_mb": round(current_rss_bytes() / (1024 * 1024), 1),
+            "rss_history_mb": [(round(t), round(b / (1024 * 1024), 1)) for t, b in rss],
+            "traced_current_kb": round(traced[0] / 1024, 1) if traced else None,
+            "stages": stages,
+            "recent_requests": list(self._recent)[-20:],
+            "snapshots": snapshots,
+        }
+
+
+class MemoryAccountingMiddleware:
+    """ASGI middleware opening a memory record for requests to given paths"""
+
+    def __init__(self, app: ASGIApp, tracker: MemoryTracker, prefixes: List[str]):
+        self.app = app
+        self.tracker = tracker
+        self.prefixes = tuple(prefixes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self.tracker.enabled or scope["type"] != "http" or not scope["path"].startswith(self.prefixes):
+            await self.app(scope, receive, send)
+            return
+        with self.tracker.request(scope["path"]):
+            await self.app(scope, receive, send)
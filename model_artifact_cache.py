@@ -0,0 +1,261 @@
+"""
+Serving artifact cache for faster cold starts
+Converts a .keras archive once into an architecture + memory-mapped weights layout
+
+keras.models.load_model unzips the archive, parses the HDF5 weights and
+rebuilds the model on every start. The first load of a source file
+writes, under <cache_dir>/<sha256 of the source>/:
+
+    manifest.json      source digest, Keras version, timings of the original load
+    architecture.json  model.to_json()
+    weights/0000.npy   one array per weight, in get_weights() order
+
+Later starts rebuild the model from the JSON and hand memory-mapped .npy
+arrays to set_weights, so weights are paged straight from the file into
+the TF variables without an archive extraction or intermediate buffers.
+The key is the source file's content hash: replacing the model file
+selects (and builds) a new artifact and the stale ones for the same path
+are deleted. Artifacts written by another Keras version are rebuilt.
+
+An artifact that fails to load is deleted and rebuilt once, and the
+failure is recorded in <sha256>.failed next to it. If the rebuilt one
+fails too, later starts load the .keras file directly without trying to
+convert it again (delete the .failed file to retry).
+
+Usage (e.g. in a build step, so the first request never pays for it):
+    python model_artifact_cache.py dogs_vs_cats_production_model.keras
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+ARCHITECTURE = "architecture.json"
+WEIGHTS_DIR = "weights"
+FAILED_SUFFIX = ".failed"
+
+
+def source_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelArtifactCache:
+    """
+    Content-addressed cache of converted serving artifacts
+
+    Args:
+        directory: Where artifacts are stored (one subdirectory per source hash)
+
+    Example:
+        >>> cache = ModelArtifactCache("model_cache")
+        >>> model, load_info = cache.load("model.keras")
+        >>> load_info["source"]
+        'artifact'
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def load(self, path: str) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Load a model, converting it into the cache on first use
+
+        Args:
+            path: Source .keras file
+
+        Returns:
+            Tuple of (Keras model, load timings / provenance for /model/info)
+        """
+        from tensorflow import keras
+
+        start = time.perf_counter()
+        digest = source_digest(path)
+        hash_seconds = time.perf_counter() - start
+        artifact = os.path.join(self.directory, digest)
+        manifest = self._read_manifest(artifact, keras.__version__)
+        # Set if an artifact of this source already failed to load once
+        failure = self._read_failure(artifact, keras.__version__)
+        convert = failure is None
+
+        if manifest is not None:
+            try:
+                load_start = time.perf_counter()
+                model = self._load_artifact(artifact, keras)
+                info = {
+                    "source": "artifact",
+                    "load_seconds": round(time.perf_counter() - load_start, 3),
+                    "keras_load_seconds": manifest["keras_load_seconds"],
+                }
+                if failure is not None:
+                    os.remove(artifact + FAILED_SUFFIX)  # The rebuild worked
+            except Exception as e:
+                shutil.rmtree(artifact, ignore_errors=True)
+                self._record_failure(artifact, path, keras.__version__, e)
+                logger.warning(
+                    f"Model artifact {artifact} unusable ({e}); deleted, "
+                    + ("rebuilding" if convert else "loading the .keras file directly from now on")
+                )
+                manifest = None
+        elif not convert:
+            logger.info(f"Skipping model artifact for {path}: it failed to load before "
+                        f"({failure.get('error')}); delete {artifact + FAILED_SUFFIX} to retry")
+
+        if manifest is None:
+            load_start = time.perf_counter()
+            model = keras.models.load_model(path)
+            keras_load_seconds = round(time.perf_counter() - load_start, 3)
+            info = {
+                "source": "keras",
+                "load_seconds": keras_load_seconds,
+                "keras_load_seconds": keras_load_seconds,
+            }
+            if convert:
+                try:
+                    convert_start = time.perf_counter()
+                    self._write_artifact(artifact, model, path, digest, keras_load_seconds, keras.__version__)
+                    info["convert_seconds"] = round(time.perf_counter() - convert_start, 3)
+                except Exception as e:
+                    # The cache is an optimisation; serving continues from the .keras load
+                    logger.warning(f"Could not write model artifact for {path}: {e}")
+
+        self._prune(path, digest)
+        info.update({"sha256": digest, "hash_seconds": round(hash_seconds, 3)})
+        logger.info(
+            f"Loaded {path} from {info['source']} in {info['load_seconds']}s "
+            f"(.keras load: {info['keras_load_seconds']}s)"
+        )
+        return model, info
+
+    def _read_manifest(self, artifact: str, keras_version: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(artifact, MANIFEST)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("keras_version") != keras_version:
+            logger.info(f"Model artifact {artifact} was built with Keras {manifest.get('keras_version')}; rebuilding")
+            return None
+        return manifest
+
+    def _read_failure(self, artifact: str, keras_version: str) -> Optional[Dict[str, Any]]:
+        """Recorded load failure of this artifact under the running Keras version"""
+        try:
+            with open(artifact + FAILED_SUFFIX) as f:
+                failure = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return failure if failure.get("keras_version") == keras_version else None
+
+    def _record_failure(self, artifact: str, path: str, keras_version: str, error: Exception) -> None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(artifact + FAILED_SUFFIX, "w") as f:
+                json.dump({
+                    "source_path": os.path.abspath(path),
+                    "keras_version": keras_version,
+                    "error": str(error) or type(error).__name__,
+                    "failed_at": time.time(),
+                }, f, indent=2)
+        except OSError as e:
+            logger.warning(f"Could not record model artifact failure: {e}")
+
+    def _load_artifact(self, artifact: str, keras: Any) -> Any:
+        with open(os.path.join(artifact, ARCHITECTURE)) as f:
+            model = keras.models.model_from_json(f.read())
+        weights_dir = os.path.join(artifact, WEIGHTS_DIR)
+        weights = [
+            np.load(os.path.join(weights_dir, name), mmap_mode="r")
+            for name in sorted(os.listdir(weights_dir))
+        ]
+        model.set_weights(weights)
+        return model
+
+    def _write_artifact(self, artifact: str, model: Any, path: str, digest: str,
+                        keras_load_seconds: float, keras_version: str) -> None:
+        # Build in a private directory and rename it into place, so a
+        # concurrent worker never sees a partial artifact
+        tmp = f"{artifact}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(os.path.join(tmp, WEIGHTS_DIR))
+        with open(os.path.join(tmp, ARCHITECTURE), "w") as f:
+            f.write(model.to_json())
+        for i, weight in enumerate(model.get_weights()):
+            np.save(os.path.join(tmp, WEIGHTS_DIR, f"{i:04d}.npy"), np.ascontiguousarray(weight))
+        with open(os.path.join(tmp, MANIFEST), "w") as f:
+            json.dump({
+                "sha256": digest,
+                "source_path": os.path.abspath(path),
+                "keras_version": keras_version,
+                "keras_load_seconds": keras_load_seconds,
+                "created_at": time.time(),
+            }, f, indent=2)
+        # A stale build (another Keras version) is moved aside rather than
+        # deleted first, so the artifact path is never half-removed
+        old = f"{artifact}.{os.getpid()}.old.tmp"
+        if os.path.isdir(artifact):
+            shutil.rmtree(old, ignore_errors=True)
+            os.rename(artifact, old)
+        try:
+            os.rename(tmp, artifact)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)  # Another worker finished first
+            if not os.path.isdir(artifact):
+                raise
+        finally:
+            shutil.rmtree(old, ignore_errors=True)
+
+    def _prune(self, path: str, digest: str) -> None:
+        """Delete artifacts of earlier contents of the same source path"""
+        source_path = os.path.abspath(path)
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else []:
+            if name.startswith(digest) or name.endswith(".tmp"):
+                continue
+            artifact = os.path.join(self.directory, name)
+            failure_record = name.endswith(FAILED_SUFFIX)
+            try:
+                with open(artifact if failure_record else os.path.join(artifact, MANIFEST)) as f:
+                    stale = json.load(f).get("source_path") == source_path
+            except (OSError, ValueError):
+                continue
+            if not stale:
+                continue
+            if failure_record:
+                os.remove(artifact)
+            else:
+                shutil.rmtree(artifact, ignore_errors=True)
+                logger.info(f"Removed stale model artifact {artifact}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pre-convert a .keras model into the serving artifact cache")
+    parser.add_argument("model", help="Source .keras file")
+    parser.add_argument("--cache-dir", default=os.getenv("MODEL_CACHE_DIR") or "model_cache",
+                        help="Artifact cache directory (default: MODEL_CACHE_DIR or model_cache)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    cache = ModelArtifactCache(args.cache_dir)
+    cache.load(args.model)
+    # Second load shows what later starts will pay
+    _, info = cache.load(args.model)
+    print(f"Artifact load: {info['load_seconds']}s vs .keras load: {info['keras_load_seconds']}s "
+          f"(+{info['hash_seconds']}s hashing the source)")
+
+
+if __name__ == "__main__":
+    main()
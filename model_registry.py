@@ -0,0 +1,206 @@
+"""
+Model registry for zero-downtime hot-swap
+Holds loaded model versions, the active version and optional traffic split
+
+Requests grab a LoadedModel reference once and use it until they finish,
+so swapping the active version (a single reference assignment under a
+lock) never disturbs in-flight work; the old model is released when the
+last request holding it completes.
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LoadedModel:
+    """A model version that is ready to serve, plus its serving stats"""
+
+    def __init__(self, version: str, model: Any, path: str):
+        self.version = version
+        self.model = model
+        self.path = path
+        # Penultimate-layer backbone and classification head (set by the loader)
+        self.embedder: Any = None
+        self.head: Optional[Callable[[Any], Any]] = None
+        # Load / warm-up timings (set by the loader)
+        self.load_info: Dict[str, Any] = {}
+        self.loaded_at = time.time()
+        self.requests = 0
+        self.images = 0
+        self.total_latency = 0.0
+        self._stats_lock = threading.Lock()
+
+    def record(self, latency: float, images: int = 1) -> None:
+        """Record one model call for latency comparison between versions"""
+        with self._stats_lock:
+            self.requests += 1
+            self.images += images
+            self.total_latency += latency
+
+    def info(self) -> Dict[str, Any]:
+        """Serving statistics for /model/info and the admin endpoints"""
+        with self._stats_lock:
+            avg_ms = (self.total_latency / self.requests * 1000) if self.requests else None
+            return {
+                "version": self.version,
+                "path": self.path,
+                "loaded_at": self.loaded_at,
+                "load": self.load_info,
+                "requests": self.requests,
+                "images": self.images,
+                "avg_latency_ms": round(avg_ms, 2) if avg_ms is not None else None,
+            }
+
+
+class ModelRegistry:
+    """
+    Thread-safe set of loaded model versions
+
+    Example:
+        >>> registry = ModelRegistry()
+        >>> registry.register(LoadedModel("v1", model, path), activate=True)
+        >>> entry = registry.select()
+        >>> entry.model.predict(batch)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions: Dict[str, LoadedModel] = {}
+        self._active: Optional[str] = None
+        self._traffic: Dict[str, float] = {}
+        self._activation_listeners: List[Callable[[LoadedModel], None]] = []
+        self.load_jobs: Dict[str, Dict[str, Any]] = {}
+
+    def on_activate(self, callback: Callable[[LoadedModel], None]) -> None:
+        """Call callback(entry) whenever a version becomes the active one"""
+        self._activation_listeners.append(callback)
+
+    def _notify_activated(self, entry: LoadedModel) -> None:
+        for callback in self._activation_listeners:
+            try:
+                callback(entry)
+            except Exception as e:
+                logger.error(f"Activation listener failed for version {entry.version}: {e}")
+
+    @property
+    def active(self) -> Optional[LoadedModel]:
+        """The version serving traffic when no split is configured"""
+        with self._lock:
+            return self._versions.get(self._active) if self._active else None
+
+    def get(self, version: str) -> Optional[LoadedModel]:
+        """Look up a loaded version"""
+        with self._lock:
+            return self._versions.get(version)
+
+    def register(self, entry: LoadedModel, activate: bool = False) -> None:
+        """Add (or replace) a loaded version, optionally making it active"""
+        with self._lock:
+            self._versions[entry.version] = entry
+            activated = activate or self._active is None
+            if activated:
+                self._active = entry.version
+                # A new active version takes all traffic
+                self._traffic = {}
+        logger.info(f"Model version {entry.version} registered (active={self._active})")
+        if activated:
+            self._notify_activated(entry)
+
+    def activate(self, version: str) -> None:
+        """Atomically route all traffic to a loaded version"""
+        with self._lock:
+            entry = self._versions.get(version)
+            if entry is None:
+                raise KeyError(f"Model version not loaded: {version}")
+            self._active = version
+            self._traffic = {}
+        logger.info(f"Model version {version} activated")
+        self._notify_activated(entry)
+
+    def unload(self, version: str) -> None:
+        """Drop a version; in-flight requests still holding it finish normally"""
+        with self._lock:
+            if version == self._active or version in self._traffic:
+                raise ValueError(f"Model version {version} is serving traffic")
+            if self._versions.pop(version, None) is None:
+                raise KeyError(f"Model version not loaded: {version}")
+        logger.info(f"Model version {version} unloaded")
+
+    def set_traffic(self, weights: Dict[str, float]) -> None:
+        """
+        Split traffic between loaded versions by weight
+
+        An empty mapping sends everything to the active version.
+        """
+        with self._lock:
+            unknown = [v for v in weights if v not in self._versions]
+            if unknown:
+                raise KeyError(f"Model versions not loaded: {', '.join(unknown)}")
+            if any(w < 0 for w in weights.values()):
+                raise ValueError("Traffic weights must be non-negative")
+            if weights and sum(weights.values()) <= 0:
+                raise ValueError("At least one traffic weight must be positive")
+            self._traffic = {v: w for v, w in weights.items() if w > 0}
+        logger.info(f"Traffic split set to {weights or 'active version only'}")
+
+    def select(self) -> LoadedModel:
+        """Pick the version that serves the next request"""
+        with self._lock:
+            if self._traffic:
+                versions = list(self._traffic)
+                version = random.choices(versions, weights=[self._traffic[v] for v in versions])[0]
+            else:
+                version = self._active
+            if version is None:
+                raise LookupError("No model loaded")
+            return self._versions[version]
+
+    def load_in_background(
+        self,
+        version: str,
+        loader: Callable[[], LoadedModel],
+        activate: bool = True
+    ) -> None:
+        """
+        Load (and warm up) a version in a background thread
+
+        Progress is reported in load_jobs[version]; the registry keeps
+        serving the current version until the new one is ready.
+        """
+        with self._lock:
+            job = self.load_jobs.get(version)
+            if job and job["status"] == "loading":
+                raise ValueError(f"Model version {version} is already loading")
+            self.load_jobs[version] = {"status": "loading", "started_at": time.time()}
+
+        def run():
+            try:
+                entry = loader()
+                self.register(entry, activate=activate)
+                self.load_jobs[version].update(status="ready", finished_at=time.time())
+            except Exception as e:
+                logger.error(f"Failed to load model version {version}: {e}")
+                self.load_jobs[version].update(
+                    status="failed", error=str(e), finished_at=time.time()
+                )
+
+        threading.Thread(target=run, name=f"model-load-{version}", daemon=True).start()
+
+    def info(self) -> Dict[str, Any]:
+        """Snapshot of versions, routing and load jobs"""
+        with self._lock:
+            versions = list(self._versions.values())
+            active = self._active
+            traffic = dict(self._traffic)
+            jobs = {v: dict(job) for v, job in self.load_jobs.items()}
+        return {
+            "active_version": active,
+            "traffic": traffic,
+            "versions": [entry.info() for entry in versions],
+            "load_jobs": jobs,
+        }
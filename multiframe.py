@@ -0,0 +1,178 @@
+"""
+Multi-frame image support (animated GIF, multi-page TIFF)
+Samples frames lazily so long animations stay within a memory budget
+
+Only the sampled frames are materialised: the image is seeked to each
+sampled index in turn and that frame is preprocessed to the small model
+input before the next one is decoded, so at most one full-resolution
+frame is held at a time. The number of sampled frames is bounded both by
+a frame limit and by a decoded-pixel budget.
+
+GIF and TIFF only learn their frame count by walking the file (and
+seeking to a GIF frame decodes the ones before it), so the frame scan is
+capped too: count_frames() never steps past a limit, and containers that
+declare more frames than the server accepts are rejected up front.
+"""
+
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+SAMPLING_STRATEGIES = ("uniform", "first", "stride")
+AGGREGATIONS = ("mean", "median", "max", "min")
+
+
+class TooManyFrames(ValueError):
+    """The image has more frames than the server is willing to scan"""
+
+
+def count_frames(image: Image.Image, limit: int) -> Tuple[int, bool]:
+    """
+    Count frames/pages without walking past limit
+
+    Formats that declare their frame count in the header (APNG, WebP)
+    answer directly; GIF and TIFF are stepped through frame by frame and
+    the walk stops after limit frames.
+
+    Args:
+        image: Opened image
+        limit: Most frames to step through
+
+    Returns:
+        Tuple of (frames counted, capped at limit; True if more follow)
+    """
+    if not getattr(image, "is_animated", False):
+        return 1, False
+    declared = getattr(image, "_n_frames", None)
+    if declared is not None:
+        return min(declared, limit), declared > limit
+    count = 0
+    for _ in ImageSequence.Iterator(image):
+        if count == limit:
+            break
+        count += 1
+    else:
+        image.seek(0)
+        return count, False
+    image.seek(0)
+    return count, True
+
+
+def plan_frames(
+    image: Image.Image,
+    budget: int,
+    strategy: str = "uniform",
+    stride: int = 1,
+    max_scan: int = 1000
+) -> Tuple[Optional[int], List[int]]:
+    """
+    Count as many frames as the sampling strategy needs and pick indices
+
+    "first" and "stride" only need a prefix of the animation, so the scan
+    stops where their last sampled frame is; "uniform" needs the total
+    and walks at most max_scan frames.
+
+    Args:
+        image: Opened image
+        budget: Maximum frames to sample
+        strategy: See sample_frame_indices
+        stride: Step used by the "stride" strategy
+        max_scan: Most frames the server will step through
+
+    Returns:
+        Tuple of (total frames, or None if the scan stopped early;
+        sorted frame indices)
+
+    Raises:
+        TooManyFrames: The image declares more than max_scan frames, or a
+            "uniform" scan found more than that
+    """
+    if strategy not in SAMPLING_STRATEGIES:
+        raise ValueError(f"Unknown sampling strategy: {strategy}")
+    declared = getattr(image, "_n_frames", None)
+    if declared is not None and declared > max_scan:
+        raise TooManyFrames(f"Image has {declared} frames (limit {max_scan})")
+    if strategy == "first":
+        needed = budget
+    elif strategy == "stride":
+        needed = (budget - 1) * max(stride, 1) + 1
+    else:
+        needed = max_scan
+    total, more = count_frames(image, min(needed, max_scan))
+    if more and strategy == "uniform":
+        raise TooManyFrames(f"Image has more than {max_scan} frames")
+    return (None if more else total), sample_frame_indices(total, budget, strategy, stride)
+
+
+def frame_budget(image: Image.Image, max_frames: int, max_pixels: int) -> int:
+    """
+    How many frames may be decoded for this image
+
+    Args:
+        image: Opened (not yet decoded) image
+        max_frames: Upper bound on sampled frames
+        max_pixels: Decoded-pixel budget across all sampled frames
+
+    Returns:
+        Frame budget (at least 1)
+    """
+    width, height = image.size
+    by_pixels = max_pixels // max(width * height, 1)
+    return max(1, min(max_frames, by_pixels))
+
+
+def sample_frame_indices(total: int, budget: int, strategy: str = "uniform", stride: int = 1) -> List[int]:
+    """
+    Choose which frames to classify
+
+    Args:
+        total: Frames in the image
+        budget: Maximum frames to return
+        strategy: "uniform" (evenly spread over the whole animation),
+            "first" (the first frames) or "stride" (every stride-th frame
+            from the start)
+        stride: Step used by the "stride" strategy
+
+    Returns:
+        Sorted frame indices
+    """
+    if strategy not in SAMPLING_STRATEGIES:
+        raise ValueError(f"Unknown sampling strategy: {strategy}")
+    if strategy == "first":
+        return list(range(min(total, budget)))
+    if strategy == "stride":
+        return list(range(0, total, max(stride, 1)))[:budget]
+    if total <= budget:
+        return list(range(total))
+    return sorted({int(i) for i in np.linspace(0, total - 1, budget)})
+
+
+def decode_frames(
+    image: Image.Image,
+    indices: List[int],
+    preprocess: Callable[[Image.Image], np.ndarray]
+) -> np.ndarray:
+    """
+    Decode and preprocess the selected frames one at a time
+
+    Args:
+        image: Opened multi-frame image
+        indices: Sorted frame indices to decode
+        preprocess: Turns one frame into a (1, H, W, C) model input
+
+    Returns:
+        Array of shape (len(indices), H, W, C)
+    """
+    arrays = []
+    for index in indices:
+        image.seek(index)
+        arrays.append(preprocess(image))
+    return np.concatenate(arrays)
+
+
+def aggregate_scores(scores: np.ndarray, method: str = "mean") -> float:
+    """Combine per-frame scores into one score"""
+    if method not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation: {method}")
+    return float(getattr(np, method)(scores))
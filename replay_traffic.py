@@ -0,0 +1,187 @@
+"""
+Traffic replay tool
+Re-drives a capture from traffic_capture.py and reports the latency distribution
+
+Requests are sent at their captured arrival offsets, divided by --speed
+(2 = twice as fast), so bursts and idle gaps are reproduced. Payloads
+come from the capture's blobs when stored; hash-only records are replayed
+with a synthetic image of the recorded format and dimensions.
+
+Usage:
+    python replay_traffic.py captures/ --url http://localhost:8000 --speed 2
+    python replay_traffic.py captures/ --in-process --stub --speed 10
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List
+
+import numpy as np
+from PIL import Image
+
+from traffic_capture import capture_files
+
+try:
+    import httpx
+except ImportError:  # Only needed by this tool
+    httpx = None
+
+SAVE_FORMATS = {"JPEG": "JPEG", "MPO": "JPEG", "PNG": "PNG", "GIF": "GIF", "TIFF": "TIFF"}
+
+
+def load_capture(directory: str, limit: int) -> List[Dict[str, Any]]:
+    """Read capture records, ordered by arrival time"""
+    records = []
+    for path in capture_files(directory):
+        with open(path) as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    records.sort(key=lambda record: record["ts"])
+    return records[:limit] if limit else records
+
+
+def payload_for(directory: str, entry: Dict[str, Any]) -> bytes:
+    """Stored blob, or a synthetic image shaped like the captured one"""
+    if entry.get("blob"):
+        with open(os.path.join(directory, entry["blob"]), "rb") as f:
+            return f.read()
+    width, height = entry.get("width") or 256, entry.get("height") or 256
+    rng = np.random.default_rng(int(entry["hash"][:8], 16))
+    pixels = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, SAVE_FORMATS.get(entry.get("format"), "JPEG"))
+    return buffer.getvalue()
+
+
+def build_request(directory: str, record: Dict[str, Any]) -> Dict[str, Any]:
+    """httpx request arguments for one captured record"""
+    uploads = [(entry["filename"], payload_for(directory, entry)) for entry in record["files"]]
+    if record["endpoint"] == "/predict/batch":
+        files = [("files", upload) for upload in uploads]
+    else:
+        files = {"file": uploads[0]}
+    url = record["endpoint"] + (f"?{record['query']}" if record.get("query") else "")
+    headers = {"X-Priority": record["priority"]} if record.get("priority") else {}
+    return {"url": url, "files": files, "headers": headers}
+
+
+async def replay(
+    client: "httpx.AsyncClient",
+    directory: str,
+    records: List[Dict[str, Any]],
+    speed: float,
+    max_concurrency: int
+) -> List[Dict[str, Any]]:
+    """
+    Send every request at its (scaled) captured offset
+
+    Payloads are read or synthesised per request once it holds a
+    concurrency slot (on a thread, off the event loop), so at most
+    max_concurrency of them are in memory at a time.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    results: List[Dict[str, Any]] = []
+    first_ts = records[0]["ts"]
+    start = time.perf_counter()
+
+    async def send(record: Dict[str, Any], due: float) -> None:
+        async with semaphore:
+            request = await asyncio.to_thread(build_request, directory, record)
+            sent = time.perf_counter()
+            try:
+                response = await client.post(request["url"], files=request["files"], headers=request["headers"])
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            results.append({
+                "endpoint": record["endpoint"],
+                "status": status,
+                "latency": time.perf_counter() - sent,
+                "lag": sent - start - due,
+            })
+
+    tasks = []
+    for record in records:
+        due = (record["ts"] - first_ts) / speed
+        delay = due - (time.perf_counter() - start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(send(record, due)))
+    await asyncio.gather(*tasks)
+    return results
+
+
+def percentiles_ms(latencies: List[float]) -> str:
+    values = np.array(latencies) * 1000
+    return " ".join(
+        f"p{p}={np.percentile(values, p):.1f}" for p in (50, 90, 95, 99)
+    ) + f" max={values.max():.1f}"
+
+
+def report(results: List[Dict[str, Any]], elapsed: float) -> None:
+    """Print throughput, status codes and latency percentiles"""
+    print(f"Sent {len(results)} requests in {elapsed:.1f}s ({len(results) / elapsed:.1f} req/s)")
+    print(f"Status codes: {dict(Counter(r['status'] for r in results))}")
+    print(f"Latency (ms), all: {percentiles_ms([r['latency'] for r in results])}")
+    by_endpoint = defaultdict(list)
+    for r in results:
+        by_endpoint[r["endpoint"]].append(r["latency"])
+    for endpoint, latencies in sorted(by_endpoint.items()):
+        print(f"  {endpoint:<16} n={len(latencies):<6} {percentiles_ms(latencies)}")
+    max_lag = max(r["lag"] for r in results)
+    if max_lag > 0.1:
+        print(f"Warning: requests were sent up to {max_lag * 1000:.0f} ms late; "
+              f"the replay client could not keep up (lower --speed or raise --max-concurrency)")
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    records = load_capture(args.capture_dir, args.limit)
+    if not records:
+        raise SystemExit(f"No capture records found in {args.capture_dir}")
+    span = records[-1]["ts"] - records[0]["ts"]
+    print(f"Replaying {len(records)} requests spanning {span:.1f}s at {args.speed}x")
+
+    if args.in_process:
+        import api  # Configured from the environment set in main()
+
+        api.load_model()
+        transport = httpx.ASGITransport(app=api.app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=args.timeout)
+    else:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+
+    async with client:
+        start = time.perf_counter()
+        results = await replay(client, args.capture_dir, records, args.speed, args.max_concurrency)
+        report(results, time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay captured traffic and report latency")
+    parser.add_argument("capture_dir", help="Directory written by traffic capture (CAPTURE_DIR)")
+    parser.add_argument("--url", default="http://localhost:8000", help="API to replay against")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Replay against api:app in this process instead of --url")
+    parser.add_argument("--stub", action="store_true",
+                        help="With --in-process, use the generated stand-in model")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed factor (default: 1x)")
+    parser.add_argument("--limit", type=int, default=0, help="Replay at most N requests")
+    parser.add_argument("--max-concurrency", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    if httpx is None:
+        raise SystemExit("replay_traffic.py requires httpx: pip install httpx")
+    if args.speed <= 0:
+        raise SystemExit("--speed must be positive")
+    if args.stub:
+        os.environ["MODEL_SOURCE"] = "stub"
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
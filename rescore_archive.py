@@ -0,0 +1,143 @@
+"""
+Archive re-scoring through the tensor store
+Decode + resize an image archive once, then re-score it for every new model
+
+- ``ingest`` walks directories, decodes and resizes each image with the
+  API's resize step and appends the uint8 pixels to a TensorStore.
+  Files already in the store (same path, or same content) are skipped,
+  so an interrupted ingest resumes by re-running it.
+- ``score`` streams zero-copy batches from the store's memory map into
+  a model and writes one CSV row per record. No image is decoded, so
+  the run is bound by model compute.
+
+Stores written by the API (TENSOR_STORE_DIR) can be scored the same way;
+their records have no source path, only the content hash.
+
+Usage:
+    python rescore_archive.py ingest /data/images --store archive_tensors
+    python rescore_archive.py score --store archive_tensors --model new.keras --output scores.csv
+"""
+
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+import api
+from bulk_classify import iter_images
+from single_flight import content_hash
+from tensor_store import TensorStore
+
+COLUMNS = ["hash", "source", "prediction", "raw_score", "confidence"]
+
+
+def load_pixels(path: str, store: TensorStore) -> Tuple[str, Optional[str], Optional[np.ndarray], Optional[str]]:
+    """Read, hash and resize one file (runs on worker threads)"""
+    try:
+        with open(path, "rb") as f:
+            digest = content_hash(f.read())
+        if digest in store:
+            return path, digest, None, None
+        with Image.open(path) as image:
+            return path, digest, api.resize_image(image), None
+    except Exception as e:
+        return path, None, None, str(e)
+
+
+def ingest(args: argparse.Namespace) -> None:
+    store = TensorStore(args.store, (*api.IMG_SIZE, 3))
+    done = {source for source in store.sources() if source}
+    print(f"Store has {len(store)} records")
+    paths = iter_images(args.inputs, done)
+    added = skipped = failed = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.workers) as pool:
+        while True:
+            # Bounded chunks keep the number of decoded images in memory small
+            chunk = list(islice(paths, args.workers * 64))
+            if not chunk:
+                break
+            for path, digest, pixels, error in pool.map(lambda p: load_pixels(p, store), chunk):
+                if error:
+                    failed += 1
+                    print(f"Skipping {path}: {error}")
+                elif pixels is None:
+                    skipped += 1
+                else:
+                    store.append(digest, pixels, source=path)
+                    added += 1
+            elapsed = time.perf_counter() - start
+            print(f"{added} added | {skipped} duplicates | {failed} failed | {added / elapsed:.1f} img/s")
+    print(f"Done: store has {len(store)} records ({store.stats()['size_mb']} MB)")
+
+
+def score(args: argparse.Namespace) -> None:
+    store = TensorStore(args.store, (*api.IMG_SIZE, 3))
+    if not len(store):
+        raise SystemExit(f"No records in {args.store}")
+    if args.model:
+        if not os.path.exists(args.model):
+            raise SystemExit(f"Model file not found: {args.model}")
+        model = api.load_model_version("rescore", args.model, file_id=None).model
+    else:
+        model = api.load_model()
+
+    hashes, sources = store.hashes(), store.sources()
+
+    def prepare(item: Tuple[int, np.ndarray]) -> Tuple[int, np.ndarray]:
+        offset, pixels = item
+        return offset, api.normalize_pixels(pixels.astype(np.float32))
+
+    processed = 0
+    start = time.perf_counter()
+    with open(args.output, "w", newline="") as f, ThreadPoolExecutor(1) as pool:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        # Normalise the next batch on a thread while the model runs
+        batches = store.batches(args.batch_size)
+        pending = pool.submit(prepare, next(batches))
+        while pending is not None:
+            offset, batch = pending.result()
+            following = next(batches, None)
+            pending = pool.submit(prepare, following) if following is not None else None
+            scores = model.predict_on_batch(batch)[:, 0]
+            for i, raw in enumerate(scores):
+                details = api.get_prediction_details(raw)
+                writer.writerow([hashes[offset + i], sources[offset + i], details["prediction"],
+                                 details["raw_score"], details["confidence"]])
+            processed += len(batch)
+    elapsed = time.perf_counter() - start
+    print(f"Scored {processed} records in {elapsed:.1f}s ({processed / elapsed:.1f} img/s) -> {args.output}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ingest images into a tensor store and re-score them")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = commands.add_parser("ingest", help="Decode + resize images into the store")
+    ingest_parser.add_argument("inputs", nargs="+", help="Directories to scan for images")
+    ingest_parser.add_argument("--store", required=True, help="Tensor store directory")
+    ingest_parser.add_argument("--workers", type=int, default=os.cpu_count() or 4,
+                               help="Decode threads")
+
+    score_parser = commands.add_parser("score", help="Score every record in the store")
+    score_parser.add_argument("--store", required=True, help="Tensor store directory")
+    score_parser.add_argument("--output", required=True, help="Results CSV")
+    score_parser.add_argument("--model", help="Model file (default: api.py model, downloaded if missing)")
+    score_parser.add_argument("--batch-size", type=int, default=512)
+
+    args = parser.parse_args()
+    if args.command == "ingest":
+        ingest(args)
+    else:
+        score(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+Two-tier prediction cache shared across replicas
+Local in-process LRU in front of a Redis-compatible key-value store
+
+Keys are "<namespace>:<model version>:<content hash>", so a replica can
+reuse a result any other replica computed for the same bytes and model,
+and a new model version never sees old results. Lookups go local first,
+then to the shared store; a batch request checks all of its images with
+one MGET round trip and writes its new results with one pipeline.
+
+The shared store is an optimisation, never a dependency: lookups that
+exceed the timeout or fail count as misses and the result is computed,
+and after a failure the store is skipped for a back-off period so an
+outage does not add the timeout to every request. Writes happen in the
+background after the response is ready.
+
+Uses redis.asyncio when the redis package is installed, otherwise a
+minimal built-in RESP client (GET/SET/MGET are all this needs).
+stub_kv_server.py is an in-memory stand-in for local testing.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+from urllib.parse import urlparse
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # Optional: falls back to the built-in RESP client
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+STAGE_CACHE = "cache"
+
+
+class RespError(Exception):
+    """Error reply from the server"""
+
+
+def encode_command(*args: Any) -> bytes:
+    """Encode one command as a RESP array of bulk strings"""
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    """Read one RESP value (error replies are returned as RespError)"""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed by server")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode()
+    if kind == b"-":
+        return RespError(payload.decode())
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        length = int(payload)
+        return None if length < 0 else [await read_reply(reader) for _ in range(length)]
+    raise ConnectionError(f"Unexpected RESP reply: {line[:32]!r}")
+
+
+class RespClient:
+    """
+    Minimal pipelining RESP client with a small connection pool
+
+    Args:
+        url: redis://[:password@]host[:port][/db]
+        pool_size: Connections opened at most
+
+    Example:
+        >>> client = RespClient("redis://localhost:6379/0")
+        >>> await client.execute(("SET", "k", "v"), ("GET", "k"))
+        ['OK', b'v']
+    """
+
+    def __init__(self, url: str, pool_size: int = 8):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self._slots = asyncio.Semaphore(pool_size)
+        self._idle: List[tuple] = []
+
+    async def execute(self, *commands: Sequence[Any]) -> List[Any]:
+        """
+        Send commands in one write and read their replies in order
+
+        Raises:
+            RespError: A command got an error reply
+            ConnectionError / OSError: The connection failed
+        """
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else await self._connect()
+            reader, writer = connection
+            try:
+                writer.write(b"".join(encode_command(*command) for command in commands))
+                await writer.drain()
+                replies = [await read_reply(reader) for _ in commands]
+            except BaseException:
+                # Cancelled (timeout) or broken mid-reply: the stream position is unknown
+                writer.close()
+                raise
+            self._idle.append(connection)
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    async def _connect(self) -> tuple:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        setup = []
+        if self.password:
+            setup.append(encode_command("AUTH", self.password))
+        if self.db:
+            setup.append(encode_command("SELECT", self.db))
+        if setup:
+            writer.write(b"".join(setup))
+            await writer.drain()
+            for _ in setup:
+                reply = await read_reply(reader)
+                if isinstance(reply, RespError):
+                    writer.close()
+                    raise reply
+        return reader, writer
+
+    async def close(self) -> None:
+        """Close idle connections"""
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+
+class RedisPyClient:
+    """Same execute() interface on top of redis.asyncio"""
+
+    def __init__(self, url: str):
+        self._redis = redis_asyncio.from_url(url)
+
+    async def execute(self, *commands: Sequence[Any]) -> List[Any]:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for command in commands:
+                pipe.execute_command(*command)
+            return await pipe.execute()
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def connect(url: str) -> Any:
+    """Client for a redis:// URL: redis.asyncio if installed, else the built-in one"""
+    return RedisPyClient(url) if redis_asyncio is not None else RespClient(url)
+
+
+class TwoTierCache:
+    """
+    Local LRU + shared store for per-image prediction results
+
+    Args:
+        local_size: Entries kept in process (0 = no local tier)
+        remote: Client with an async execute(*commands), or None
+        timeout: Seconds a shared-store lookup may take before computing instead
+        ttl: Seconds results live in the shared store
+        backoff: Seconds the shared store is skipped after a failure
+        namespace: Key prefix in the shared store
+        max_pending_writes: Background writes in flight before new ones are skipped
+
+    Example:
+        >>> cache = TwoTierCache(10000, connect("redis://cache:6379"))
+        >>> hits = await cache.get_many(["1:ab12...", "1:cd34..."])
+        >>> cache.put_many({"1:cd34...": {"score": 0.93}})
+    """
+
+    def __init__(
+        self,
+        local_size: int,
+        remote: Any = None,
+        timeout: float = 0.05,
+        ttl: int = 86400,
+        backoff: float = 5.0,
+        namespace: str = "catdog:pred",
+        max_pending_writes: int = 100
+    ):
+        self.local_size = local_size
+        self.remote = remote
+        self.timeout = timeout
+        self.ttl = ttl
+        self.backoff = backoff
+        self.namespace = namespace
+        self.max_pending_writes = max_pending_writes
+        self._local: OrderedDict = OrderedDict()
+        self._pending_writes: set = set()
+        self._remote_down_until = 0.0
+        self._remote_lookup_seconds = 0.0
+        self.counters = {
+            "local_hits": 0,
+            "remote_hits": 0,
+            "misses": 0,
+            "remote_lookups": 0,
+            "remote_timeouts": 0,
+            "remote_errors": 0,
+            "remote_skipped": 0,
+            "writes_dropped": 0,
+        }
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached result for one key, or None"""
+        return (await self.get_many([key]))[0]
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Cached results for several keys (one shared-store round trip)
+
+        Returns:
+            One result dict or None per key, in order
+        """
+        results: List[Optional[Dict[str, Any]]] = [self._local_get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        self.counters["local_hits"] += len(keys) - len(missing)
+        if missing and self._remote_available():
+            values = await self._remote_mget([keys[i] for i in missing])
+            for i, value in zip(missing, values):
+                if value is not None:
+                    results[i] = json.loads(value)
+                    self._local_put(keys[i], results[i])
+                    self.counters["remote_hits"] += 1
+        self.counters["misses"] += sum(result is None for result in results)
+        return results
+
+    def put_many(self, items: Dict[str, Dict[str, Any]]) -> None:
+        """Store results locally now and in the shared store in the background"""
+        for key, value in items.items():
+            self._local_put(key, value)
+        if not items or not self._remote_available():
+            return
+        if len(self._pending_writes) >= self.max_pending_writes:
+            self.counters["writes_dropped"] += len(items)
+            return
+        task = asyncio.ensure_future(self._remote_set(items))
+        self._pending_writes.add(task)
+        task.add_done_callback(self._pending_writes.discard)
+
+    def _local_get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._local.get(key)
+        if value is not None:
+            self._local.move_to_end(key)
+        return value
+
+    def _local_put(self, key: str, value: Dict[str, Any]) -> None:
+        if self.local_size <= 0:
+            return
+        self._local[key] = value
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    def _remote_available(self) -> bool:
+        if self.remote is None:
+            return False
+        if time.monotonic() < self._remote_down_until:
+            self.counters["remote_skipped"] += 1
+            return False
+        return True
+
+    def _remote_failed(self, counter: str, error: BaseException) -> None:
+        self.counters[counter] += 1
+        if time.monotonic() >= self._remote_down_until:
+            logger.warning(f"Result cache store unavailable ({str(error) or type(error).__name__}); "
+                           f"skipping it for {self.backoff}s")
+        self._remote_down_until = time.monotonic() + self.backoff
+
+    async def _remote_mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        self.counters["remote_lookups"] += 1
+        start = time.perf_counter()
+        try:
+            (values,) = await asyncio.wait_for(
+                self.remote.execute(["MGET", *(f"{self.namespace}:{key}" for key in keys)]),
+                self.timeout
+            )
+            return values
+        except asyncio.TimeoutError as e:
+            self._remote_failed("remote_timeouts", e)
+        except Exception as e:
+            self._remote_failed("remote_errors", e)
+        finally:
+            self._remote_lookup_seconds += time.perf_counter() - start
+        return [None] * len(keys)
+
+    async def _remote_set(self, items: Dict[str, Dict[str, Any]]) -> None:
+        commands = [
+            ("SET", f"{self.namespace}:{key}", json.dumps(value, separators=(",", ":")), "EX", self.ttl)
+            for key, value in items.items()
+        ]
+        try:
+            # Writes are off the request path; allow them more time
+            await asyncio.wait_for(self.remote.execute(*commands), self.timeout * 10)
+        except asyncio.TimeoutError as e:
+            self._remote_failed("remote_timeouts", e)
+        except Exception as e:
+            self._remote_failed("remote_errors", e)
+
+    async def close(self) -> None:
+        """Wait briefly for background writes, then close the store client"""
+        if self._pending_writes:
+            await asyncio.wait(self._pending_writes, timeout=1.0)
+        if self.remote is not None:
+            await self.remote.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rates per tier and store health for /metrics"""
+        lookups = self.counters["local_hits"] + self.counters["remote_hits"] + self.counters["misses"]
+        remote_lookups = self.counters["remote_lookups"]
+        return {
+            "local_entries": len(self._local),
+            "local_size": self.local_size,
+            "remote": self.remote is not None,
+            "remote_available": self.remote is not None and time.monotonic() >= self._remote_down_until,
+            "hit_rate": round((lookups - self.counters["misses"]) / lookups, 4) if lookups else None,
+            "remote_lookup_ms_avg": (
+                round(self._remote_lookup_seconds / remote_lookups * 1000, 2) if remote_lookups else None
+            ),
+            "pending_writes": len(self._pending_writes),
+            **self.counters,
+        }
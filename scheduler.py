@@ -0,0 +1,336 @@
+"""
+Priority scheduler for shared inference capacity
+Keeps bulk traffic from starving interactive predictions
+
+Every model call goes through one InferenceScheduler:
+- Jobs carry a priority class (interactive, batch, background). Classes
+  share capacity by weight using stride scheduling, accounted in images,
+  so a class with weight 8 gets ~8x the throughput of weight 1 while
+  both are busy, and idle classes cost nothing.
+- Inside a class, clients (API key or IP) are served round-robin, so one
+  bulk customer cannot crowd out another.
+- Queued jobs of the same class, model version and kind (e.g. scoring
+  vs embedding extraction) are merged into one model call (up to
+  max_batch_size images), which also batches concurrent single-image
+  requests together.
+- A job can carry an expiry check (the request's deadline / disconnect
+  state). Jobs that expired while queued, or whose future was cancelled,
+  are dropped before they reach the model instead of using a batch slot.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ("interactive", "batch", "background")
+
+
+class JobExpired(Exception):
+    """A queued job was dropped because its request expired"""
+
+
+class SchedulerStopped(RuntimeError):
+    """The scheduler was stopped before the job ran"""
+
+
+def parse_weights(value: str) -> Dict[str, int]:
+    """Parse "interactive=8,batch=2,background=1" into a weights dict"""
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in PRIORITIES:
+            raise ValueError(f"Unknown priority class: {name}")
+        weights[name] = max(int(weight), 1)
+    return weights
+
+
+class _Job:
+    """One submitted array waiting for inference"""
+
+    __slots__ = ("array", "entry", "kind", "expired", "future", "enqueued_at")
+
+    def __init__(
+        self,
+        array: np.ndarray,
+        entry: Any,
+        kind: str,
+        expired: Optional[Callable[[], bool]] = None
+    ):
+        self.array = array
+        self.entry = entry
+        self.kind = kind
+        self.expired = expired
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class _PriorityClass:
+    """Per-client FIFO queues served round-robin, plus stride state"""
+
+    def __init__(self, name: str, weight: int):
+        self.name = name
+        self.weight = weight
+        self.clients: "OrderedDict[str, deque]" = OrderedDict()
+        self.pass_value = 0.0
+        self.queued_jobs = 0
+        self.served_images = 0
+        self.total_wait = 0.0
+        self.served_jobs = 0
+        self.expired_jobs = 0
+
+    def push(self, client: str, job: _Job) -> None:
+        self.clients.setdefault(client, deque()).append(job)
+        self.queued_jobs += 1
+
+    def pop_batch(self, max_images: int) -> List[_Job]:
+        """
+        Take jobs round-robin across clients for one model call
+
+        All jobs in the batch share the first job's model version and kind.
+        Jobs that expired or were cancelled while queued are dropped on the
+        way.
+        """
+        jobs: List[_Job] = []
+        images = 0
+        entry = None
+        kind = None
+        while self.clients:
+            progressed = False
+            for client in list(self.clients):
+                queue = self.clients[client]
+                job = queue[0]
+                if entry is not None and (
+                    job.entry is not entry
+                    or job.kind != kind
+                    or images + len(job.array) > max_images
+                ):
+                    continue
+                queue.popleft()
+                self.queued_jobs -= 1
+                # Move the client to the back of the rotation
+                del self.clients[client]
+                if queue:
+                    self.clients[client] = queue
+                progressed = True
+                if not job.future.set_running_or_notify_cancel():
+                    continue  # Caller gave up while queued
+                if job.expired is not None and job.expired():
+                    self.expired_jobs += 1
+                    job.future.set_exception(JobExpired("Request expired while queued for inference"))
+                    continue
+                jobs.append(job)
+                images += len(job.array)
+                entry = job.entry
+                kind = job.kind
+                if images >= max_images:
+                    return jobs
+            if not progressed:
+                break
+        return jobs
+
+
+class InferenceScheduler:
+    """
+    Weighted-fair, client-fair scheduler in front of the model
+
+    Args:
+        run_batch: Runs the model on (batch, model entry, job kind) and
+            returns one value per image: an array, or a tuple of arrays (e.g. scores
+            plus per-image metadata) that are split the same way
+        weights: Priority class -> weight
+        max_batch_size: Images merged into one model call
+        workers: Threads calling run_batch concurrently
+
+    Example:
+        >>> scheduler = InferenceScheduler(run_model_batch, {"interactive": 8, "batch": 2, "background": 1})
+        >>> scores = scheduler.submit(batch, entry, "batch", "ip:1.2.3.4").result()
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[np.ndarray, Any, str], Any],
+        weights: Dict[str, int],
+        max_batch_size: int = 32,
+        workers: int = 1
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.workers = workers
+        self._classes = {
+            name: _PriorityClass(name, weights.get(name, 1)) for name in PRIORITIES
+        }
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._running = False
+        self._stopped = False
+        self.batches_run = 0
+        self.images_run = 0
+
+    def start(self) -> None:
+        """Start the worker threads (idempotent; not after stop())"""
+        with self._cond:
+            if self._running or self._stopped:
+                return
+            self._running = True
+            self._threads = [
+                threading.Thread(target=self._worker, name=f"inference-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the workers once the current batches finish
+
+        Jobs still queued fail with SchedulerStopped, so no caller is left
+        waiting on a future that would never resolve; later submits raise it.
+        """
+        with self._cond:
+            self._running = False
+            self._stopped = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        with self._cond:
+            for cls in self._classes.values():
+                for queue in cls.clients.values():
+                    for job in queue:
+                        if job.future.set_running_or_notify_cancel():
+                            job.future.set_exception(SchedulerStopped("Inference scheduler stopped"))
+                cls.clients.clear()
+                cls.queued_jobs = 0
+
+    def submit(
+        self,
+        array: np.ndarray,
+        entry: Any,
+        priority: str = "interactive",
+        client: str = "default",
+        expired: Optional[Callable[[], bool]] = None,
+        kind: str = "predict"
+    ) -> Future:
+        """
+        Queue a preprocessed (N, H, W, C) array for inference
+
+        expired is called (under the scheduler lock, so it must be cheap)
+        when the job is taken from the queue; if it returns True the job
+        is dropped and its future fails with JobExpired. kind is passed
+        through to run_batch; only jobs of the same kind are merged into
+        one call.
+
+        Returns:
+            Future resolving to run_batch's output for these N images
+        """
+        if priority not in self._classes:
+            raise ValueError(f"Unknown priority class: {priority}")
+        self.start()
+        job = _Job(array, entry, kind, expired)
+        with self._cond:
+            if self._stopped:
+                raise SchedulerStopped("Inference scheduler stopped")
+            cls = self._classes[priority]
+            if not cls.queued_jobs:
+                # A class waking up from idle must not claim credit for
+                # the time it was idle: join at the current virtual time
+                cls.pass_value = max(cls.pass_value, self._min_pass())
+            cls.push(client, job)
+            self._cond.notify()
+        return job.future
+
+    def predict(
+        self,
+        array: np.ndarray,
+        entry: Any,
+        priority: str = "interactive",
+        client: str = "default",
+        expired: Optional[Callable[[], bool]] = None,
+        kind: str = "predict"
+    ) -> Any:
+        """Blocking convenience wrapper around submit()"""
+        return self.submit(array, entry, priority, client, expired, kind).result()
+
+    @property
+    def queued_jobs(self) -> int:
+        """Jobs waiting for a worker"""
+        with self._cond:
+            return sum(c.queued_jobs for c in self._classes.values())
+
+    def _min_pass(self) -> float:
+        """Virtual time: the lowest pass value among busy classes"""
+        busy = [c.pass_value for c in self._classes.values() if c.queued_jobs]
+        return min(busy) if busy else max(c.pass_value for c in self._classes.values())
+
+    def _next_batch(self) -> Optional[List[_Job]]:
+        """Pick the busy class with the lowest pass value and take a batch"""
+        with self._cond:
+            while self._running and not any(c.queued_jobs for c in self._classes.values()):
+                self._cond.wait()
+            if not self._running:
+                return None
+            cls = min(
+                (c for c in self._classes.values() if c.queued_jobs),
+                key=lambda c: c.pass_value
+            )
+            jobs = cls.pop_batch(self.max_batch_size)
+            images = sum(len(job.array) for job in jobs)
+            cls.pass_value += images / cls.weight
+            cls.served_images += images
+            cls.served_jobs += len(jobs)
+            now = time.monotonic()
+            cls.total_wait += sum(now - job.enqueued_at for job in jobs)
+            return jobs
+
+    def _worker(self) -> None:
+        while True:
+            jobs = self._next_batch()
+            if jobs is None:
+                return
+            if not jobs:
+                continue  # Everything taken had expired or was cancelled
+            try:
+                batch = np.concatenate([job.array for job in jobs])
+                scores = self.run_batch(batch, jobs[0].entry, jobs[0].kind)
+            except Exception as e:
+                for job in jobs:
+                    job.future.set_exception(e)
+                continue
+            self.batches_run += 1
+            self.images_run += len(batch)
+            offset = 0
+            for job in jobs:
+                end = offset + len(job.array)
+                if isinstance(scores, tuple):
+                    job.future.set_result(tuple(part[offset:end] for part in scores))
+                else:
+                    job.future.set_result(scores[offset:end])
+                offset = end
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-class queue depth, throughput share and wait time"""
+        with self._cond:
+            classes = {
+                c.name: {
+                    "weight": c.weight,
+                    "queued_jobs": c.queued_jobs,
+                    "queued_clients": len(c.clients),
+                    "served_images": c.served_images,
+                    "expired_jobs": c.expired_jobs,
+                    "avg_wait_ms": round(c.total_wait / c.served_jobs * 1000, 2) if c.served_jobs else None,
+                }
+                for c in self._classes.values()
+            }
+        return {
+            "batches_run": self.batches_run,
+            "images_run": self.images_run,
+            "avg_batch_size": round(self.images_run / self.batches_run, 2) if self.batches_run else None,
+            "classes": classes,
+        }
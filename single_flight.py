@@ -0,0 +1,67 @@
+"""
+Single-flight deduplication of identical in-flight work
+Concurrent callers with the same key share one computation
+
+When a popular image is uploaded by many clients at once, the first
+request (the leader) starts the decode + inference and every identical
+request that arrives before it finishes awaits the same result instead
+of running its own copy.
+"""
+
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+def content_hash(data: bytes) -> str:
+    """Fast content digest used as the dedup/cache key for uploads"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls with the same key onto one task
+
+    The shared computation runs as its own task, so a leader whose client
+    disconnects does not cancel the result the followers are waiting on.
+
+    Example:
+        >>> flights = SingleFlight()
+        >>> result = await flights.do(key, lambda: compute(data))
+    """
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.shared_hits = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn() for key, or join the run already in flight
+
+        Exceptions raised by fn() propagate to every caller sharing it.
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self.shared_hits += 1
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        """Forget a completed flight so later calls compute afresh"""
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved even if every caller went away
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for /metrics"""
+        return {
+            "in_flight_keys": len(self._tasks),
+            "leaders": self.leaders,
+            "shared_hits": self.shared_hits,
+        }
@@ -0,0 +1,128 @@
+"""
+Memory soak test for the Cat vs Dog Classifier API
+Sends thousands of requests in-process and fails if RSS keeps growing
+
+The baseline RSS is taken after a warm-up (model load, graph tracing,
+allocator pools), so only growth under steady traffic counts. Exits with
+status 1 when RSS grew more than --max-growth-mb over the run. With
+--tracemalloc the largest Python allocation changes between the
+baseline and the end are printed too.
+
+Usage:
+    python soak_test.py --requests 5000 --max-growth-mb 50
+    python soak_test.py --stub --latency-ms 20    # offline, stand-in model
+"""
+
+import argparse
+import gc
+import io
+import os
+import sys
+import time
+from typing import List
+
+import numpy as np
+from PIL import Image
+
+
+def synthetic_images(count: int, seed: int = 0) -> List[bytes]:
+    """Random JPEG/PNG uploads of varying sizes"""
+    rng = np.random.default_rng(seed)
+    images = []
+    for i in range(count):
+        size = (int(rng.integers(64, 640)), int(rng.integers(64, 640)))
+        pixels = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, "PNG" if i % 4 == 0 else "JPEG")
+        images.append(buffer.getvalue())
+    return images
+
+
+def load_images(directory: str) -> List[bytes]:
+    """Read every jpg/jpeg/png file in a directory"""
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith((".jpg", ".jpeg", ".png")):
+            with open(os.path.join(directory, name), "rb") as f:
+                images.append(f.read())
+    return images
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fail if API memory grows under sustained traffic")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests after warm-up")
+    parser.add_argument("--warmup", type=int, default=200, help="Requests before the baseline")
+    parser.add_argument("--max-growth-mb", type=float, default=50.0, help="Allowed RSS growth")
+    parser.add_argument("--batch-every", type=int, default=10,
+                        help="Every Nth request goes to /predict/batch (0 = never)")
+    parser.add_argument("--images", help="Directory of images to upload (default: synthetic)")
+    parser.add_argument("--report-every", type=int, default=500)
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="Trace Python allocations and print the top growth")
+    parser.add_argument("--stub", action="store_true",
+                        help="Use the generated stand-in model (MODEL_SOURCE=stub)")
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="Artificial latency per model call (INJECT_LATENCY_MS)")
+    args = parser.parse_args()
+
+    # api reads its configuration at import time
+    if args.tracemalloc:
+        os.environ["MEMORY_TRACKING"] = "1"
+    if args.stub:
+        os.environ["MODEL_SOURCE"] = "stub"
+    if args.latency_ms:
+        os.environ["INJECT_LATENCY_MS"] = str(args.latency_ms)
+
+    from fastapi.testclient import TestClient
+
+    import api
+    from memory_accounting import current_rss_bytes
+
+    images = load_images(args.images) if args.images else synthetic_images(32)
+    if not images:
+        raise SystemExit(f"No images found in {args.images}")
+
+    def send(client: TestClient, i: int) -> None:
+        if args.batch_every and i % args.batch_every == args.batch_every - 1:
+            files = [("files", (f"{j}.jpg", images[(i + j) % len(images)])) for j in range(4)]
+            response = client.post("/predict/batch", files=files)
+        else:
+            response = client.post("/predict", files={"file": ("image.jpg", images[i % len(images)])})
+        response.raise_for_status()
+
+    with TestClient(api.app) as client:
+        for i in range(args.warmup):
+            send(client, i)
+        gc.collect()
+        baseline = current_rss_bytes()
+        if args.tracemalloc:
+            api.memory.take_snapshot("baseline")
+        print(f"Baseline RSS after {args.warmup} warm-up requests: {baseline / 2**20:.1f} MB")
+
+        start = time.perf_counter()
+        for i in range(args.requests):
+            send(client, args.warmup + i)
+            if (i + 1) % args.report_every == 0:
+                growth = (current_rss_bytes() - baseline) / 2**20
+                rate = (i + 1) / (time.perf_counter() - start)
+                print(f"{i + 1} requests | RSS {growth:+.1f} MB | {rate:.1f} req/s")
+
+        gc.collect()
+        growth = (current_rss_bytes() - baseline) / 2**20
+        if args.tracemalloc:
+            print("\nLargest Python allocation growth since baseline:")
+            for entry in api.memory.diff("baseline", limit=10):
+                print(f"  {entry['size_diff_kb']:+10.1f} KB  {entry['location']}")
+            print("\nPer-stage allocations:")
+            for name, stats in api.memory.stats()["stages"].items():
+                print(f"  {name:<12} {stats}")
+
+    print(f"\nRSS growth over {args.requests} requests: {growth:+.1f} MB (limit {args.max_growth_mb} MB)")
+    if growth > args.max_growth_mb:
+        print("FAIL: memory grew beyond the threshold")
+        sys.exit(1)
+    print("PASS")
+
+
+if __name__ == "__main__":
+    main()
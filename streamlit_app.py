@@ -24,12 +24,63 @@ from api_client import ClassifierAPIClient
 try:
     API_BASE_URL = st.secrets.get("API_BASE_URL", os.getenv("API_BASE_URL", "http://localhost:8000"))
     API_TIMEOUT = int(st.secrets.get("API_TIMEOUT", os.getenv("API_TIMEOUT", "30")))
+    INFERENCE_BACKEND = st.secrets.get("INFERENCE_BACKEND", os.getenv("INFERENCE_BACKEND", "http"))
 except:
     API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
     API_TIMEOUT = int(os.getenv("API_TIMEOUT", "30"))
+    INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "http")
+
+# "http" talks to a separate FastAPI deployment, "inprocess" runs the
+# api.py pipeline inside this process (single-host installs)
+IN_PROCESS = INFERENCE_BACKEND.lower() == "inprocess"
+
+
+class InProcessClassifierClient:
+    """
+    Drop-in replacement for ClassifierAPIClient that calls the api.py
+    pipeline directly, skipping JPEG re-encoding, the HTTP hop and
+    multipart parsing. Only the methods used by this app are provided.
+    """
+    
+    def __init__(self):
+        # Imported lazily so HTTP-only deployments don't need TensorFlow
+        import api
+        self._api = api
+    
+    def health_check(self) -> Dict[str, Any]:
+        """Load the model if needed and report its status"""
+        try:
+            self._api.load_model()
+            return {
+                'available': True,
+                'data': self._api.get_health_status()
+            }
+        except Exception as e:
+            return {
+                'available': False,
+                'error': getattr(e, 'detail', str(e))
+            }
+    
+    def get_model_info(self) -> Dict[str, Any]:
+        """Get information about the loaded model"""
+        return self._api.get_model_info_data()
+    
+    def predict_from_pil_image(
+        self,
+        image: Image.Image,
+        filename: str = 'image.jpg'
+    ) -> Dict[str, Any]:
+        """Predict from PIL Image object without leaving the process"""
+        return self._api.predict_pil_image(image, filename)
+
+
+@st.cache_resource(show_spinner=False)
+def get_inprocess_client() -> InProcessClassifierClient:
+    """Create the in-process client once; the model is shared across sessions"""
+    client = InProcessClassifierClient()
+    client.health_check()  # Load the model up front
+    return client
 
-# Initialize API client
-api_client = ClassifierAPIClient(base_url=API_BASE_URL, timeout=API_TIMEOUT)
 
 # Page configuration
 st.set_page_config(
@@ -39,6 +90,14 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Initialize API client
+if IN_PROCESS:
+    api_client = get_inprocess_client()
+    API_ENDPOINT_LABEL = "In-process (api.py)"
+else:
+    api_client = ClassifierAPIClient(base_url=API_BASE_URL, timeout=API_TIMEOUT)
+    API_ENDPOINT_LABEL = API_BASE_URL
+
 # Custom CSS for modern, minimalist, responsive UI
 st.markdown("""
     <style>
@@ -300,7 +359,11 @@ def verify_api_connection():
 # Check API availability
 api_status = verify_api_connection()
 
-if not api_status["available"]:
+if not api_status["available"] and IN_PROCESS:
+    st.error("⚠️ **In-process model could not be loaded**")
+    st.error(f"Error: {api_status['error']}")
+    st.stop()
+elif not api_status["available"]:
     st.error("⚠️ **Backend API is not available**")
     st.error(f"Error: {api_status['error']}")
     st.info(f"""
@@ -317,7 +380,7 @@ else:
     # Show subtle success indicator in sidebar
     with st.sidebar:
         st.success("✅ API Connected")
-        st.caption(f"Endpoint: {API_BASE_URL}")
+        st.caption(f"Endpoint: {API_ENDPOINT_LABEL}")
 
 # Instructions for paste
 # Short helpful tip (paste feature removed)
@@ -443,7 +506,7 @@ if uploaded_file is not None:
             
             **API Backend:**
             - **Framework:** {model_info.get('framework', 'N/A')}
-            - **Endpoint:** {API_BASE_URL}
+            - **Endpoint:** {API_ENDPOINT_LABEL}
             """)
         else:
             st.markdown("""
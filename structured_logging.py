@@ -0,0 +1,310 @@
+"""
+Non-blocking structured logging
+Queue-based handlers, JSON records with request IDs, sampled request logs
+
+- Loggers only enqueue records (QueueHandler); formatting and the actual
+  write happen on a QueueListener thread, so a slow stderr/log pipe never
+  stalls the event loop. When the queue is full records are dropped and
+  counted instead of blocking.
+- Every record carries the request ID of the request that emitted it
+  (from X-Request-ID, or generated), captured on the emitting thread.
+- RequestLogMiddleware writes one summary record per request with status,
+  duration and per-stage timings. Successful requests are sampled
+  (LOG_SUCCESS_SAMPLE_RATE); every 5xx and every slow request is logged.
+  The request thread only enqueues a tuple of the raw values; the
+  LogRecord and its fields are built on the listener thread.
+- configure_logging() is called from the server's startup, not at import,
+  and like logging.basicConfig() leaves an already configured root
+  logger alone, so importing api from tools or tests changes nothing.
+"""
+
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, TextIO, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+REQUEST_ID_HEADER = "x-request-id"
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+# Stage timings and annotations of the request being handled
+_request_fields: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "request_fields", default=None
+)
+
+request_logger = logging.getLogger("api.requests")
+
+# Status codes of shed work (overloaded, deadline passed): expected under
+# overload and counted in /metrics, so logged as warnings rather than errors
+SHED_STATUSES = (503, 504)
+
+# (queue handler, listener) installed by configure_logging()
+_installed: Optional[Tuple["DroppingQueueHandler", "SummaryQueueListener"]] = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request ID (runs on the emitting thread)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when full and defers formatting"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only resolve %-args here; the listener thread does the formatting
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: Any) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SummaryQueueListener(logging.handlers.QueueListener):
+    """QueueListener that also turns raw request summaries into LogRecords"""
+
+    def prepare(self, record: Any) -> logging.LogRecord:
+        if isinstance(record, tuple):
+            return summary_record(*record)
+        return record
+
+
+def summary_record(
+    level: int,
+    created: float,
+    request_id: Optional[str],
+    scope: Scope,
+    status: int,
+    duration_ms: float,
+    slow: bool,
+    fields: Dict[str, Any],
+    exception: Optional[BaseException]
+) -> logging.LogRecord:
+    """Build the api.requests record for one request (on the listener thread)"""
+    exc_info = (type(exception), exception, exception.__traceback__) if exception is not None else None
+    record = request_logger.makeRecord(
+        request_logger.name, level, __file__, 0, "request", None, exc_info,
+        extra={"fields": {
+            "method": scope.get("method"),
+            "path": scope.get("path"),
+            "status": status,
+            "duration_ms": round(duration_ms, 2),
+            "slow": slow,
+            **fields,
+        }}
+    )
+    record.created = created
+    record.request_id = request_id
+    return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; extra={"fields": {...}} is merged in"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, separators=(",", ":"))
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable format for local development"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = None
+        text = super().format(record)
+        fields = getattr(record, "fields", None)
+        return f"{text} {json.dumps(fields, default=str)}" if fields else text
+
+
+def queue_logging(
+    target: logging.Handler,
+    queue_size: int = 10000
+) -> tuple[DroppingQueueHandler, logging.handlers.QueueListener]:
+    """
+    Put a queue in front of a handler
+
+    Args:
+        target: Handler doing the formatting + writing (on the listener thread)
+        queue_size: Records buffered before new ones are dropped
+
+    Returns:
+        Tuple of (handler to attach to loggers, started listener)
+    """
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(RequestIdFilter())
+    listener = SummaryQueueListener(log_queue, target, respect_handler_level=True)
+    listener.start()
+    return handler, listener
+
+
+def configure_logging(
+    level: str = "INFO",
+    json_format: bool = True,
+    queue_size: int = 10000,
+    stream: Optional[TextIO] = None
+) -> bool:
+    """
+    Route the root logger through a background queue to stderr (or stream)
+
+    Does nothing if logging is already configured, by this function or
+    by whoever set up root handlers first (uvicorn --log-config, a test
+    runner, an app embedding the API). Existing handlers are never removed.
+
+    Returns:
+        True if the queue handler was installed by this call
+    """
+    global _installed
+    root = logging.getLogger()
+    if _installed is not None or root.handlers:
+        return False
+    target = logging.StreamHandler(stream or sys.stderr)
+    target.setFormatter(JsonFormatter() if json_format else TextFormatter())
+    _installed = queue_logging(target, queue_size)
+    root.addHandler(_installed[0])
+    root.setLevel(level)
+    return True
+
+
+def stop_logging() -> None:
+    """Flush pending records and remove what configure_logging() installed"""
+    global _installed
+    if _installed is None:
+        return
+    handler, listener = _installed
+    _installed = None
+    logging.getLogger().removeHandler(handler)
+    listener.stop()
+
+
+def annotate(**fields: Any) -> None:
+    """Add fields to the current request's summary record (no-op outside requests)"""
+    current = _request_fields.get()
+    if current is not None:
+        current.update(fields)
+
+
+def record_stage(name: str, seconds: float) -> None:
+    """Add a stage duration to the current request's summary record"""
+    current = _request_fields.get()
+    if current is not None:
+        stages = current.setdefault("stages_ms", {})
+        stages[name] = round(stages.get(name, 0.0) + seconds * 1000, 2)
+
+
+@contextmanager
+def timed_stage(name: str) -> Iterator[None]:
+    """Time a block as a request stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+class RequestLogMiddleware:
+    """
+    ASGI middleware assigning request IDs and logging sampled request summaries
+
+    Args:
+        app: Wrapped ASGI app
+        success_sample_rate: Fraction of successful requests logged
+        slow_ms: Requests at least this slow are always logged
+    """
+
+    def __init__(self, app: ASGIApp, success_sample_rate: float = 1.0, slow_ms: float = 1000.0):
+        self.app = app
+        self.success_sample_rate = success_sample_rate
+        self.slow_ms = slow_ms
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == REQUEST_ID_HEADER.encode():
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        id_token = request_id_var.set(request_id)
+        fields: Dict[str, Any] = {}
+        fields_token = _request_fields.set(fields)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_id(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER.encode(), request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        error: Optional[BaseException] = None
+        try:
+            await self.app(scope, receive, send_with_id)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            self._log(scope, status, duration_ms, fields, error)
+            _request_fields.reset(fields_token)
+            request_id_var.reset(id_token)
+
+    def _log(self, scope: Scope, status: int, duration_ms: float,
+             fields: Dict[str, Any], exception: Optional[BaseException]) -> None:
+        # Every 5xx is logged, never sampled away. Shed requests are warnings;
+        # if they flood the queue during overload, records are dropped (and
+        # counted) rather than blocking the request
+        shed = exception is None and status in SHED_STATUSES
+        error = exception is not None or (status >= 500 and not shed)
+        slow = duration_ms >= self.slow_ms
+        if not (error or shed or slow or random.random() < self.success_sample_rate):
+            return
+        level = logging.ERROR if error else logging.WARNING if slow or shed else logging.INFO
+        if not request_logger.isEnabledFor(level):
+            return
+        summary = (level, time.time(), request_id_var.get(), scope, status, duration_ms, slow, fields, exception)
+        installed = _installed
+        if installed is not None and logging.root.handlers == [installed[0]] and not request_logger.handlers:
+            # Only our queue would see the record: skip building it on this thread
+            installed[0].enqueue(summary)
+        else:
+            request_logger.handle(summary_record(*summary))
@@ -0,0 +1,164 @@
+"""
+In-memory stand-in for a Redis-compatible server
+Enough of the RESP protocol to exercise the shared result cache locally
+
+Supports PING, AUTH, SELECT, GET, SET (with EX/PX), MGET, DEL, EXISTS,
+DBSIZE and FLUSHDB/FLUSHALL; keys live in one dict with lazy expiry.
+--latency-ms delays every reply to mimic a network hop, and the server
+can be paused to see the API fall back to computing on timeouts.
+
+Usage:
+    python stub_kv_server.py --port 6380 --latency-ms 1
+    RESULT_CACHE_URL=redis://127.0.0.1:6380 uvicorn api:app
+"""
+
+import argparse
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from result_cache import RespError, read_reply
+
+logger = logging.getLogger(__name__)
+
+
+def encode_reply(value: Any) -> bytes:
+    """Encode a Python value as a RESP reply"""
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, RespError):
+        return f"-{value}\r\n".encode()
+    if isinstance(value, int):
+        return b":%d\r\n" % int(value)
+    if isinstance(value, str):
+        return f"+{value}\r\n".encode()
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(encode_reply(item) for item in value)
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+class StubKVServer:
+    """
+    Single-process key-value server speaking RESP
+
+    Args:
+        latency_ms: Delay added before every reply
+
+    Example:
+        >>> server = StubKVServer()
+        >>> port = server.start_in_thread()
+        >>> cache = TwoTierCache(0, connect(f"redis://127.0.0.1:{port}"))
+    """
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.paused = False  # When set, commands are read but never answered
+        self.commands = 0
+        self._data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Listen on the running loop; returns the bound port"""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    def start_in_thread(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Run the server on its own loop in a daemon thread; returns the port"""
+        ready = threading.Event()
+        bound = []
+
+        def run() -> None:
+            loop = asyncio.new_event_loop()
+            bound.append(loop.run_until_complete(self.start(host, port)))
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, name="stub-kv-server", daemon=True).start()
+        ready.wait()
+        return bound[0]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                command = await read_reply(reader)
+                if not isinstance(command, list) or not command:
+                    break
+                self.commands += 1
+                while self.paused:
+                    await asyncio.sleep(0.01)
+                if self.latency_ms:
+                    await asyncio.sleep(self.latency_ms / 1000)
+                writer.write(encode_reply(self._execute(command[0].upper(), command[1:])))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and time.monotonic() >= expires:
+            del self._data[key]
+            return None
+        return value
+
+    def _execute(self, name: bytes, args: list) -> Any:
+        if name == b"PING":
+            return "PONG"
+        if name in (b"AUTH", b"SELECT"):
+            return "OK"
+        if name == b"GET":
+            return self._get(args[0])
+        if name == b"MGET":
+            return [self._get(key) for key in args]
+        if name == b"SET":
+            expires = None
+            options = [arg.upper() for arg in args[2:]]
+            if b"EX" in options:
+                expires = time.monotonic() + int(args[2 + options.index(b"EX") + 1])
+            elif b"PX" in options:
+                expires = time.monotonic() + int(args[2 + options.index(b"PX") + 1]) / 1000
+            self._data[args[0]] = (args[1], expires)
+            return "OK"
+        if name == b"DEL":
+            return sum(self._data.pop(key, None) is not None for key in args)
+        if name == b"EXISTS":
+            return sum(self._get(key) is not None for key in args)
+        if name == b"DBSIZE":
+            return len(self._data)
+        if name in (b"FLUSHDB", b"FLUSHALL"):
+            self._data.clear()
+            return "OK"
+        return RespError(f"ERR unknown command '{name.decode(errors='replace')}'")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="In-memory Redis-compatible stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to every reply")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def serve() -> None:
+        server = StubKVServer(args.latency_ms)
+        port = await server.start(args.host, args.port)
+        logger.info(f"Stub key-value server listening on {args.host}:{port}")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Deterministic stand-in model
+A tiny generated Keras model with the production model's interface
+
+Used with MODEL_SOURCE=stub so the API, benchmarks and soak tests run on
+machines without Google Drive access or the 111 MB artifact. The model
+takes (128, 128, 3) inputs in [0, 1] and ends in a single sigmoid unit
+like the real CNN; its weights come from seeded initializers, so every
+build produces the same scores for the same image.
+"""
+
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+STUB_INPUT_SHAPE = (128, 128, 3)
+
+
+def build_stub_model(seed: int = 0):
+    """
+    Build the stand-in classifier
+
+    Args:
+        seed: Seed for the weight initializers
+
+    Returns:
+        Uncompiled Keras model: conv -> pooling -> dense -> sigmoid
+    """
+    from tensorflow import keras
+
+    def init(offset: int):
+        return keras.initializers.GlorotUniform(seed=seed + offset)
+
+    return keras.Sequential([
+        keras.Input(shape=STUB_INPUT_SHAPE),
+        keras.layers.Conv2D(4, 3, strides=4, activation="relu", kernel_initializer=init(0)),
+        keras.layers.GlobalAveragePooling2D(),
+        keras.layers.Dense(8, activation="relu", kernel_initializer=init(1)),
+        keras.layers.Dense(1, activation="sigmoid", kernel_initializer=init(2)),
+    ], name="stub_classifier")
+
+
+def ensure_stub_model(path: str, seed: int = 0) -> str:
+    """
+    Generate the stand-in model at path unless it already exists
+
+    Args:
+        path: Target .keras file
+        seed: Seed for the weight initializers
+
+    Returns:
+        The path, ready for keras.models.load_model
+    """
+    if not os.path.exists(path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write next to the target and rename, so concurrent workers never
+        # load a half-written file
+        tmp_path = f"{path}.{os.getpid()}.tmp.keras"
+        build_stub_model(seed).save(tmp_path)
+        os.replace(tmp_path, path)
+        logger.info(f"Generated stub model at {path} (seed {seed})")
+    return path
@@ -0,0 +1,352 @@
+"""
+Append-only store of preprocessed image tensors
+Keeps the 128x128x3 uint8 output of the resize step so archives can be
+re-scored without decoding and resizing the originals again
+
+Layout of a store directory:
+
+    tensors.bin   fixed-size uint8 records (128*128*3 bytes each), appended
+    index.jsonl   one {"hash", "source"} line per record, in record order
+
+Record i starts at byte i * record_size of tensors.bin, so the index only
+has to map content hash -> record number. Readers memory-map tensors.bin
+and get batches as zero-copy slices of the mapping.
+
+Appends write the tensor bytes first and the index line second; on open,
+a tensor without its index line (or a torn index line) from an
+interrupted append is cut off. Appends take an exclusive lock on the
+index file where fcntl is available, and pick up records other
+processes appended first, so several server workers can share one store.
+
+The API does not append on the request path: TensorStoreWriter queues
+records (bounded; drops and counts them when full) and a background
+thread appends them in batches, one lock and one write per batch.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single writing process only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+TENSORS_FILE = "tensors.bin"
+INDEX_FILE = "index.jsonl"
+
+
+class TensorStore:
+    """
+    Memory-mapped, append-only uint8 tensor store indexed by content hash
+
+    Args:
+        directory: Store directory (created if missing)
+        shape: Shape of one record
+
+    Example:
+        >>> store = TensorStore("archive_tensors")
+        >>> store.append(content_hash(data), pixels, source="cats/001.jpg")
+        >>> for start, batch in store.batches(512):
+        ...     scores = model.predict_on_batch(batch / 255.0)
+    """
+
+    def __init__(self, directory: str, shape: Tuple[int, ...] = (128, 128, 3)):
+        self.directory = directory
+        self.shape = tuple(shape)
+        self.record_size = int(np.prod(self.shape))
+        os.makedirs(directory, exist_ok=True)
+        self._tensors_path = os.path.join(directory, TENSORS_FILE)
+        self._index_path = os.path.join(directory, INDEX_FILE)
+        self._lock = threading.Lock()
+        self._offsets: Dict[str, int] = {}
+        self._sources: List[Optional[str]] = []
+        self._index_position = 0
+        self._mmap: Optional[np.memmap] = None
+        with self._lock, self._file_lock():
+            self._repair()
+            self._read_index()
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self._offsets
+
+    def sources(self) -> List[Optional[str]]:
+        """Source label of every record, in record order"""
+        return list(self._sources)
+
+    def hashes(self) -> List[str]:
+        """Content hash of every record, in record order"""
+        ordered: List[str] = [""] * len(self._sources)
+        for digest, record in self._offsets.items():
+            ordered[record] = digest
+        return ordered
+
+    def append(self, digest: str, pixels: np.ndarray, source: Optional[str] = None) -> int:
+        """
+        Add one record unless its content hash is already stored
+
+        Args:
+            digest: Content hash of the original encoded image
+            pixels: uint8 array of the store's shape (a leading batch axis of 1 is accepted)
+            source: Optional label, e.g. the original file path
+
+        Returns:
+            Record number of the (new or existing) record
+        """
+        if digest in self._offsets:
+            return self._offsets[digest]
+        return self.append_many([(digest, pixels, source)])[0]
+
+    def append_many(self, records: List[Tuple[str, np.ndarray, Optional[str]]]) -> List[int]:
+        """
+        Add several records under one lock, with one tensor and one index write
+
+        Args:
+            records: (digest, pixels, source) tuples as taken by append()
+
+        Returns:
+            Record number of each (new or existing) record
+        """
+        arrays = []
+        for _, pixels, _ in records:
+            pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+            if pixels.size != self.record_size:
+                raise ValueError(f"Expected {self.shape} pixels, got {pixels.shape}")
+            arrays.append(pixels)
+        with self._lock, self._file_lock():
+            self._read_index()  # Records appended by other processes
+            first = len(self._sources)
+            numbers: List[int] = []
+            new: Dict[str, int] = {}
+            added: List[Tuple[str, Optional[str]]] = []
+            data: List[bytes] = []
+            for (digest, _, source), pixels in zip(records, arrays):
+                existing = self._offsets.get(digest, new.get(digest))
+                if existing is not None:
+                    numbers.append(existing)
+                    continue
+                new[digest] = first + len(added)
+                numbers.append(new[digest])
+                added.append((digest, source))
+                data.append(pixels.tobytes())
+            if not added:
+                return numbers
+            with open(self._tensors_path, "r+b" if os.path.exists(self._tensors_path) else "wb") as f:
+                f.seek(first * self.record_size)
+                f.write(b"".join(data))
+            text = "".join(
+                json.dumps({"hash": digest, "source": source}, separators=(",", ":")) + "\n"
+                for digest, source in added
+            )
+            with open(self._index_path, "a") as f:
+                f.write(text)
+            self._index_position += len(text.encode())
+            for digest, source in added:
+                self._add(digest, source)
+            return numbers
+
+    def get(self, digest: str) -> Optional[np.ndarray]:
+        """Zero-copy view of one record, or None"""
+        record = self._offsets.get(digest)
+        return None if record is None else self.view()[record]
+
+    def view(self) -> np.ndarray:
+        """Read-only memory map of all records, shape (N, *shape)"""
+        count = len(self._sources)
+        if count == 0:
+            return np.zeros((0, *self.shape), dtype=np.uint8)
+        if self._mmap is None or len(self._mmap) != count:
+            self._mmap = np.memmap(self._tensors_path, dtype=np.uint8, mode="r", shape=(count, *self.shape))
+        return self._mmap
+
+    def batches(self, batch_size: int, start: int = 0) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Stream records as zero-copy uint8 slices of the memory map
+
+        Yields:
+            Tuple of (first record number, (B, *shape) uint8 array)
+        """
+        tensors = self.view()
+        for offset in range(start, len(tensors), batch_size):
+            yield offset, tensors[offset:offset + batch_size]
+
+    def stats(self) -> Dict[str, Any]:
+        """Size counters for /metrics"""
+        return {
+            "records": len(self._sources),
+            "size_mb": round(len(self._sources) * self.record_size / (1024 * 1024), 1),
+            "directory": self.directory,
+        }
+
+    def _add(self, digest: str, source: Optional[str]) -> None:
+        self._offsets.setdefault(digest, len(self._sources))
+        self._sources.append(source)
+
+    def _read_index(self) -> None:
+        """Read index lines appended since the last read"""
+        if not os.path.exists(self._index_path):
+            return
+        with open(self._index_path, "rb") as f:
+            f.seek(self._index_position)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Being written by another process
+                entry = json.loads(line)
+                self._add(entry["hash"], entry.get("source"))
+                self._index_position += len(line)
+
+    def _repair(self) -> None:
+        """Cut off what an interrupted append left behind"""
+        records = os.path.getsize(self._tensors_path) // self.record_size if os.path.exists(self._tensors_path) else 0
+        if os.path.exists(self._index_path):
+            valid_bytes = 0
+            lines = 0
+            with open(self._index_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n") or lines == records:
+                        break
+                    valid_bytes += len(line)
+                    lines += 1
+            if valid_bytes != os.path.getsize(self._index_path):
+                logger.warning(f"Tensor store {self.directory}: dropping a torn index entry")
+                os.truncate(self._index_path, valid_bytes)
+            records = lines
+        else:
+            records = 0
+        if os.path.exists(self._tensors_path) and os.path.getsize(self._tensors_path) != records * self.record_size:
+            logger.warning(f"Tensor store {self.directory}: dropping an unindexed record")
+            os.truncate(self._tensors_path, records * self.record_size)
+
+    def _file_lock(self) -> "_FileLock":
+        return _FileLock(os.path.join(self.directory, ".lock"))
+
+
+class _FileLock:
+    """Exclusive flock on a lock file (no-op without fcntl)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self) -> "_FileLock":
+        if fcntl is not None:
+            self._file = open(self.path, "a")
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class TensorStoreWriter:
+    """
+    Background appender for a TensorStore, behind a bounded queue
+
+    Request threads only enqueue; a writer thread appends whatever has
+    queued up as one batch. When the queue is full the record is dropped
+    (and counted) instead of making the request wait for disk.
+
+    Args:
+        store: Store to append to
+        max_queue: Records waiting to be written before new ones are dropped
+        max_batch: Most records appended per batch
+
+    Example:
+        >>> writer = TensorStoreWriter(store, max_queue=256)
+        >>> writer.start()
+        >>> writer.submit(content_hash(contents), pixels)
+        >>> writer.stop()  # Writes what is still queued
+    """
+
+    def __init__(self, store: TensorStore, max_queue: int = 256, max_batch: int = 64):
+        self.store = store
+        self.max_batch = max_batch
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+    def start(self) -> None:
+        """Start the writer thread"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._writer, name="tensor-store", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Write what is queued, then stop the writer thread"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def flush(self) -> None:
+        """Wait until every queued record has been written (writer must be running)"""
+        self._queue.join()
+
+    def submit(self, digest: str, pixels: np.ndarray, source: Optional[str] = None) -> bool:
+        """
+        Queue one record without blocking
+
+        pixels must not be modified afterwards; it is written as is.
+
+        Returns:
+            False if the queue was full and the record was dropped
+        """
+        if digest in self.store:
+            return True
+        try:
+            self._queue.put_nowait((digest, pixels, source))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def _writer(self) -> None:
+        while True:
+            items = [self._queue.get()]
+            while items[-1] is not None and len(items) < self.max_batch:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [item for item in items if item is not None]
+            if records:
+                try:
+                    self.store.append_many(records)
+                    self.written += len(records)
+                    self.batches += 1
+                except Exception as e:
+                    self.failed += len(records)
+                    logger.warning(f"Could not append to tensor store: {e}")
+            for _ in items:
+                self._queue.task_done()
+            if len(records) != len(items):
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        """Writer counters for /metrics"""
+        return {
+            "pending": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
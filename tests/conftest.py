@@ -0,0 +1,39 @@
+"""
+Shared test setup
+api.py reads its configuration at import time, so the environment is set
+here before any test module imports it: the stub model (no download),
+a throwaway artifact cache and quiet logs.
+"""
+
+import io
+import os
+import tempfile
+
+import pytest
+from PIL import Image
+
+os.environ.setdefault("MODEL_SOURCE", "stub")
+os.environ.setdefault("MODEL_CACHE_DIR", tempfile.mkdtemp(prefix="catdog-model-cache-"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("LOG_FORMAT", "text")
+
+
+@pytest.fixture
+def make_image():
+    """Factory encoding a solid-colour test image (lossless, so distinct colours = distinct bytes)"""
+    def make(color: tuple = (200, 120, 40), size: tuple = (64, 48), fmt: str = "PNG") -> bytes:
+        buffer = io.BytesIO()
+        Image.new("RGB", size, color).save(buffer, format=fmt)
+        return buffer.getvalue()
+    return make
+
+
+@pytest.fixture(scope="session")
+def client():
+    """TestClient with startup (model load) done once for the whole run"""
+    from fastapi.testclient import TestClient
+
+    import api
+
+    with TestClient(api.app) as test_client:
+        yield test_client
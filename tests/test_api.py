@@ -0,0 +1,238 @@
+"""
+API behaviour against the stub model: response shapes, compact mode,
+single-flight dedup, result cache, scheduler batching, admission control
+and shutdown
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import api
+from result_cache import TwoTierCache
+from tensor_store import TensorStore, TensorStoreWriter
+
+
+def upload(contents: bytes, name: str = "cat.png") -> dict:
+    return {"file": (name, contents, "image/png")}
+
+
+def batch_upload(*items: tuple) -> list:
+    return [("files", (name, contents, "image/png")) for name, contents in items]
+
+
+def test_predict_response_shape(client, make_image):
+    response = client.post("/predict", files=upload(make_image((10, 20, 30), size=(80, 60))))
+    assert response.status_code == 200
+    body = response.json()
+    assert body["success"] is True
+    assert body["filename"] == "cat.png"
+    assert body["prediction"] in ("Cat", "Dog")
+    assert 0.0 <= body["raw_score"] <= 1.0
+    assert body["probabilities"]["cat"] + body["probabilities"]["dog"] == pytest.approx(100.0, abs=0.02)
+    assert body["decided_by"] == "full"
+    assert body["model_version"] == response.headers["X-Model-Version"]
+    assert body["metadata"] == {"image_size": [80, 60], "image_mode": "RGB", "model_input_size": [128, 128]}
+
+
+def test_predict_rejects_wrong_file_type(client):
+    response = client.post("/predict", files={"file": ("notes.txt", b"hello", "text/plain")})
+    assert response.status_code == 400
+
+
+def test_batch_response_shape(client, make_image):
+    contents = make_image((11, 21, 31))
+    response = client.post("/predict/batch", files=batch_upload(
+        ("a.png", contents), ("b.png", make_image((12, 22, 32))), ("c.png", contents)
+    ) + [("files", ("notes.txt", b"hello", "text/plain"))])
+    assert response.status_code == 200
+    body = response.json()
+    assert body["success"] is True
+    assert body["total_images"] == 4
+    results = body["results"]
+    assert [result["filename"] for result in results] == ["a.png", "b.png", "c.png", "notes.txt"]
+    for result in results[:3]:
+        assert result["success"] is True
+        assert result["prediction"] in ("Cat", "Dog")
+        assert set(result["probabilities"]) == {"cat", "dog"}
+    # Identical uploads in one request get the same answer
+    assert results[0]["probabilities"] == results[2]["probabilities"]
+    assert results[3]["success"] is False and "error" in results[3]
+
+
+def test_compact_mode(client, make_image):
+    contents = make_image((13, 23, 33))
+    full = client.post("/predict", files=upload(contents)).json()
+
+    by_query = client.post("/predict?compact=true", files=upload(contents)).json()
+    by_accept = client.post(
+        "/predict", files=upload(contents), headers={"Accept": api.COMPACT_MEDIA_TYPE}
+    ).json()
+    assert by_query == by_accept == {"label": full["prediction"], "score": full["raw_score"]}
+
+    batch = client.post("/predict/batch?compact=true", files=batch_upload(("a.png", contents))).json()
+    assert batch == {"results": [by_query]}
+
+
+def test_single_flight_shares_identical_uploads(client, make_image, monkeypatch):
+    monkeypatch.setattr(api, "INJECT_LATENCY_MS", 300)
+    contents = make_image((16, 26, 36))
+    before = api.single_flight.stats()
+
+    with ThreadPoolExecutor(4) as pool:
+        responses = list(pool.map(lambda _: client.post("/predict", files=upload(contents)), range(4)))
+
+    assert [response.status_code for response in responses] == [200] * 4
+    assert len({response.json()["raw_score"] for response in responses}) == 1
+    after = api.single_flight.stats()
+    assert after["leaders"] - before["leaders"] == 1
+    assert after["shared_hits"] - before["shared_hits"] == 3
+
+
+def test_batch_duplicates_counted_separately(client, make_image):
+    contents = make_image((17, 27, 37))
+    before_batch = client.get("/metrics").json()["dedup"]
+    client.post("/predict/batch", files=batch_upload(("a.png", contents), ("b.png", contents)))
+    after_batch = client.get("/metrics").json()["dedup"]
+    assert after_batch["batch_duplicate_hits"] - before_batch["batch_duplicate_hits"] == 1
+    assert after_batch["shared_hits"] == before_batch["shared_hits"]
+
+
+def test_result_cache_hit(client, make_image, monkeypatch):
+    monkeypatch.setattr(api, "result_cache", TwoTierCache(100))
+    image = make_image((14, 24, 34))
+
+    first = client.post("/predict", files=upload(image)).json()
+    second = client.post("/predict", files=upload(image)).json()
+    batch = client.post("/predict/batch", files=batch_upload(("a.png", image))).json()
+
+    assert first["decided_by"] == "full"
+    assert second["decided_by"] == "cache"
+    assert second["raw_score"] == first["raw_score"]
+    assert batch["results"][0]["decided_by"] == "cache"
+    assert api.result_cache.stats()["local_hits"] == 2
+
+
+def test_scheduler_merges_concurrent_requests(client, make_image, monkeypatch):
+    monkeypatch.setattr(api, "INJECT_LATENCY_MS", 300)
+    uploads = [make_image((60 * i, 255 - 60 * i, 90)) for i in range(4)]
+    before = api.scheduler.stats()
+
+    with ThreadPoolExecutor(len(uploads)) as pool:
+        responses = list(pool.map(lambda contents: client.post("/predict", files=upload(contents)), uploads))
+
+    assert [response.status_code for response in responses] == [200] * len(uploads)
+    after = api.scheduler.stats()
+    images = after["images_run"] - before["images_run"]
+    batches = after["batches_run"] - before["batches_run"]
+    assert images == len(uploads)
+    # The first job runs alone; the rest queue behind it and share a batch
+    assert batches < images
+
+
+@pytest.fixture
+def saturated(monkeypatch):
+    """Interactive admission with every in-flight slot taken"""
+    monkeypatch.setattr(api.admission, "in_flight", api.admission.max_in_flight)
+    return api.admission
+
+
+def test_admission_overloaded_503(client, make_image, saturated, monkeypatch):
+    monkeypatch.setattr(saturated, "max_queued", 0)
+    response = client.post("/predict", files=upload(make_image((18, 28, 38))))
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_admission_deadline_504(client, make_image, saturated):
+    start = time.monotonic()
+    response = client.post(
+        "/predict", files=upload(make_image((19, 29, 39))), headers={"X-Request-Deadline-Ms": "100"}
+    )
+    assert response.status_code == 504
+    assert time.monotonic() - start < 5
+    assert saturated.stats()["queued"] == 0
+
+
+def test_admission_client_limit_429(client, make_image, saturated, monkeypatch):
+    monkeypatch.setattr(saturated, "max_queued_per_client", 1)
+    contents = make_image((20, 30, 40))
+    with ThreadPoolExecutor(1) as pool:
+        # Holds this client's one queue slot until its deadline passes
+        queued = pool.submit(
+            client.post, "/predict", files=upload(contents), headers={"X-Request-Deadline-Ms": "2000"}
+        )
+        for _ in range(200):
+            if saturated.stats()["queued"]:
+                break
+            time.sleep(0.01)
+        assert saturated.stats()["queued"] == 1
+
+        response = client.post("/predict", files=upload(contents))
+        assert response.status_code == 429
+        assert "Retry-After" in response.headers
+        assert queued.result().status_code == 504
+
+
+def test_deadline_expires_while_queued_in_scheduler(client, make_image, monkeypatch):
+    monkeypatch.setattr(api, "INJECT_LATENCY_MS", 500)
+    before = api.scheduler.stats()["classes"]["interactive"]["expired_jobs"]
+
+    with ThreadPoolExecutor(1) as pool:
+        # Keeps the scheduler worker busy while the second request waits
+        slow = pool.submit(client.post, "/predict", files=upload(make_image((24, 34, 44))))
+        time.sleep(0.1)
+        response = client.post(
+            "/predict", files=upload(make_image((25, 35, 45))), headers={"X-Request-Deadline-Ms": "200"}
+        )
+        assert slow.result().status_code == 200
+
+    assert response.status_code == 504
+    assert api.scheduler.stats()["classes"]["interactive"]["expired_jobs"] == before + 1
+
+
+def test_shutdown_stops_workers_before_flushing(monkeypatch):
+    calls = []
+
+    class Recorder:
+        def __init__(self, name):
+            self.name = name
+
+        def stop(self):
+            calls.append(self.name)
+
+    monkeypatch.setattr(api, "scheduler", Recorder("scheduler"))
+    monkeypatch.setattr(api, "traffic_capture", Recorder("traffic_capture"))
+    monkeypatch.setattr(api, "stop_logging", lambda: calls.append("logging"))
+
+    asyncio.run(api.shutdown_event())
+    assert calls == ["scheduler", "traffic_capture", "logging"]
+
+
+def test_uploads_hashed_once_with_tensor_store(client, make_image, monkeypatch, tmp_path):
+    calls = []
+    original_hash = api.content_hash
+    monkeypatch.setattr(api, "content_hash", lambda contents: calls.append(1) or original_hash(contents))
+    store = TensorStore(str(tmp_path / "tensors"), (*api.IMG_SIZE, 3))
+    writer = TensorStoreWriter(store)
+    writer.start()
+    monkeypatch.setattr(api, "tensor_store", store)
+    monkeypatch.setattr(api, "tensor_writer", writer)
+    monkeypatch.setattr(api, "result_cache", TwoTierCache(100))
+
+    single = make_image((21, 31, 41))
+    client.post("/predict", files=upload(single))
+    assert len(calls) == 1
+
+    calls.clear()
+    first, second = make_image((22, 32, 42)), make_image((23, 33, 43))
+    response = client.post("/predict/batch", files=batch_upload(("a.png", first), ("b.png", second)))
+    assert response.status_code == 200
+    assert len(calls) == 2
+
+    writer.stop()
+    # Batch items are decoded concurrently, so archive order is not fixed
+    assert set(store.hashes()) == {original_hash(single), original_hash(first), original_hash(second)}
+    assert client.get("/metrics").json()["tensor_store"]["writer"]["written"] == 3
@@ -0,0 +1,64 @@
+"""
+Bulk classification CLI: CSV resume after an interrupted run
+"""
+
+import csv
+
+import numpy as np
+
+from bulk_classify import COLUMNS, CsvSink, result_rows
+
+
+def read_rows(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_resume_appends_after_existing_rows(tmp_path):
+    path = str(tmp_path / "results.csv")
+    sink = CsvSink(path)
+    assert sink.done_paths() == set()
+    sink.open()
+    sink.write([["a.jpg", "Cat", 0.1, 90.0, None]])
+    sink.close()
+
+    resumed = CsvSink(path)
+    assert resumed.done_paths() == {"a.jpg"}
+    resumed.open()
+    resumed.write([["b.jpg", "Dog", 0.9, 90.0, None]])
+    resumed.close()
+    assert [row[0] for row in read_rows(path)] == ["path", "a.jpg", "b.jpg"]
+
+
+def test_partial_last_row_is_dropped_on_resume(tmp_path):
+    path = tmp_path / "results.csv"
+    path.write_text(",".join(COLUMNS) + "\r\na.jpg,Cat,0.1,90.0,\r\nb.jp", newline="")
+
+    sink = CsvSink(str(path))
+    assert sink.done_paths() == {"a.jpg"}
+    sink.open()
+    sink.write([["b.jpg", "Dog", 0.9, 90.0, None]])
+    sink.close()
+    assert read_rows(path)[1:] == [
+        ["a.jpg", "Cat", "0.1", "90.0", ""],
+        ["b.jpg", "Dog", "0.9", "90.0", ""],
+    ]
+
+
+def test_partial_header_starts_over(tmp_path):
+    path = tmp_path / "results.csv"
+    path.write_text("path,predi", newline="")
+
+    sink = CsvSink(str(path))
+    assert sink.done_paths() == set()
+    sink.open()
+    sink.write([["a.jpg", "Cat", 0.1, 90.0, None]])
+    sink.close()
+    assert read_rows(path)[0] == COLUMNS
+
+
+def test_error_rows_stay_on_one_line():
+    rows = result_rows(
+        np.array([b"bad.jpg"]), np.array([0.0]), np.array([b"cannot identify\nimage file"])
+    )
+    assert rows == [["bad.jpg", None, None, None, "cannot identify image file"]]
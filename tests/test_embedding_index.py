@@ -0,0 +1,52 @@
+"""
+Near-duplicate index: model scoping and invalidation on activation
+"""
+
+import numpy as np
+
+from embedding_index import NearDuplicateIndex
+from model_registry import LoadedModel, ModelRegistry
+
+
+def embeddings(*rows):
+    return np.array(rows, dtype=np.float32)
+
+
+def test_hits_are_scoped_to_the_model_key():
+    index = NearDuplicateIndex(max_size=10, threshold=0.99)
+    index.add("v1-aaa", embeddings([1.0, 0.0, 0.0]), np.array([0.8]))
+
+    scores, hits = index.lookup("v1-aaa", embeddings([1.0, 0.001, 0.0]))
+    assert hits.tolist() == [True]
+    assert scores[0] == np.float32(0.8)
+
+    _, hits = index.lookup("v1-bbb", embeddings([1.0, 0.0, 0.0]))
+    assert hits.tolist() == [False]
+
+
+def test_remove_model_and_clear():
+    index = NearDuplicateIndex(max_size=10, threshold=0.99)
+    index.add("a", embeddings([1.0, 0.0]), np.array([0.1]))
+    index.add("b", embeddings([0.0, 1.0]), np.array([0.9]))
+
+    index.remove_model("a")
+    assert index.stats()["size"] == 1
+    assert index.stats()["evictions"] == 0
+
+    index.clear()
+    _, hits = index.lookup("b", embeddings([0.0, 1.0]))
+    assert hits.tolist() == [False]
+    assert index.stats()["size"] == 0
+
+
+def test_registry_notifies_activation_listeners():
+    registry = ModelRegistry()
+    activated = []
+    registry.on_activate(lambda entry: activated.append(entry.version))
+
+    registry.register(LoadedModel("1", None, "1.keras"))
+    registry.register(LoadedModel("2", None, "2.keras"))
+    registry.activate("2")
+    registry.register(LoadedModel("2", None, "2b.keras"), activate=True)
+
+    assert activated == ["1", "2", "2"]
@@ -0,0 +1,115 @@
+"""
+SIGTERM drain: DrainMiddleware refusals and in-flight accounting
+"""
+
+import asyncio
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from graceful_shutdown import DrainMiddleware, GracefulShutdown
+
+
+@pytest.fixture
+def shutdown():
+    return GracefulShutdown(grace_seconds=1)
+
+
+@pytest.fixture
+def client(shutdown):
+    seen = []
+
+    async def predict(request):
+        seen.append(shutdown.in_flight)
+        await asyncio.sleep(0)
+        return PlainTextResponse("ok")
+
+    app = Starlette(routes=[Route("/predict", predict, methods=["POST"]), Route("/health", predict)])
+    app.add_middleware(DrainMiddleware, shutdown=shutdown, prefixes=["/predict"])
+    test_client = TestClient(app)
+    test_client.seen = seen
+    return test_client
+
+
+def test_counts_in_flight_requests(client, shutdown):
+    assert client.post("/predict").status_code == 200
+    assert client.seen == [1]
+    assert shutdown.in_flight == 0
+    assert shutdown.pending() == 0
+
+
+def test_refuses_new_work_while_draining(client, shutdown):
+    shutdown.draining = True
+    response = client.post("/predict")
+    assert response.status_code == 503
+    assert response.headers["Connection"] == "close"
+    assert response.headers["Retry-After"] == "1"
+    assert client.seen == []
+    assert shutdown.rejected == 1
+    # Paths outside the prefixes keep working (health checks, metrics)
+    assert client.get("/health").status_code == 200
+
+
+def test_counts_requests_completed_during_drain(shutdown):
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def app(scope, receive, send):
+        started.set()
+        await release.wait()
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    middleware = DrainMiddleware(app, shutdown, ["/predict"])
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def scenario():
+        scope = {"type": "http", "method": "POST", "path": "/predict", "headers": []}
+        request = asyncio.ensure_future(middleware(scope, receive, send))
+        await started.wait()
+        shutdown.draining = True
+        assert shutdown.pending() == 1
+        release.set()
+        await request
+
+    asyncio.run(scenario())
+    assert sent[0]["status"] == 200
+    assert shutdown.completed_during_drain == 1
+    assert shutdown.pending() == 0
+
+
+def test_pending_includes_registered_checks(shutdown):
+    queued = [3]
+    shutdown.add_pending_check(lambda: queued[0])
+    assert shutdown.pending() == 3
+    assert shutdown.stats()["pending"] == 3
+
+
+def test_drain_waits_for_pending_work_then_hands_on_the_signal(shutdown):
+    handed_on = []
+    shutdown._previous_handler = lambda sig, frame: handed_on.append(sig)
+    shutdown.in_flight = 1
+
+    async def scenario():
+        shutdown._on_signal(15, None)
+        assert shutdown.draining
+        await asyncio.sleep(0.1)
+        assert handed_on == []  # Still waiting for the in-flight request
+        shutdown.in_flight = 0
+        for _ in range(40):
+            if handed_on:
+                break
+            await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    assert handed_on == [15]
+    assert shutdown.last_drain["timed_out"] is False
+    assert shutdown.last_drain["abandoned"] == 0
@@ -0,0 +1,91 @@
+"""
+Model artifact cache: conversion, hash invalidation and the .keras fallback
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from model_artifact_cache import FAILED_SUFFIX, ModelArtifactCache, source_digest
+from stub_model import ensure_stub_model
+
+
+@pytest.fixture
+def source(tmp_path):
+    return ensure_stub_model(str(tmp_path / "model.keras"), seed=0)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ModelArtifactCache(str(tmp_path / "cache"))
+
+
+def predict(model) -> np.ndarray:
+    batch = np.linspace(0, 1, 2 * 128 * 128 * 3, dtype=np.float32).reshape(2, 128, 128, 3)
+    return model.predict(batch, verbose=0)
+
+
+def test_converts_once_then_loads_artifact(cache, source):
+    original, first = cache.load(source)
+    assert first["source"] == "keras"
+    assert "convert_seconds" in first
+    assert os.path.isdir(os.path.join(cache.directory, first["sha256"]))
+
+    restored, second = cache.load(source)
+    assert second["source"] == "artifact"
+    assert second["sha256"] == first["sha256"] == source_digest(source)
+    np.testing.assert_allclose(predict(restored), predict(original), rtol=1e-6)
+
+
+def test_new_source_contents_invalidate_artifact(cache, source):
+    _, first = cache.load(source)
+    os.remove(source)
+    ensure_stub_model(source, seed=1)
+
+    _, second = cache.load(source)
+    assert second["sha256"] != first["sha256"]
+    assert second["source"] == "keras"
+    # The artifact of the old contents is pruned
+    assert sorted(os.listdir(cache.directory)) == [second["sha256"]]
+    assert cache.load(source)[1]["source"] == "artifact"
+
+
+def test_corrupt_artifact_is_deleted_and_rebuilt(cache, source):
+    _, first = cache.load(source)
+    artifact = os.path.join(cache.directory, first["sha256"])
+    with open(os.path.join(artifact, "architecture.json"), "w") as f:
+        f.write("{not json")
+
+    model, second = cache.load(source)
+    assert second["source"] == "keras"
+    assert model is not None
+    assert os.path.exists(artifact + FAILED_SUFFIX)
+
+    # The rebuilt artifact loads, which clears the failure record
+    _, third = cache.load(source)
+    assert third["source"] == "artifact"
+    assert not os.path.exists(artifact + FAILED_SUFFIX)
+
+
+def test_repeated_failures_fall_back_to_keras(cache, source, monkeypatch):
+    _, first = cache.load(source)
+    artifact = os.path.join(cache.directory, first["sha256"])
+    attempts = []
+
+    def broken(self, path, keras):
+        attempts.append(path)
+        raise ValueError("unsupported layer")
+
+    monkeypatch.setattr(ModelArtifactCache, "_load_artifact", broken)
+
+    assert cache.load(source)[1]["source"] == "keras"  # Fails, deleted, rebuilt once
+    assert os.path.isdir(artifact)
+    assert cache.load(source)[1]["source"] == "keras"  # Fails again: given up
+    assert not os.path.isdir(artifact)
+
+    _, info = cache.load(source)
+    assert info["source"] == "keras"
+    assert "convert_seconds" not in info
+    assert len(attempts) == 2
+    assert os.path.exists(artifact + FAILED_SUFFIX)
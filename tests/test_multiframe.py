@@ -0,0 +1,50 @@
+"""
+Multi-frame sampling: bounded frame scans and the frame limit
+"""
+
+import io
+
+import pytest
+from PIL import Image
+
+from multiframe import TooManyFrames, count_frames, plan_frames, sample_frame_indices
+
+
+def animated_gif(frames):
+    images = [Image.new("L", (4, 4), color=i % 256) for i in range(frames)]
+    buffer = io.BytesIO()
+    images[0].save(buffer, format="GIF", save_all=True, append_images=images[1:], disposal=1)
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+
+def test_still_image_has_one_frame():
+    assert count_frames(Image.new("RGB", (4, 4)), 10) == (1, False)
+
+
+def test_count_stops_at_limit():
+    assert count_frames(animated_gif(12), 5) == (5, True)
+    assert count_frames(animated_gif(12), 12) == (12, False)
+
+
+def test_uniform_sampling_spreads_over_all_frames():
+    total, indices = plan_frames(animated_gif(9), 3, "uniform", max_scan=20)
+    assert total == 9
+    assert indices == [0, 4, 8]
+
+
+def test_uniform_sampling_rejects_long_animations():
+    with pytest.raises(TooManyFrames):
+        plan_frames(animated_gif(30), 3, "uniform", max_scan=20)
+
+
+def test_prefix_strategies_scan_only_what_they_sample():
+    image = animated_gif(30)
+    assert plan_frames(image, 3, "first", max_scan=20) == (None, [0, 1, 2])
+    assert plan_frames(image, 3, "stride", stride=4, max_scan=20) == (None, [0, 4, 8])
+    assert plan_frames(animated_gif(5), 3, "stride", stride=4, max_scan=20) == (5, [0, 4])
+
+
+def test_sample_frame_indices():
+    assert sample_frame_indices(100, 4, "uniform") == [0, 33, 66, 99]
+    with pytest.raises(ValueError):
+        sample_frame_indices(10, 2, "random")
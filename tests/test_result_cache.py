@@ -0,0 +1,138 @@
+"""
+Two-tier result cache against the in-memory RESP server: sharing across
+instances, batched lookups, timeouts on a stalled store and the back-off
+"""
+
+import asyncio
+
+import pytest
+
+from result_cache import RespClient, TwoTierCache, encode_command
+from stub_kv_server import StubKVServer
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = StubKVServer()
+    server.port = server.start_in_thread()
+    return server
+
+
+@pytest.fixture(autouse=True)
+def running(server):
+    server.paused = False
+    yield
+    server.paused = False
+
+
+def make_cache(server, local_size: int = 100, **kwargs) -> TwoTierCache:
+    return TwoTierCache(local_size, RespClient(f"redis://127.0.0.1:{server.port}"), **kwargs)
+
+
+def test_encode_command():
+    assert encode_command("GET", "k") == b"*2\r\n$3\r\nGET\r\n$1\r\nk\r\n"
+
+
+def test_local_tier_without_store():
+    async def scenario():
+        cache = TwoTierCache(2)
+        cache.put_many({"a": {"score": 1}, "b": {"score": 2}, "c": {"score": 3}})
+        return await cache.get_many(["a", "b", "c"]), cache.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert results == [None, {"score": 2}, {"score": 3}]  # LRU evicted "a"
+    assert (stats["local_hits"], stats["misses"], stats["remote"]) == (2, 1, False)
+
+
+def test_result_shared_across_instances(server):
+    async def scenario():
+        writer = make_cache(server, namespace="test-share")
+        writer.put_many({"1:abc": {"score": 0.9, "stage": "full"}})
+        await writer.close()  # Waits for the background write
+
+        reader = make_cache(server, namespace="test-share")
+        first = await reader.get("1:abc")
+        second = await reader.get("1:abc")
+        await reader.close()
+        return first, second, reader.stats()
+
+    first, second, stats = asyncio.run(scenario())
+    assert first == second == {"score": 0.9, "stage": "full"}
+    assert (stats["remote_hits"], stats["local_hits"], stats["remote_lookups"]) == (1, 1, 1)
+
+
+def test_get_many_uses_one_round_trip(server):
+    async def scenario():
+        writer = make_cache(server, local_size=0, namespace="test-many")
+        writer.put_many({f"1:{i}": {"score": i / 10} for i in range(3)})
+        await writer.close()  # Waits for the background write
+
+        reader = make_cache(server, local_size=0, namespace="test-many")
+        commands = server.commands
+        results = await reader.get_many(["1:0", "1:missing", "1:1", "1:2"])
+        round_trips = server.commands - commands
+        await reader.close()
+        return results, round_trips, reader.stats()
+
+    results, round_trips, stats = asyncio.run(scenario())
+    assert results == [{"score": 0.0}, None, {"score": 0.1}, {"score": 0.2}]
+    assert round_trips == 1
+    assert (stats["remote_hits"], stats["misses"]) == (3, 1)
+
+
+def test_stalled_store_times_out_then_backs_off(server):
+    async def scenario():
+        cache = make_cache(server, namespace="test-timeout", timeout=0.05, backoff=60)
+        server.paused = True
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        first = await cache.get("1:abc")
+        elapsed = loop.time() - start
+        # Within the back-off the store is not asked at all
+        second = await cache.get("1:abc")
+        cache.put_many({"1:abc": {"score": 0.5}})
+        stats = cache.stats()
+        server.paused = False
+        await cache.close()
+        return first, second, elapsed, stats
+
+    first, second, elapsed, stats = asyncio.run(scenario())
+    assert first is None and second is None
+    assert elapsed < 1.0
+    assert stats["remote_timeouts"] == 1
+    assert stats["remote_lookups"] == 1
+    assert stats["remote_skipped"] == 2  # The second lookup and the write
+    assert stats["remote_available"] is False
+    assert stats["local_entries"] == 1  # Writes still reach the local tier
+
+
+def test_store_recovers_after_back_off(server):
+    async def scenario():
+        cache = make_cache(server, namespace="test-recover", timeout=0.05, backoff=0.1)
+        server.paused = True
+        await cache.get("1:abc")
+        server.paused = False
+        await asyncio.sleep(0.15)
+        cache.put_many({"1:abc": {"score": 0.5}})
+        await cache.close()
+
+        fresh = make_cache(server, namespace="test-recover")
+        result = await fresh.get("1:abc")
+        await fresh.close()
+        return result, cache.stats()
+
+    result, stats = asyncio.run(scenario())
+    assert result == {"score": 0.5}
+    assert stats["remote_available"] is True
+
+
+def test_unreachable_store_counts_errors():
+    async def scenario():
+        cache = TwoTierCache(10, RespClient("redis://127.0.0.1:1"), backoff=60)
+        result = await cache.get("1:abc")
+        await cache.close()
+        return result, cache.stats()
+
+    result, stats = asyncio.run(scenario())
+    assert result is None
+    assert stats["remote_errors"] == 1 and stats["misses"] == 1
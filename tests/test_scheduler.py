@@ -0,0 +1,107 @@
+"""
+InferenceScheduler: merging, expired jobs and shutdown
+"""
+
+import threading
+
+import numpy as np
+import pytest
+
+from scheduler import InferenceScheduler, JobExpired, SchedulerStopped, parse_weights
+
+ENTRY = object()
+
+
+class GatedModel:
+    """run_batch stand-in that blocks until released and records batch sizes"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.batches = []
+
+    def __call__(self, batch, entry, kind):
+        self.started.set()
+        self.release.wait(5)
+        self.batches.append(len(batch))
+        return batch[:, 0, 0, 0].astype(float)
+
+
+def images(n, value=0.0):
+    return np.full((n, 2, 2, 3), value, dtype=np.float32)
+
+
+@pytest.fixture
+def model():
+    return GatedModel()
+
+
+@pytest.fixture
+def scheduler(model):
+    scheduler = InferenceScheduler(model, {"interactive": 8, "batch": 2, "background": 1}, max_batch_size=8)
+    yield scheduler
+    model.release.set()
+    scheduler.stop()
+
+
+def occupy(scheduler, model):
+    """Keep the single worker busy so later jobs stay queued"""
+    blocker = scheduler.submit(images(1), ENTRY)
+    assert model.started.wait(5)
+    return blocker
+
+
+def test_parse_weights():
+    assert parse_weights("interactive=8, batch=0") == {"interactive": 8, "batch": 1}
+    with pytest.raises(ValueError):
+        parse_weights("urgent=3")
+
+
+def test_queued_jobs_are_merged(scheduler, model):
+    blocker = occupy(scheduler, model)
+    first = scheduler.submit(images(2, 1.0), ENTRY, client="a")
+    second = scheduler.submit(images(3, 2.0), ENTRY, client="b")
+    model.release.set()
+    blocker.result(5)
+    assert list(first.result(5)) == [1.0, 1.0]
+    assert list(second.result(5)) == [2.0, 2.0, 2.0]
+    assert model.batches == [1, 5]
+
+
+def test_expired_job_is_dropped_before_inference(scheduler, model):
+    blocker = occupy(scheduler, model)
+    expired = scheduler.submit(images(2), ENTRY, client="a", expired=lambda: True)
+    live = scheduler.submit(images(1, 3.0), ENTRY, client="b", expired=lambda: False)
+    model.release.set()
+    blocker.result(5)
+    with pytest.raises(JobExpired):
+        expired.result(5)
+    assert list(live.result(5)) == [3.0]
+    assert model.batches == [1, 1]
+    assert scheduler.stats()["classes"]["interactive"]["expired_jobs"] == 1
+
+
+def test_cancelled_job_is_skipped(scheduler, model):
+    blocker = occupy(scheduler, model)
+    cancelled = scheduler.submit(images(4), ENTRY)
+    assert cancelled.cancel()
+    model.release.set()
+    blocker.result(5)
+    scheduler.submit(images(1), ENTRY).result(5)
+    assert model.batches == [1, 1]
+
+
+def test_stop_fails_queued_jobs_and_refuses_new_ones(scheduler, model):
+    blocker = occupy(scheduler, model)
+    queued = scheduler.submit(images(1), ENTRY, priority="batch")
+    stopper = threading.Thread(target=scheduler.stop)
+    stopper.start()
+    model.release.set()
+    stopper.join(5)
+    assert not stopper.is_alive()
+    assert blocker.result(5) is not None
+    with pytest.raises(SchedulerStopped):
+        queued.result(5)
+    with pytest.raises(SchedulerStopped):
+        scheduler.submit(images(1), ENTRY)
+    assert scheduler.stats()["classes"]["batch"]["queued_jobs"] == 0
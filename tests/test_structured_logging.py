@@ -0,0 +1,99 @@
+"""
+Queued logging: drop-on-full, request summary sampling rules and the
+listener-side record building
+"""
+
+import io
+import json
+import logging
+import queue
+
+import pytest
+
+from structured_logging import (
+    DroppingQueueHandler,
+    RequestLogMiddleware,
+    configure_logging,
+    request_id_var,
+    stop_logging,
+)
+
+SCOPE = {"type": "http", "method": "POST", "path": "/predict"}
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+    logger = logging.getLogger("tests.dropping")
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        for i in range(5):
+            logger.warning("record %d", i)
+    finally:
+        logger.removeHandler(handler)
+    assert handler.dropped == 3
+    first = handler.queue.get_nowait()
+    # %-args are resolved on the emitting thread, formatting is left to the listener
+    assert (first.msg, first.args) == ("record 0", None)
+
+
+@pytest.fixture
+def summaries(caplog):
+    caplog.set_level(logging.INFO, logger="api.requests")
+    return lambda: [(record.levelname, record.fields["status"]) for record in caplog.records
+                    if record.name == "api.requests"]
+
+
+@pytest.mark.parametrize("status", [200, 404, 499])
+def test_unsampled_requests_are_not_logged(summaries, status):
+    RequestLogMiddleware(None, success_sample_rate=0.0)._log(SCOPE, status, 5.0, {}, None)
+    assert summaries() == []
+
+
+def test_server_errors_and_slow_requests_are_always_logged(summaries):
+    middleware = RequestLogMiddleware(None, success_sample_rate=0.0, slow_ms=100)
+    middleware._log(SCOPE, 500, 5.0, {}, None)
+    middleware._log(SCOPE, 500, 5.0, {}, RuntimeError("boom"))
+    middleware._log(SCOPE, 503, 5.0, {}, None)
+    middleware._log(SCOPE, 504, 5.0, {}, None)
+    middleware._log(SCOPE, 200, 150.0, {}, None)
+    assert summaries() == [
+        ("ERROR", 500), ("ERROR", 500), ("WARNING", 503), ("WARNING", 504), ("WARNING", 200)
+    ]
+
+
+def test_sampled_levels(summaries):
+    middleware = RequestLogMiddleware(None, success_sample_rate=1.0)
+    for status in (200, 503, 504):
+        middleware._log(SCOPE, status, 5.0, {"prediction": "Dog"}, None)
+    # Shed requests are warnings, not errors
+    assert summaries() == [("INFO", 200), ("WARNING", 503), ("WARNING", 504)]
+
+
+def test_summary_built_on_listener_thread(monkeypatch):
+    monkeypatch.setattr(logging.root, "handlers", [])
+    stream = io.StringIO()
+    assert configure_logging("INFO", json_format=True, stream=stream)
+    assert not configure_logging("INFO")  # Idempotent
+    token = request_id_var.set("req-1")
+    try:
+        RequestLogMiddleware(None, success_sample_rate=1.0)._log(
+            SCOPE, 200, 12.345, {"stages_ms": {"inference": 9.9}}, None
+        )
+    finally:
+        request_id_var.reset(token)
+        stop_logging()
+    assert logging.root.handlers == []
+
+    entry = json.loads(stream.getvalue())
+    assert entry["logger"] == "api.requests" and entry["level"] == "INFO"
+    assert entry["request_id"] == "req-1"
+    assert entry["status"] == 200 and entry["duration_ms"] == 12.35
+    assert entry["stages_ms"] == {"inference": 9.9}
+
+
+def test_existing_root_handlers_are_kept(monkeypatch):
+    existing = logging.NullHandler()
+    monkeypatch.setattr(logging.root, "handlers", [existing])
+    assert not configure_logging("INFO")
+    assert logging.root.handlers == [existing]
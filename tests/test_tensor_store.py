@@ -0,0 +1,116 @@
+"""
+Tensor store: appends, reopening, repair after an interrupted append and
+the background writer
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from tensor_store import INDEX_FILE, TENSORS_FILE, TensorStore, TensorStoreWriter
+
+SHAPE = (4, 4, 3)
+
+
+def pixels(value: int) -> np.ndarray:
+    return np.full(SHAPE, value, dtype=np.uint8)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TensorStore(str(tmp_path / "store"), SHAPE)
+
+
+def test_append_and_get(store):
+    assert store.append("h0", pixels(1), source="a.jpg") == 0
+    assert store.append("h1", pixels(2)[np.newaxis]) == 1  # Leading batch axis accepted
+    assert store.append("h0", pixels(9)) == 0  # Same content hash: not stored again
+
+    assert len(store) == 2 and "h1" in store
+    np.testing.assert_array_equal(store.get("h0"), pixels(1))
+    assert store.get("missing") is None
+    assert store.hashes() == ["h0", "h1"]
+    assert store.sources() == ["a.jpg", None]
+    with pytest.raises(ValueError):
+        store.append("bad", np.zeros((2, 2, 3), dtype=np.uint8))
+
+
+def test_reopen_and_batches(store):
+    for i in range(5):
+        store.append(f"h{i}", pixels(i))
+
+    reopened = TensorStore(store.directory, SHAPE)
+    assert len(reopened) == 5
+    batches = list(reopened.batches(2))
+    assert [offset for offset, _ in batches] == [0, 2, 4]
+    assert [len(batch) for _, batch in batches] == [2, 2, 1]
+    assert isinstance(batches[0][1], np.memmap)  # Zero-copy slices of the mapping
+    np.testing.assert_array_equal(batches[1][1][1], pixels(3))
+
+
+def test_sees_records_appended_by_another_writer(store):
+    other = TensorStore(store.directory, SHAPE)
+    other.append("h0", pixels(1))
+    # The index is re-read under the lock before appending
+    assert store.append("h0", pixels(1)) == 0
+    assert store.append("h1", pixels(2)) == 1
+    assert len(store) == 2
+
+
+def test_repairs_torn_index_line(store):
+    store.append("h0", pixels(1))
+    store.append("h1", pixels(2))
+    index = os.path.join(store.directory, INDEX_FILE)
+    # Interrupted mid-append: tensor written, index line cut short
+    size = os.path.getsize(index)
+    with open(index, "r+b") as f:
+        f.truncate(size - 5)
+
+    reopened = TensorStore(store.directory, SHAPE)
+    assert reopened.hashes() == ["h0"]
+    assert os.path.getsize(os.path.join(store.directory, TENSORS_FILE)) == reopened.record_size
+    assert reopened.append("h1", pixels(2)) == 1
+    np.testing.assert_array_equal(TensorStore(store.directory, SHAPE).get("h1"), pixels(2))
+
+
+def test_drops_unindexed_tensor(store):
+    store.append("h0", pixels(1))
+    with open(os.path.join(store.directory, TENSORS_FILE), "ab") as f:
+        f.write(pixels(7).tobytes()[:10])  # Crashed before the index line
+
+    reopened = TensorStore(store.directory, SHAPE)
+    assert len(reopened) == 1
+    assert os.path.getsize(os.path.join(store.directory, TENSORS_FILE)) == reopened.record_size
+
+
+def test_append_many_skips_stored_and_repeated_hashes(store):
+    store.append("h0", pixels(1))
+    records = [("h1", pixels(2), "b.jpg"), ("h0", pixels(9), None), ("h1", pixels(9), None)]
+    assert store.append_many(records) == [1, 0, 1]
+    assert store.hashes() == ["h0", "h1"]
+    np.testing.assert_array_equal(TensorStore(store.directory, SHAPE).get("h1"), pixels(2))
+
+
+def test_writer_appends_in_background(store):
+    writer = TensorStoreWriter(store, max_queue=10)
+    writer.start()
+    for i in range(5):
+        assert writer.submit(f"h{i}", pixels(i))
+    writer.flush()
+    assert len(store) == 5
+    writer.stop()
+    assert writer.stats()["written"] == 5
+
+
+def test_writer_drops_when_queue_is_full(store):
+    writer = TensorStoreWriter(store, max_queue=2)  # Not started: nothing drains the queue
+    assert writer.submit("h0", pixels(0))
+    assert writer.submit("h1", pixels(1))
+    assert not writer.submit("h2", pixels(2))
+    assert writer.stats()["dropped"] == 1
+
+    writer.start()
+    writer.stop()  # Writes what was queued
+    assert store.hashes() == ["h0", "h1"]
+    assert writer.stats()["pending"] == 0
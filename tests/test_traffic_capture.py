@@ -0,0 +1,72 @@
+"""
+Traffic capture: records and per-process file retention
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from traffic_capture import TrafficRecorder, capture_files, capture_pid
+
+
+def test_records_and_rotation_keep_other_workers_files(tmp_path, make_image):
+    finished = subprocess.Popen([sys.executable, "-c", "pass"])
+    finished.wait()
+    other_worker = tmp_path / "capture-20200101-000000-1-00000000.jsonl"  # PID 1 is always running
+    dead_worker = tmp_path / f"capture-20200101-000000-{finished.pid}-00000000.jsonl"
+    for path in (other_worker, dead_worker):
+        path.write_text("")
+
+    recorder = TrafficRecorder(str(tmp_path), sample_rate=1.0, max_file_bytes=1, max_files=2)
+    contents = make_image()
+    for i in range(5):
+        recorder.record("/predict", [("cat.png", contents)], arrival=1000.0 + i)
+    recorder.stop()
+
+    files = capture_files(str(tmp_path))
+    own = [path for path in files if capture_pid(path) == os.getpid()]
+    assert recorder.recorded == 5
+    assert len(own) == 2
+    assert str(other_worker) in files
+    assert str(dead_worker) not in files
+
+    record = json.loads(open(own[-1]).readline())
+    assert record["endpoint"] == "/predict" and record["ts"] == 1004.0
+    entry = record["files"][0]
+    assert (entry["format"], entry["width"], entry["height"]) == ("PNG", 64, 48)
+
+
+
+def paused_recorder(tmp_path, **kwargs):
+    """Recorder whose writer never runs, so samples stay queued"""
+    recorder = TrafficRecorder(str(tmp_path), sample_rate=1.0, **kwargs)
+    recorder.start = lambda: None
+    return recorder
+
+
+def test_metadata_only_capture_queues_no_payload_bytes(tmp_path, make_image):
+    recorder = paused_recorder(tmp_path, max_queue_bytes=4096)
+    contents = make_image(size=(512, 512))
+
+    recorder.record("/predict", [("cat.png", contents)], arrival=1.0)
+    (_, files, _, _, _, size), = recorder._queue.queue
+    assert files[0]["hash"] and files[0]["size"] == len(contents)
+    assert (files[0]["width"], files[0]["height"]) == (512, 512)
+    assert size < len(contents)
+
+    for _ in range(10):
+        recorder.record("/predict", [("cat.png", contents)], arrival=1.0)
+    assert recorder.dropped > 0
+    assert recorder._pending_bytes <= recorder.max_queue_bytes
+
+
+def test_payload_capture_is_bounded_by_bytes(tmp_path, make_image):
+    contents = make_image(size=(256, 256))
+    recorder = paused_recorder(tmp_path, store_payloads=True, max_queue_bytes=len(contents) * 3 + 2048)
+
+    for _ in range(5):
+        recorder.record("/predict", [("cat.png", contents)], arrival=1.0)
+    assert recorder._queue.qsize() == 3
+    assert recorder.dropped == 2
+    assert recorder._pending_bytes <= recorder.max_queue_bytes
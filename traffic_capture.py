@@ -0,0 +1,277 @@
+"""
+Opt-in traffic capture for realistic performance testing
+Records sampled predict requests to rotating JSONL files (+ optional blobs)
+
+Each sampled request becomes one JSON line:
+
+    {"ts": 1718000000.123, "endpoint": "/predict", "query": "compact=true",
+     "priority": null, "files": [{"filename": "cat.jpg", "hash": "...",
+     "size": 48213, "format": "JPEG", "width": 640, "height": 480,
+     "blob": "blobs/3f/3f2a....bin"}]}
+
+"ts" is the arrival time, so replay_traffic.py can reproduce bursts.
+With payload storage off only the hash and size/format metadata are kept
+and replay synthesises an image of the same format and dimensions.
+
+Disk writes happen on a background thread behind a queue bounded by
+bytes; when it is full the sample is dropped rather than slowing the
+request down. With payload storage off, the (cheap) hash and header
+metadata of a sampled request are taken on the request path, so only a
+few hundred bytes per file are queued and the upload itself is not kept
+alive; with payloads on, the bytes are queued and described by the
+writer thread.
+"""
+
+import io
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from single_flight import content_hash
+
+logger = logging.getLogger(__name__)
+
+# Queue accounting for one file's metadata (filename, hash, format, ...)
+_ENTRY_OVERHEAD = 512
+
+
+class TrafficRecorder:
+    """
+    Sampled, non-blocking capture of predict traffic
+
+    Args:
+        directory: Where capture-*.jsonl files (and blobs/) are written
+        sample_rate: Fraction of requests recorded (0.0 - 1.0)
+        store_payloads: Also keep the uploaded bytes (content-addressed)
+        max_file_bytes: Rotate to a new JSONL file beyond this size
+        max_files: JSONL files kept per process (oldest deleted)
+        max_blob_bytes: Stop storing new payloads once blobs reach this size
+        max_queue_bytes: Pending sample bytes before new samples are dropped
+
+    Example:
+        >>> recorder = TrafficRecorder("captures", sample_rate=0.05)
+        >>> recorder.record("/predict", [("cat.jpg", contents)], arrival)
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        sample_rate: float,
+        store_payloads: bool = False,
+        max_file_bytes: int = 64 * 1024 * 1024,
+        max_files: int = 10,
+        max_blob_bytes: int = 1024 * 1024 * 1024,
+        max_queue_bytes: int = 64 * 1024 * 1024
+    ):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.store_payloads = store_payloads
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.max_blob_bytes = max_blob_bytes
+        self.max_queue_bytes = max_queue_bytes
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending_bytes = 0
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        self._file_bytes = 0
+        self._blob_bytes = 0
+        self.recorded = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def start(self) -> None:
+        """Start the writer thread (idempotent)"""
+        if not self.enabled or self._thread is not None:
+            return
+        os.makedirs(os.path.join(self.directory, "blobs"), exist_ok=True)
+        self._blob_bytes = self._existing_blob_bytes()
+        self._thread = threading.Thread(target=self._writer, name="traffic-capture", daemon=True)
+        self._thread.start()
+        logger.info(f"Traffic capture enabled: {self.sample_rate:.1%} of requests -> {self.directory}")
+
+    def stop(self) -> None:
+        """Flush pending samples and close the current file"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def record(
+        self,
+        endpoint: str,
+        files: List[Tuple[str, bytes]],
+        arrival: float,
+        query: str = "",
+        priority: Optional[str] = None
+    ) -> None:
+        """
+        Maybe sample one request (called from request handlers, never blocks)
+
+        Args:
+            endpoint: Request path
+            files: (filename, uploaded bytes) pairs
+            arrival: Wall-clock arrival time of the request
+            query: Raw query string, replayed as-is
+            priority: X-Priority header, if sent
+        """
+        if not self.enabled or random.random() >= self.sample_rate:
+            return
+        self.start()
+        if self.store_payloads:
+            items: List[Any] = files  # Described on the writer thread
+            size = sum(len(contents) for _, contents in files)
+        else:
+            items = [describe_upload(filename, contents) for filename, contents in files]
+            size = 0
+        size += _ENTRY_OVERHEAD * len(files)
+        with self._lock:
+            if self._pending_bytes + size > self.max_queue_bytes:
+                self.dropped += 1
+                return
+            self._pending_bytes += size
+        self._queue.put((endpoint, items, arrival, query, priority, size))
+
+    def _writer(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            *sample, size = item
+            try:
+                self._write(*sample)
+                self.recorded += 1
+            except Exception as e:
+                self.dropped += 1
+                logger.warning(f"Traffic capture write failed: {e}")
+            finally:
+                with self._lock:
+                    self._pending_bytes -= size
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, endpoint: str, files: List[Any], arrival: float,
+               query: str, priority: Optional[str]) -> None:
+        """Write one sample; files are (filename, bytes) pairs or ready metadata"""
+        line = json.dumps({
+            "ts": round(arrival, 6),
+            "endpoint": endpoint,
+            "query": query,
+            "priority": priority,
+            "files": [self._describe(*f) if isinstance(f, tuple) else f for f in files],
+        }, separators=(",", ":")) + "\n"
+        if self._file is None or self._file_bytes + len(line) > self.max_file_bytes:
+            self._rotate()
+        self._file.write(line)
+        self._file.flush()
+        self._file_bytes += len(line)
+
+    def _describe(self, filename: str, contents: bytes) -> Dict[str, Any]:
+        """Upload metadata plus the stored blob path"""
+        entry = describe_upload(filename, contents)
+        entry["blob"] = self._store_blob(entry["hash"], contents)
+        return entry
+
+    def _store_blob(self, digest: str, contents: bytes) -> Optional[str]:
+        relative = os.path.join("blobs", digest[:2], f"{digest}.bin")
+        path = os.path.join(self.directory, relative)
+        if os.path.exists(path):
+            return relative
+        if self._blob_bytes + len(contents) > self.max_blob_bytes:
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(contents)
+        self._blob_bytes += len(contents)
+        return relative
+
+    def _rotate(self) -> None:
+        """
+        Start a new JSONL file and delete the oldest beyond max_files
+
+        Only this process's files count towards the limit (plus those of
+        processes that no longer run), so workers sharing the directory
+        never delete a file another worker is still writing.
+        """
+        if self._file is not None:
+            self._file.close()
+        name = f"capture-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self.recorded:08d}.jsonl"
+        self._file = open(os.path.join(self.directory, name), "a")
+        self._file_bytes = 0
+        owned = [
+            path for path in capture_files(self.directory)
+            if capture_pid(path) == os.getpid() or not _process_alive(capture_pid(path))
+        ]
+        for old in owned[:-self.max_files]:
+            os.remove(old)
+
+    def _existing_blob_bytes(self) -> int:
+        total = 0
+        for dirpath, _, filenames in os.walk(os.path.join(self.directory, "blobs")):
+            total += sum(os.path.getsize(os.path.join(dirpath, name)) for name in filenames)
+        return total
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for /metrics"""
+        return {
+            "sample_rate": self.sample_rate,
+            "store_payloads": self.store_payloads,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "pending": self._queue.qsize(),
+            "pending_mb": round(self._pending_bytes / (1024 * 1024), 2),
+            "blob_mb": round(self._blob_bytes / (1024 * 1024), 1),
+        }
+
+
+def describe_upload(filename: str, contents: bytes) -> Dict[str, Any]:
+    """Hash + size/format metadata of one upload (header only, no decode)"""
+    entry = {"filename": filename, "hash": content_hash(contents), "size": len(contents),
+             "format": None, "width": None, "height": None, "blob": None}
+    try:
+        with Image.open(io.BytesIO(contents)) as image:
+            entry["format"] = image.format
+            entry["width"], entry["height"] = image.size
+    except Exception:
+        pass
+    return entry
+
+
+def capture_files(directory: str) -> List[str]:
+    """Capture JSONL files in a directory, oldest first"""
+    names = sorted(n for n in os.listdir(directory) if n.startswith("capture-") and n.endswith(".jsonl"))
+    return [os.path.join(directory, n) for n in names]
+
+
+def capture_pid(path: str) -> Optional[int]:
+    """PID of the process that wrote a capture-<date>-<time>-<pid>-<n>.jsonl file"""
+    parts = os.path.basename(path).split("-")
+    try:
+        return int(parts[3]) if len(parts) == 5 else None
+    except ValueError:
+        return None
+
+
+def _process_alive(pid: Optional[int]) -> bool:
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists, owned by another user
+    return True